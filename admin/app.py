@@ -26,8 +26,10 @@ def leads():
 
 @app.route('/')
 def dashboard():
-    posts = core.get_posts()
-    return render_template('dashboard.html', posts=posts)
+    search = request.args.get('q', '').strip()
+    tag = request.args.get('tag', '')
+    posts = core.get_posts(search=search, tag=tag)
+    return render_template('dashboard.html', posts=posts, tags=core.get_tags(), search=search, tag=tag)
 
 @app.route('/edit/<filename>')
 def edit(filename):
@@ -5,6 +5,8 @@ refining content, and publishing updates to the Git repository and Substack.
 """
 
 import os
+import sys
+import contextlib
 import datetime
 import frontmatter
 import subprocess
@@ -20,25 +22,72 @@ load_dotenv()
 CONTENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../content'))
 REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
 
+# For build.py: ahead of site-packages, where PyPA's build package would
+# shadow it, but after admin/ (sys.path[0]) so its modules win
+sys.path.insert(1, REPO_DIR)
+import build
+
+# The build's index of content/ (see build.ContentStore), shared with it
+STORE_PATH = os.path.join(REPO_DIR, build.CACHE_DIR, build.CONTENT_STORE_NAME)
+
 # Supabase Setup
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 supabase: Client = create_client(url, key) if url and key else None
 
-def get_posts():
+def get_posts(search=None, tag=None):
     """
     Retrieves all blog posts from the content directory.
 
+    Posts are listed from the content store the build keeps, which only
+    reads files that changed since it was last synced; metadata is read the
+    way the site build reads it. Load a single post with frontmatter.load to
+    get its content.
+
+    Args:
+        search (str, optional): Only list posts matching every word of it (the last also as a prefix),
+            best match first, from the store's full-text index.
+        tag (str, optional): Only list posts with this tag, however it is capitalised.
+
+    Returns:
+        list: A list of dicts of each markdown post's metadata (and filename), newest first.
+    """
+    with contextlib.closing(build.ContentStore(STORE_PATH, CONTENT_DIR)) as store:
+        store.sync()
+        if search:
+            posts = store.search(search, limit=None)
+            if tag:
+                tagged = {post['filename'] for post in store.tagged(tag)}
+                posts = [post for post in posts if post['filename'] in tagged]
+        elif tag:
+            posts = store.tagged(tag)
+        else:
+            posts = store.posts(pages=True)
+        return [post for post in posts if post['filename'].endswith('.md')]
+
+
+def get_tags():
+    """
+    Lists the tags in use, for filtering the dashboard.
+
+    Returns:
+        dict: Each tag's slug and the number of posts tagged with it, most used first.
+    """
+    with contextlib.closing(build.ContentStore(STORE_PATH, CONTENT_DIR)) as store:
+        store.sync()
+        return dict(sorted(store.tags().items(), key=lambda item: (-item[1], item[0])))
+
+
+def get_post(filename):
+    """
+    Loads one blog post, content included, for editing.
+
     Returns:
-        list: A list of blog post objects, each containing the post's metadata and content.
+        dict: The post's metadata, its content under 'content' and its filename.
     """
-    posts = []
-    for filename in os.listdir(CONTENT_DIR):
-        if filename.endswith('.md'):
-            with open(os.path.join(CONTENT_DIR, filename), 'r') as file:
-                post = frontmatter.load(file)
-                posts.append(post)
-    return posts
+    with open(os.path.join(CONTENT_DIR, filename), 'r') as file:
+        post = frontmatter.load(file)
+    return dict(post.metadata, content=post.content, filename=filename)
 
 
 def save_post(filename, title, date, category, tags, content):
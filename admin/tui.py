@@ -205,7 +205,8 @@ class BlogTUI(App):
             list_view.append(PostListItem(post))
 
     def on_list_view_selected(self, event: ListView.Selected):
-        post = event.item.post
+        # Listed posts carry only metadata; edit the whole file
+        post = core.get_post(event.item.post['filename'])
         self.push_screen(EditorScreen(post))
 
     def action_start_server(self):
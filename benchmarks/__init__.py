@@ -0,0 +1,14 @@
+"""
+Benchmarks for the static site build (build.py).
+
+Run a benchmark from the repository root, e.g.:
+
+    python -m benchmarks.bench_templates
+
+bench_build times the whole pipeline on synthetic sites of growing size
+(generated by benchmarks.corpus) and keeps JSON baselines in
+benchmarks/baselines/ to compare later runs against:
+
+    python -m benchmarks.bench_build --save main
+    python -m benchmarks.bench_build --compare main
+"""
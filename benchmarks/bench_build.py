@@ -0,0 +1,176 @@
+"""
+Build pipeline scaling: parse, markdown, similarity and every build() stage.
+
+For each corpus size a synthetic site is generated (see benchmarks.corpus)
+and timed: parse_frontmatter and markdown_to_html over every post,
+calculate_similarity per pair of posts, a full build() with a breakdown
+per stage (from build's own profiler) and a no-op incremental build.
+Results can be saved as a JSON baseline and compared against one later;
+any metric slower than the baseline by more than the tolerance is flagged
+and the exit status is 1.
+
+    python -m benchmarks.bench_build [--sizes 100,1000,10000] [--repeat N]
+                                     [--save FILE] [--compare FILE] [--tolerance 0.15]
+
+50,000 posts is supported (--sizes 50000) but takes several minutes.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import build
+from benchmarks.corpus import generate_corpus, vocabulary
+
+DEFAULT_SIZES = (100, 1000, 10000)
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+SIMILARITY_PAIRS = 500
+MIN_REGRESSION_SECONDS = 0.001 # Differences below this are timer noise, whatever the ratio
+
+
+def best_time(func, repeat):
+    """Fastest of repeat calls of func, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+@contextlib.contextmanager
+def site(root):
+    """Points build.py's directories at the site generated under root."""
+    names = ('CONTENT_DIR', 'TEMPLATE_DIR', 'STATIC_DIR', 'OUTPUT_DIR', 'CACHE_DIR')
+    saved = {name: getattr(build, name) for name in names}
+    for name, sub in zip(names, ('content', 'templates', 'static', 'docs', '.cache')):
+        setattr(build, name, os.path.join(root, sub))
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(build, name, value)
+
+
+def measure(root, count, repeat, words):
+    """Metric name -> seconds for a site of count posts generated under root."""
+    generate_corpus(root, count, words=words)
+    results = {}
+    with site(root):
+        raws = [build.read_file(os.path.join(build.CONTENT_DIR, name))
+                for name in sorted(os.listdir(build.CONTENT_DIR)) if name.endswith('.md')]
+        bodies = [build.parse_frontmatter(raw)[1] for raw in raws]
+        results['parse_frontmatter'] = best_time(lambda: [build.parse_frontmatter(raw) for raw in raws], repeat)
+        results['markdown_to_html'] = best_time(lambda: [build.markdown_to_html(body) for body in bodies], repeat)
+
+        pick = random.Random(0)
+        pairs = [(pick.choice(bodies), pick.choice(bodies)) for _ in range(SIMILARITY_PAIRS)]
+        results['calculate_similarity (per pair)'] = best_time(
+            lambda: [build.calculate_similarity(a, b) for a, b in pairs], repeat) / len(pairs)
+
+        trace = os.path.join(root, 'profile.json')
+        stages = {}
+        def full_build():
+            with contextlib.redirect_stdout(io.StringIO()):
+                build.build(cache=False, profile=trace)
+            for name, depth, wall_ms, _, _ in build.PROFILER.summary():
+                if depth == 0:
+                    stages[f'build: {name}'] = min(stages.get(f'build: {name}', float('inf')), wall_ms / 1000)
+        results['build'] = best_time(full_build, repeat)
+        results.update(stages)
+
+        def incremental_build():
+            with contextlib.redirect_stdout(io.StringIO()):
+                build.build(incremental=True)
+        results['build --incremental (no changes)'] = best_time(incremental_build, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """(size, metric, seconds, baseline seconds, regressed) for every metric both runs have."""
+    rows = []
+    for size, metrics in results.items():
+        for metric, seconds in metrics.items():
+            before = baseline.get(size, {}).get(metric)
+            if before is None:
+                continue
+            regressed = seconds > before * (1 + tolerance) and seconds - before > MIN_REGRESSION_SECONDS
+            rows.append((size, metric, seconds, before, regressed))
+    return rows
+
+
+def baseline_path(name):
+    """A bare name (no directory, no .json) refers to BASELINE_DIR/<name>.json."""
+    if os.path.dirname(name) or name.endswith('.json'):
+        return name
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Comma-separated corpus sizes (default: %(default)s).')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per metric; the fastest counts (default: 3).')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as a baseline (a bare name goes to benchmarks/baselines/).')
+    parser.add_argument('--compare', metavar='FILE', help='Compare against a saved baseline and flag regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Slowdown over the baseline counted as a regression (default: 0.15 = 15%%).')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(baseline_path(args.compare), encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    words = vocabulary()
+    results = {}
+    for count in map(int, args.sizes.split(',')):
+        root = tempfile.mkdtemp(prefix=f'bench-build-{count}-')
+        try:
+            results[str(count)] = measure(root, count, args.repeat, words)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+        print(f"{count:,} posts")
+        before = {} if baseline is None else baseline.get(str(count), {})
+        for metric, seconds in results[str(count)].items():
+            line = f"  {metric:<40} {seconds * 1e3:12.3f} ms"
+            if before.get(metric):
+                line += f"   {seconds / before[metric] - 1:+8.1%} vs {before[metric] * 1e3:.3f} ms"
+            print(line)
+
+    if args.save:
+        path = baseline_path(args.save)
+        build.write_file(path, json.dumps({
+            'meta': {
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': args.repeat,
+            },
+            'results': results,
+        }, indent=2, sort_keys=True) + '\n')
+        print(f"Baseline written to {path}")
+
+    if baseline is not None:
+        regressions = [row for row in compare(results, baseline, args.tolerance) if row[4]]
+        for size, metric, seconds, before, _ in regressions:
+            print(f"REGRESSION {size} posts, {metric}: {before * 1e3:.3f} ms -> {seconds * 1e3:.3f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}.")
+
+
+if __name__ == '__main__':
+    main()
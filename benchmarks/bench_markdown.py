@@ -0,0 +1,117 @@
+"""
+Markdown rendering cost: markdown_to_html vs. the previous line-by-line renderer.
+
+Times both renderers over every post body in content/ and over a synthetic
+~1 MB document made by repeating those bodies, and prints the speedup.
+
+    python -m benchmarks.bench_markdown [--size BYTES]
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import build
+
+
+def line_by_line_markdown_to_html(text):
+    """The previous renderer: a per-line loop, then three regex passes over the whole page."""
+    html_lines = []
+    in_list = False
+    in_code_block = False
+    paragraph_buffer = []
+
+    def flush_paragraph():
+        if paragraph_buffer:
+            html_lines.append(f"<p>{' '.join(paragraph_buffer)}</p>")
+            paragraph_buffer.clear()
+
+    for line in text.split('\n'):
+        if line.strip().startswith('```'):
+            flush_paragraph()
+            if in_code_block:
+                html_lines.append('</code></pre>')
+                in_code_block = False
+            else:
+                if in_list:
+                    html_lines.append('</ul>')
+                    in_list = False
+                html_lines.append('<pre><code>')
+                in_code_block = True
+            continue
+        if in_code_block:
+            html_lines.append(line)
+            continue
+        line = line.rstrip()
+        if not line:
+            flush_paragraph()
+            continue
+        if line.startswith('#'):
+            flush_paragraph()
+            if in_list:
+                html_lines.append('</ul>')
+                in_list = False
+            level = len(line.split(' ')[0])
+            html_lines.append(f'<h{level}>{line[level+1:].strip()}</h{level}>')
+            continue
+        if line.startswith('* ') or line.startswith('- '):
+            flush_paragraph()
+            if not in_list:
+                html_lines.append('<ul>')
+                in_list = True
+            html_lines.append(f'<li>{line[2:].strip()}</li>')
+            continue
+        elif in_list:
+            html_lines.append('</ul>')
+            in_list = False
+        if line.startswith('> '):
+            flush_paragraph()
+            html_lines.append(f'<blockquote>{line[2:].strip()}</blockquote>')
+            continue
+        paragraph_buffer.append(line.strip())
+
+    flush_paragraph()
+    if in_list:
+        html_lines.append('</ul>')
+    if in_code_block:
+        html_lines.append('</code></pre>')
+
+    html = '\n'.join(html_lines)
+    html = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', html)
+    html = re.sub(r'\*(.*?)\*', r'<em>\1</em>', html)
+    html = re.sub(r'\[(.*?)\]\((.*?)\)', r'<a href="\2">\1</a>', html)
+    return html
+
+
+def best_time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=7)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=1_000_000, help='Size of the synthetic document in bytes.')
+    args = parser.parse_args()
+
+    bodies = [post.body for post in build.load_posts()]
+    document = '\n\n'.join(bodies)
+    document = '\n\n'.join([document] * (args.size // len(document) + 1))[:args.size]
+
+    cases = (
+        (f'content/ ({len(bodies)} posts, {sum(map(len, bodies)):,} chars)',
+         lambda render: [render(body) for body in bodies], 50),
+        (f'synthetic ({len(document):,} chars)', lambda render: render(document), 5),
+    )
+    for label, run, number in cases:
+        before = best_time(lambda: run(line_by_line_markdown_to_html), number)
+        after = best_time(lambda: run(build.markdown_to_html), number)
+        print(label)
+        print(f"  {'line by line':<16} {before * 1e3:8.2f} ms")
+        print(f"  {'markdown_to_html':<16} {after * 1e3:8.2f} ms   ({before / after:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-page render cost: compiled templates vs. chained str.replace.
+
+Renders one post page from the real templates and the longest post in
+content/ both ways and prints the cost per page.
+
+    python -m benchmarks.bench_templates [--number N]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import build
+
+
+def chained_replace(base_template, post_template, context):
+    """The pre-compiled approach: one full scan and copy of the page per slot."""
+    post_html = post_template
+    for name in ('title', 'category', 'tags_html', 'series_indicator', 'post_content',
+                 'related_posts', 'root', 'slug'):
+        post_html = post_html.replace('{{ %s }}' % name, context[name])
+    page = base_template.replace('{{ title }}', context['title'])
+    page = page.replace('{{ content }}', post_html)
+    for name in ('root', 'description', 'url', 'image', 'og_type', 'json_ld'):
+        page = page.replace('{{ %s }}' % name, context[name])
+    return page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='Pages rendered per timing run.')
+    args = parser.parse_args()
+
+    templates = build.load_templates()
+    base_template = build.read_file(os.path.join(build.TEMPLATE_DIR, 'base.html'))
+    post_template = build.read_file(os.path.join(build.TEMPLATE_DIR, 'post.html'))
+
+    post = max(build.load_posts(), key=lambda p: len(p.body))
+    context = {
+        'title': post.metadata.get('title', 'Untitled'),
+        'category': post.metadata.get('category', 'General'),
+        'tags_html': '<a href="../tags/essays.html" class="post-tag tag-color-1">Essays</a> ',
+        'series_indicator': '',
+        'post_content': post.html,
+        'related_posts': '',
+        'root': '../',
+        'slug': post.slug,
+        'description': post.metadata.get('excerpt', ''),
+        'url': f'{build.BASE_URL}/posts/{post.slug}.html',
+        'image': build.DEFAULT_IMAGE,
+        'og_type': 'article',
+        'json_ld': '',
+    }
+
+    print(f"Post page for '{post.slug}' ({len(post.html):,} chars of body), {args.number} pages per run")
+    for label, render in (
+        ('str.replace chain', lambda: chained_replace(base_template, post_template, context)),
+        ('render_page', lambda: build.render_page('post', context, templates)),
+    ):
+        best = min(timeit.repeat(render, number=args.number, repeat=5))
+        print(f"  {label:<18} {best / args.number * 1e6:8.1f} us/page")
+
+
+if __name__ == '__main__':
+    main()
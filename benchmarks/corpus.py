@@ -0,0 +1,162 @@
+"""
+Synthetic site generator for the build benchmarks.
+
+Writes a complete site (content/, templates/, static/) of N posts that look
+like the real ones: frontmatter with a title, date, category, a skewed tag
+distribution, excerpt and read time, and markdown bodies mixing headers,
+wrapped paragraphs, lists, blockquotes, code blocks and inline formatting.
+Prose is drawn from the word frequencies of the posts in content/, so
+similarity scoring sees a realistic vocabulary. The same seed always
+produces the same site.
+
+    python -m benchmarks.corpus N DIR [--seed S]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import re
+import shutil
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import build
+
+CATEGORIES = ('Engineering', 'Business', 'Technology', 'Psychology', 'Writing', 'Culture', 'Tools', 'Life')
+CATEGORY_WEIGHTS = (30, 20, 18, 10, 8, 6, 5, 3)
+TAG_COUNT = 80 # Tag i is used about 1/(i+1) as often as the most common one
+TAG_MIN_LENGTH = 5 # Tags are the most frequent words at least this long
+FEATURED_SHARE = 0.02
+WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+TAG_RE = re.compile(r'<[^>]+>')
+FALLBACK_WORDS = ('the', 'build', 'site', 'post', 'work', 'software', 'people', 'time', 'write', 'feel', 'right',
+                  'simple', 'tools', 'system', 'idea', 'thing', 'make', 'human', 'business', 'change')
+CODE_LINES = (
+    'def render(page):',
+    '    return template.format(**page)',
+    'for post in posts:',
+    '    write_file(post.path, render(post))',
+    'x = {"a": 1, "b": [2, 3]}',
+    '# TODO: *not* markdown **inside** code',
+    'print(f"built {len(posts)} pages")',
+)
+
+
+def vocabulary(content_dir=None):
+    """(words, weights) from the prose in content_dir, most frequent first."""
+    counts = Counter()
+    content_dir = content_dir or build.CONTENT_DIR
+    if os.path.isdir(content_dir):
+        for post in build.load_posts(content_dir):
+            counts.update(WORD_RE.findall(TAG_RE.sub(' ', post.body).lower()))
+    if len(counts) < len(FALLBACK_WORDS):
+        counts.update(FALLBACK_WORDS)
+    words = sorted(counts, key=lambda w: (-counts[w], w))
+    return words, [counts[w] for w in words]
+
+
+class CorpusWriter:
+    """Draws posts from one random stream; see generate_corpus."""
+
+    def __init__(self, seed=0, words=None):
+        self.random = random.Random(seed)
+        self.words, self.weights = words or vocabulary()
+        self.tags = [w.title() for w in self.words if len(w) >= TAG_MIN_LENGTH and "'" not in w][:TAG_COUNT]
+        self.tags = self.tags or [w.title() for w in self.words[:TAG_COUNT]]
+        self.tag_weights = [1 / (i + 1) for i in range(len(self.tags))]
+
+    def phrase(self, count):
+        return ' '.join(self.random.choices(self.words, self.weights, k=count))
+
+    def sentence(self):
+        words = self.phrase(self.random.randint(6, 22)).split(' ')
+        roll = self.random.random()
+        if roll < 0.1:
+            words[1] = f'**{words[1]}**'
+        elif roll < 0.2:
+            words[-2] = f'*{words[-2]}*'
+        elif roll < 0.25:
+            words[0] = f'[{words[0]}](https://example.com/{words[0]})'
+        text = ' '.join(words)
+        return text[0].upper() + text[1:] + '.'
+
+    def paragraph(self):
+        sentences = [self.sentence() for _ in range(self.random.randint(2, 6))]
+        # About a third of the paragraphs are hard-wrapped, as editors leave them
+        return ('\n' if self.random.random() < 0.3 else ' ').join(sentences)
+
+    def block(self):
+        roll = self.random.random()
+        if roll < 0.6:
+            return self.paragraph()
+        if roll < 0.72:
+            return f"{'#' * self.random.randint(2, 3)} {self.phrase(self.random.randint(2, 6)).title()}"
+        if roll < 0.86:
+            marker = self.random.choice('*-')
+            return '\n'.join(f'{marker} {self.sentence()}' for _ in range(self.random.randint(3, 7)))
+        if roll < 0.93:
+            return f'> {self.sentence()}'
+        lines = self.random.sample(CODE_LINES, self.random.randint(2, len(CODE_LINES)))
+        return '```python\n' + '\n'.join(lines) + '\n```'
+
+    def post(self, index):
+        """(filename, text) of post number index."""
+        title = self.phrase(self.random.randint(3, 8)).title()
+        date = datetime.date(2015, 1, 1) + datetime.timedelta(days=self.random.randrange(11 * 365))
+        tags = sorted(set(self.random.choices(self.tags, self.tag_weights, k=self.random.randint(1, 4))))
+        body = '\n\n'.join(self.block() for _ in range(self.random.randint(4, 24)))
+        frontmatter = [
+            f'title: {title}',
+            f'date: {date.isoformat()}',
+            f'category: {self.random.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]}',
+            f"tags: {', '.join(tags)}",
+            f'excerpt: {self.sentence()}',
+            f'read_time: {max(1, len(body.split()) // 200)} min read',
+        ]
+        if self.random.random() < FEATURED_SHARE:
+            frontmatter.append('featured: true')
+        slug = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')[:60]
+        return f'{slug}-{index}.md', '---\n' + '\n'.join(frontmatter) + '\n---\n\n' + body + '\n'
+
+
+def generate_corpus(root, count, seed=0, words=None):
+    """
+    Writes a site of count posts under root (content/, templates/ and
+    static/ from this repository, plus the standalone pages) and returns
+    the three directories as a (content, templates, static) tuple.
+    """
+    content_dir = os.path.join(root, 'content')
+    template_dir = os.path.join(root, 'templates')
+    static_dir = os.path.join(root, 'static')
+    for path in (content_dir, template_dir, static_dir):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+    shutil.copytree(build.TEMPLATE_DIR, template_dir)
+    shutil.copytree(build.STATIC_DIR, static_dir)
+
+    writer = CorpusWriter(seed, words)
+    for index in range(count):
+        filename, text = writer.post(index)
+        build.write_file(os.path.join(content_dir, filename), text)
+    build.write_file(os.path.join(content_dir, 'about.html'),
+                     '---\ntitle: About\nexcerpt: About this site.\n---\n<p>A synthetic site for benchmarks.</p>\n')
+    build.write_file(os.path.join(content_dir, 'consulting.md'),
+                     f'---\ntitle: Consulting\n---\n\n{writer.paragraph()}\n')
+    return content_dir, template_dir, static_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('count', type=int, help='Number of posts.')
+    parser.add_argument('root', help='Directory to write content/, templates/ and static/ into.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+    args = parser.parse_args()
+    generate_corpus(args.root, args.count, args.seed)
+    print(f"Wrote {args.count} posts to {os.path.join(args.root, 'content')}")
+
+
+if __name__ == '__main__':
+    main()
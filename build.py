@@ -1,6 +1,30 @@
 import os
 import shutil
 import datetime
+import errno
+import gzip
+import hashlib
+import json
+import argparse
+import inspect
+import math
+import re
+import concurrent.futures
+import contextlib
+import ctypes
+import ctypes.util
+import email.utils
+import functools
+import http.server
+import select
+import sqlite3
+import struct
+import subprocess
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from xml.sax.saxutils import escape, quoteattr
 
 # Configuration
 CONTENT_DIR = 'content'
@@ -9,402 +33,2332 @@ OUTPUT_DIR = 'docs'
 STATIC_DIR = 'static'
 BASE_URL = 'https://www.doesthisfeelright.com'
 DEFAULT_IMAGE = 'https://www.doesthisfeelright.com/static/images/og-default.jpg' # Placeholder
+MANIFEST_NAME = '.build-manifest.json'
+MANIFEST_VERSION = 1
+STANDALONE_PAGES = ['about.html', 'consulting.md']
+POSTS_PER_PAGE = 24 # Cards per homepage/tag page (divides into 2, 3 and 4 columns); 0 = one page
+SITE_AUTHOR = 'Isaac Hernandez'
+
+# Feeds: RSS 2.0 (feed.xml), Atom (atom.xml) and JSON Feed (feed.json) of the
+# newest posts, for the whole site and, with TAG_FEEDS, every tag (under
+# tags/<slug>/). Items are streamed to disk one at a time (see Feed).
+FEED_ITEMS = 20 # Newest posts per feed; 0 = every post
+FEED_FULL_CONTENT = False # Items carry the whole rendered post instead of its excerpt
+TAG_FEEDS = True
+SITEMAP_MAX_URLS = 50000 # Per sitemap file, the protocol's limit; sitemap.xml indexes the files
+CACHE_DIR = '.cache' # Survives between builds; safe to delete at any time
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CONTENT_STORE_NAME = 'content.sqlite3' # Under CACHE_DIR; see ContentStore
+CONTENT_STORE_VERSION = 1
+
+# Atomic builds: every build is written to a staging directory beside
+# OUTPUT_DIR and swapped into place once complete, so the served site is
+# never empty or half written. The builds it replaced are kept for --rollback.
+KEEP_BUILDS = 3
+RENAME_SWAP = 0x2 # renameat2's RENAME_EXCHANGE (Linux) and renamex_np's RENAME_SWAP (macOS)
+AT_FDCWD = -100
+
+# Simple stop words list for related-post similarity
+STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'that', 'this', 'it', 'he', 'she', 'they', 'i', 'you', 'we', 'as', 'from', 'can', 'will', 'not', 'have', 'has', 'had', 'do', 'does', 'did', 'but', 'at', 'by', 'with', 'from', 'here', 'when', 'where', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', 'should', 'now'}
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+PLACEHOLDER_RE = re.compile(r'\{\{ (\w+) \}\}')
+
+# Markdown inline formatting, applied to prose blocks only (never inside code)
+BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+ITALIC_RE = re.compile(r'\*(.*?)\*')
+LINK_RE = re.compile(r'\[(.*?)\]\((.*?)\)')
+IMAGE_RE = re.compile(r'!\[(.*?)\]\((\S*?)(?:\s+"(.*?)")?\)')
+# First characters that can open a heading, list item or blockquote. The empty
+# string is "in" this too, so empty blocks fall through to the line-by-line path.
+BLOCK_MARKERS = '#*->'
+
+# Asset pipeline: CSS and JS from static/ are minified and written under
+# content-hashed names (css/style.<hash>.css) that can be cached forever
+FINGERPRINT_ASSETS = True
+BUNDLE_JS = False # Also concatenate base.html's own scripts into one js/bundle.<hash>.js
+ASSET_REF_RE = re.compile(r'\{\{ root \}\}((?:css|js)/[\w./-]+?\.(?:css|js))(?![\w.-])')
+SCRIPT_TAG_RE = re.compile(r'[ \t]*<script src="\{\{ root \}\}(js/[\w./-]+?\.js)"></script>\n')
+
+# Responsive images: every JPEG and PNG under static/images/ gets resized
+# copies and modern encodings (encoded once per source hash, under
+# CACHE_DIR), and <img> tags showing one get a srcset inside a <picture>.
+# Needs Pillow; without it images are served as they are.
+RESPONSIVE_IMAGES = True
+IMAGE_DIR = 'images' # Under STATIC_DIR
+IMAGE_WIDTHS = (320, 640, 960, 1280) # Resized copies; images are never enlarged
+IMAGE_FORMATS = ('avif', 'webp') # Offered ahead of the original format, best first
+IMAGE_QUALITY = 80
+IMAGE_SIZES = '(max-width: 680px) 100vw, 680px' # An <img> without a width fills the article column
+IMAGE_TYPES = { # Extension -> (Pillow format, media type, save options)
+    'jpg': ('JPEG', 'image/jpeg', {'optimize': True, 'progressive': True}),
+    'jpeg': ('JPEG', 'image/jpeg', {'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+    'webp': ('WEBP', 'image/webp', {'method': 6}),
+    'avif': ('AVIF', 'image/avif', {}),
+}
+EXIF_ORIENTATION = 0x0112 # Values 5-8 are rotated a quarter turn
+IMG_TAG_RE = re.compile(r'<img\b[^>]*>', re.I)
+IMG_SRC_RE = re.compile(r'''\ssrc=["']((?:\{\{ root \}\}|/|(?:\.\./)*)(?:static/)?)([^"'?#]+)["']''', re.I)
+IMG_WIDTH_RE = re.compile(r'''\swidth=["']?(\d+)''', re.I)
+
+CSS_STRING_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CSS_COMMENT_RE = re.compile(CSS_STRING_RE.pattern + r'|/\*.*?\*/', re.S)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCTUATION_RE = re.compile(r' ?([{};,>]) ?')
+# A / starts a regex literal, not a division, after punctuation or one of
+# these keywords (lookbehinds must be fixed-width, hence one per keyword)
+JS_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'in', 'of', 'void', 'delete', 'throw', 'new',
+                     'do', 'else', 'yield', 'await')
+JS_REGEX_START = '|'.join([r'(?<=[(,=:\[!&|?{};<>*%~^])'] + [rf'(?<=\b{keyword})' for keyword in JS_REGEX_KEYWORDS])
+JS_TOKEN_RE = re.compile(r'''
+    ( "(?:\\.|[^"\\\n])*" | '(?:\\.|[^'\\\n])*' | `(?:\\.|[^`\\])*`     # strings, templates
+    | (?:''' + JS_REGEX_START + r''')[ \t]*/(?![*/])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*  # regex literals
+    )
+    | ( //[^\n]* | /\*.*?\*/ )                                                 # comments
+''', re.S | re.X)
+JS_SPACE_RE = re.compile(r'[ \t]*\n\s*')
+
+# Precompression (--precompress): .gz (and, with brotli installed, .br)
+# siblings of every text output at least this large
+PRECOMPRESS_EXTENSIONS = ('.html', '.json', '.xml', '.css', '.js', '.txt', '.svg')
+PRECOMPRESS_MIN_BYTES = 1024
+
+# Watch mode (build.py --watch)
+WATCH_POLL_INTERVAL = 0.1 # Seconds between scans when inotify is unavailable
+WATCH_DEBOUNCE = 0.05 # Changes arriving this close together trigger one rebuild
+LIVE_RELOAD_PATH = '/__livereload'
+# Each event is a JSON list of the URL paths that changed, or null for "reload every page"
+LIVE_RELOAD_SNIPPET = """<script>
+new EventSource('/__livereload').onmessage = function (event) {
+    var pages = JSON.parse(event.data);
+    if (pages === null || pages.indexOf(location.pathname) !== -1) location.reload();
+};
+</script>
+"""
+# inotify(7) events: written and closed, renamed in/out, created, deleted
+INOTIFY_MASK = 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+INOTIFY_ISDIR = 0x40000000
+
+# Compiled templates, filled by load_templates() at the start of every build
+TEMPLATE_NAMES = ('base', 'post', 'index', 'tag', 'collections')
+
+# Post metadata each kind of page displays; a page is only re-rendered when
+# one of its own fields changes (post bodies never reach these pages)
+RELATED_FIELDS = ('slug', 'title', 'tags', 'category', 'read_time')
+INDEX_FIELDS = ('slug', 'title', 'excerpt', 'date', 'category', 'tags', 'read_time')
+TAG_PAGE_FIELDS = ('slug', 'title', 'excerpt', 'read_time')
+FEED_FIELDS = ('slug', 'title', 'excerpt', 'category', 'date')
+SEARCH_FIELDS = ('slug', 'title', 'excerpt', 'tags', 'category', 'date')
+TEMPLATES = {}
+
+# Full-text search (see search_index_files): postings sharded by term prefix
+# under search/, so a query downloads a few small files instead of the corpus
+SEARCH_DIR = 'search'
+SEARCH_BOOSTS = (('title', 10), ('tags', 5), ('excerpt', 1), ('category', 1), ('body', 1))
+SEARCH_BM25 = (1.2, 0.75) # k1, b
+SEARCH_IMPACT_SCALE = 10 # Scores are stored as integers: round(score * scale)
+SEARCH_PREFIX_LENGTH = 2
+SEARCH_SHARD_MAX_BYTES = 16 * 1024 # Larger shards are split by one more character of prefix
+SEARCH_DOCS_PER_CHUNK = 8 # Results usually come from different chunks, so keep them small
+SEARCH_STORE_FIELDS = ('slug', 'title', 'excerpt', 'date', 'category') # Shown in search results
+SEARCH_MARKUP_RE = re.compile(r'<[^>]*>|\]\([^)]*\)') # HTML tags and link targets
+SEARCH_WORD_RE = re.compile(r'\w+') # search.js splits queries the same way
+
+# Related posts ("Read Next")
+RELATED_BACKEND = 'jaccard' # 'jaccard' (shared words) or 'tfidf' (cosine over TF-IDF; needs numpy + scipy)
+RELATED_COUNT = 2
+RELATED_THRESHOLD = 0.05 # Threshold to avoid garbage matches
+CATEGORY_BOOST = 0.1
+# Candidates for a post are gathered from its rarest terms first; once this
+# many have been found the remaining (more common) terms are not expanded.
+# Keeps related-post scoring linear in the corpus size.
+MAX_CANDIDATES = 100
 
 def read_file(path):
     with open(path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def write_file(path, content):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, 'w', encoding='utf-8') as f:
-        f.write(content)
+def write_file(path, content):
+    with open_output(path) as f:
+        f.write(content)
+
+@contextlib.contextmanager
+def open_output(path):
+    """Opens path to be written (as write_file would), for output written in pieces."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Outputs may be hardlinks shared with the live site (see stage_output):
+    # replace them, never write into them
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+    with open(path, 'w', encoding='utf-8') as f:
+        yield f
+    if PROFILER.enabled:
+        PROFILER.add_bytes(os.path.getsize(path))
+
+def hash_text(text):
+    """Stable content hash used to key manifest entries."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def hash_file(path):
+    """Content hash of a file on disk (static assets)."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def hash_data(data):
+    """Hashes any JSON-serialisable value (metadata dicts, lists of posts)."""
+    return hash_text(json.dumps(data, sort_keys=True))
+
+def hash_fields(posts, fields):
+    """Hashes just the given metadata fields of posts, in order."""
+    return hash_data([[post.get(field) for field in fields] for post in posts])
+
+class Profiler:
+    """
+    Timing spans for build(profile=...), saved as a Chrome trace-event file
+    (open it in chrome://tracing or ui.perfetto.dev) and summarised per span.
+
+    Stages run one after another: stage() ends the previous one. span()
+    nests inside them for per-post steps. Bytes written through write_file()
+    and the compressors count against every open span. While disabled (the
+    default) every method returns at once.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.stack = []
+        self.origin = 0
+
+    def start(self):
+        self.enabled = True
+        self.events = []
+        self.stack = []
+        self.origin = time.perf_counter_ns()
+
+    def begin(self, name, depth=None):
+        parent = '/'.join(frame[0] for frame in self.stack)
+        self.stack.append([name, time.perf_counter_ns(), 0, len(self.stack) if depth is None else depth, parent])
+
+    def end(self):
+        name, started, written, depth, parent = self.stack.pop()
+        self.events.append({
+            'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+            'ts': (started - self.origin) / 1000, 'dur': (time.perf_counter_ns() - started) / 1000,
+            'args': {'bytes': written, 'depth': depth, 'parent': parent},
+        })
+
+    def stage(self, name):
+        """Ends the current stage (and anything left open in it) and starts the next."""
+        if self.enabled:
+            while self.stack:
+                self.end()
+            self.begin(name, 0)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def add_bytes(self, count):
+        for frame in self.stack:
+            frame[2] += count
+
+    def stop(self):
+        while self.stack:
+            self.end()
+        self.enabled = False
+
+    def summary(self):
+        """
+        (name, depth, wall ms, calls, bytes) per span, in the order they first
+        ran. Spans are told apart by the spans they ran in, so a name used in
+        two stages gets a row under each.
+        """
+        rows = {}
+        for event in sorted(self.events, key=lambda e: e['ts']):
+            key = (event['args']['parent'], event['name'])
+            row = rows.setdefault(key, [event['name'], event['args']['depth'], 0.0, 0, 0])
+            row[2] += event['dur'] / 1000
+            row[3] += 1
+            row[4] += event['args']['bytes']
+        return [tuple(row) for row in rows.values()]
+
+    def save(self, path):
+        write_file(path, json.dumps({'traceEvents': self.events, 'displayTimeUnit': 'ms'}))
+
+    def print_summary(self):
+        rows = self.summary()
+        print(f"{'Stage':<32} {'Wall ms':>10} {'Calls':>7} {'Bytes':>12}")
+        for name, depth, wall_ms, calls, written in rows:
+            print(f"{'  ' * depth + name:<32} {wall_ms:>10.1f} {calls:>7} {written:>12,}")
+        stages = [row for row in rows if row[1] == 0]
+        print(f"{'total':<32} {sum(r[2] for r in stages):>10.1f} {'':>7} {sum(r[4] for r in stages):>12,}")
+
+PROFILER = Profiler() # Enabled by build(profile=...) for the length of one build
+
+def file_date(path):
+    """The UTC date (YYYY-MM-DD) path was last modified."""
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path), datetime.timezone.utc).date().isoformat()
+
+def git_commit_dates(directory):
+    """
+    Maps each file under directory (relative path) to the date of the last
+    commit that touched it, from one pass over git log. Empty outside a git
+    checkout or without git.
+    """
+    try:
+        log = subprocess.run(
+            ['git', '-c', 'core.quotePath=false', 'log', '--relative', '--format=%x00%cs', '--name-only', '--', '.'],
+            cwd=directory, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    dates = {}
+    date = None
+    for line in log.splitlines():
+        if line.startswith('\0'):
+            date = line[1:]
+        elif line:
+            dates.setdefault(line, date) # Newest commit first
+    return dates
+
+class BuildManifest:
+    """
+    Records which inputs every generated file was rendered from.
+
+    The manifest lives in the output tree. On an incremental build each page
+    declares its inputs as a dict of name -> hash (source file, templates,
+    metadata it displays); if they match what produced the existing file, the
+    page is neither re-rendered nor re-written. `reasons` maps every page
+    this build rendered to the inputs that made it necessary.
+
+    It also carries the date each post last changed (see date_posts), which
+    outlives changes to build.py and is kept by full builds as well.
+    """
+
+    def __init__(self, output_dir, generator, previous=None, history=None):
+        self.output_dir = output_dir
+        self.generator = generator
+        self.previous = previous or {}
+        self.history = history or {}
+        self.outputs = {}
+        self.posts = {}
+        self.lastmod = {}
+        self.rendered = 0
+        self.reasons = {}
+        self.unchanged = 0
+
+    @classmethod
+    def load(cls, output_dir, generator, outputs=True):
+        """
+        Loads the previous manifest, discarding its outputs if build.py itself
+        changed (or, for a full build, when outputs is false).
+        """
+        try:
+            data = json.loads(read_file(os.path.join(output_dir, MANIFEST_NAME)))
+        except (OSError, ValueError):
+            data = {}
+        if data.get('version') != MANIFEST_VERSION:
+            data = {}
+        previous = data.get('outputs') if outputs and data.get('generator') == generator else None
+        return cls(output_dir, generator, previous, data.get('lastmod'))
+
+    def date_posts(self, records):
+        """
+        Records the date (YYYY-MM-DD) each post last changed, for the sitemap.
+
+        A post whose source hash is the one in the history keeps its date, so
+        rebuilding never moves it. An edited post is dated by its file's
+        modification time; one no build has seen yet by its last git commit,
+        or outside git by its frontmatter date.
+        """
+        commits = None
+        for record in records:
+            seen = self.history.get(record.slug)
+            if seen and seen['source'] == record.source_hash:
+                date = seen['date']
+            else:
+                date = None
+                if not seen:
+                    if commits is None:
+                        commits = git_commit_dates(CONTENT_DIR)
+                    published = post_datetime(record.metadata)
+                    date = commits.get(os.path.basename(record.path)) or (published and published.date().isoformat())
+                date = date or file_date(record.path)
+            self.lastmod[record.slug] = {'source': record.source_hash, 'date': date}
+
+    def changed_inputs(self, rel_path, inputs):
+        """Returns the names of inputs that differ from the last build of rel_path."""
+        previous = self.previous.get(rel_path)
+        if previous is None or not os.path.exists(os.path.join(self.output_dir, rel_path)):
+            return ['output']
+        names = set(inputs) | set(previous)
+        return sorted(n for n in names if inputs.get(n) != previous.get(n))
+
+    def needs_render(self, rel_path, inputs):
+        """Records rel_path's inputs and reports whether it has to be rendered."""
+        # Two pages mapping to one file (a.md and a.html both make
+        # posts/a.html) must both be written so the last one wins, as in a
+        # full build.
+        reasons = ['collision'] if rel_path in self.outputs else self.changed_inputs(rel_path, inputs)
+        self.outputs[rel_path] = inputs
+        if reasons:
+            self.rendered += 1
+            self.reasons[rel_path] = self.reasons.get(rel_path, []) + reasons
+            return True
+        self.unchanged += 1
+        return False
+
+    def stale_outputs(self):
+        """Files produced by the previous build that this build no longer generates."""
+        return [p for p in self.previous if p not in self.outputs]
+
+    def save(self):
+        write_file(os.path.join(self.output_dir, MANIFEST_NAME), json.dumps({
+            'version': MANIFEST_VERSION,
+            'generator': self.generator,
+            'posts': self.posts,
+            'lastmod': self.lastmod,
+            'outputs': self.outputs,
+        }, indent=1, sort_keys=True))
+
+class Template:
+    """
+    A template from templates/, split once into literal text and named slots.
+
+    Rendering fills every slot from a context dict and joins the pieces in one
+    pass. Slots missing from the context are left as written, so optional
+    placeholders survive exactly as they did with str.replace.
+    """
+
+    __slots__ = ('segments', 'slots', 'digest')
+
+    def __init__(self, text):
+        self.segments = PLACEHOLDER_RE.split(text)
+        self.slots = []
+        for i in range(1, len(self.segments), 2):
+            name = self.segments[i]
+            self.slots.append((i, name))
+            self.segments[i] = '{{ %s }}' % name
+        self.digest = hash_text(text)
+
+    def render(self, context):
+        parts = self.segments[:]
+        for i, name in self.slots:
+            value = context.get(name)
+            if value is not None:
+                parts[i] = value
+        return ''.join(parts)
+
+def load_templates(template_dir=None, assets=None, images=None):
+    """
+    Reads and compiles every template once; the result is also kept in TEMPLATES.
+    With an asset map from build_assets() the templates link the fingerprinted
+    files, and with an image map from build_images() their <img> tags are
+    made responsive.
+    """
+    template_dir = template_dir or TEMPLATE_DIR
+    TEMPLATES.clear()
+    for name in TEMPLATE_NAMES:
+        text = read_file(os.path.join(template_dir, f'{name}.html'))
+        if assets:
+            text = rewrite_asset_refs(text, assets)
+        if images is not None:
+            text = rewrite_img_tags(text, images)
+        TEMPLATES[name] = Template(text)
+    return TEMPLATES
+
+def expand_root(html, root):
+    """Resolves {{ root }} in authored HTML (post bodies, standalone pages)."""
+    return html.replace('{{ root }}', root) if '{{' in html else html
+
+def render_page(kind, context, templates=None):
+    """
+    Renders a complete page of the given kind inside base.html.
+
+    kind names a template ('post', 'index', 'tag', 'collections'), or is
+    'page' for standalone pages whose context already holds the finished
+    'content'. One context fills both the inner template and base.html.
+    """
+    templates = templates or TEMPLATES
+    root = context.get('root', '')
+    if kind == 'page':
+        content = expand_root(context['content'], root)
+    else:
+        if 'post_content' in context:
+            context = dict(context, post_content=expand_root(context['post_content'], root))
+        content = templates[kind].render(context)
+    return templates['base'].render(dict(context, content=content))
+
+def parse_frontmatter(content):
+    """
+    Parses simple frontmatter bounded by ---
+    Returns metadata dict and body content.
+    """
+    parts = content.split('---', 2)
+    if len(parts) < 3:
+        return {}, content # No frontmatter
+    
+    return parse_metadata(parts[1]), parts[2].strip()
+
+def parse_metadata(frontmatter):
+    """The key: value lines of a frontmatter block as a dict."""
+    metadata = {}
+    for line in frontmatter.strip().split('\n'):
+        if ':' in line:
+            key, value = line.split(':', 1)
+            metadata[key.strip()] = value.strip()
+            
+    return metadata
+
+def render_inline(text):
+    """Applies bold, italic, image and link formatting to one block of prose."""
+    if '*' in text:
+        text = ITALIC_RE.sub(lambda m: f'<em>{m[1]}</em>', BOLD_RE.sub(lambda m: f'<strong>{m[1]}</strong>', text))
+    if '](' in text:
+        if '![' in text:
+            text = IMAGE_RE.sub(markdown_image, text)
+        text = LINK_RE.sub(lambda m: f'<a href="{m[2]}">{m[1]}</a>', text)
+    return text
+
+def markdown_image(match):
+    """The <img> tag for a ![alt](src "title") match."""
+    alt = match[1].replace('"', '&quot;')
+    title = f' title="{match[3].replace(chr(34), "&quot;")}"' if match[3] else ''
+    return f'<img src="{match[2]}" alt="{alt}"{title}>'
+
+def iter_fences(text):
+    """Yields (start, end) offsets of every ``` line in text."""
+    pos = text.find('```')
+    while pos != -1:
+        start = text.rfind('\n', 0, pos) + 1
+        end = text.find('\n', pos)
+        if end == -1:
+            end = len(text)
+        if not text[start:pos].strip():
+            yield start, end
+        pos = text.find('```', end)
+
+def render_blocks(text, html_lines):
+    """
+    Renders markdown prose (no code fences) into html_lines.
+
+    Blocks are split on blank lines. Plain paragraphs, by far the most common
+    blocks, are emitted without looking at them line by line; everything else
+    (headings, lists, quotes, mixed blocks) goes through the line rules below.
+    """
+    append = html_lines.append
+    in_list = False
+    for block in text.split('\n\n'):
+        if block[:1] not in BLOCK_MARKERS:
+            if '\n' not in block:
+                content = block.strip()
+            elif '\n#' in block or '\n* ' in block or '\n- ' in block or '\n> ' in block:
+                content = None
+            else:
+                # A wrapped paragraph, unless a whitespace-only line splits it
+                lines = [line.strip() for line in block.split('\n')]
+                content = ' '.join(lines) if all(lines) else None
+            if content is not None:
+                if content:
+                    if in_list:
+                        append('</ul>')
+                        in_list = False
+                    if '*' in content or '](' in content:
+                        content = render_inline(content)
+                    append(f'<p>{content}</p>')
+                continue
+
+        paragraph = []
+        for line in block.split('\n'):
+            line = line.rstrip()
+
+            # Empty lines (Paragraph breaks)
+            if not line:
+                if paragraph:
+                    append(f"<p>{render_inline(' '.join(paragraph))}</p>")
+                    paragraph = []
+                continue
+
+            # Headers
+            if line[0] == '#':
+                if paragraph:
+                    append(f"<p>{render_inline(' '.join(paragraph))}</p>")
+                    paragraph = []
+                if in_list:
+                    append('</ul>')
+                    in_list = False
+                level = len(line.split(' ')[0])
+                append(f'<h{level}>{render_inline(line[level+1:].strip())}</h{level}>')
+                continue
+
+            # Lists
+            if line.startswith(('* ', '- ')):
+                if paragraph:
+                    append(f"<p>{render_inline(' '.join(paragraph))}</p>")
+                    paragraph = []
+                if not in_list:
+                    append('<ul>')
+                    in_list = True
+                append(f'<li>{render_inline(line[2:].strip())}</li>')
+                continue
+            if in_list:
+                append('</ul>')
+                in_list = False
+
+            # Blockquotes
+            if line.startswith('> '):
+                if paragraph:
+                    append(f"<p>{render_inline(' '.join(paragraph))}</p>")
+                    paragraph = []
+                append(f'<blockquote>{render_inline(line[2:].strip())}</blockquote>')
+                continue
+
+            # Regular text - append to buffer
+            paragraph.append(line.strip())
+
+        if paragraph:
+            append(f"<p>{render_inline(' '.join(paragraph))}</p>")
+
+    if in_list:
+        append('</ul>')
+
+def markdown_to_html(text):
+    html_lines = []
+    pos = 0
+    fences = iter_fences(text)
+    for open_start, open_end in fences:
+        render_blocks(text[pos:open_start], html_lines)
+        html_lines.append('<pre><code>')
+        # Code is copied through untouched: no inline formatting, indentation kept
+        code_start = open_end + 1
+        closing = next(fences, None)
+        if closing is None:
+            if code_start <= len(text):
+                html_lines.append(text[code_start:])
+            html_lines.append('</code></pre>')
+            return '\n'.join(html_lines)
+        if closing[0] > code_start:
+            html_lines.append(text[code_start:closing[0] - 1])
+        html_lines.append('</code></pre>')
+        pos = closing[1]
+    render_blocks(text[pos:], html_lines)
+    return '\n'.join(html_lines)
+
+def content_words(text):
+    """Lowercased words of text, minus punctuation, stop words and very short words."""
+    # Lowercase and remove non-alphanumeric
+    words = PUNCTUATION_RE.sub('', text.lower()).split()
+    return [w for w in words if w not in STOP_WORDS and len(w) > 2]
+
+def tokenize(text):
+    """Content words of text, as a set, for similarity scoring."""
+    return set(content_words(text))
+
+def jaccard(tokens1, tokens2):
+    """Jaccard similarity of two token sets."""
+    if not tokens1 or not tokens2:
+        return 0.0
+        
+    intersection = len(tokens1 & tokens2)
+    union = len(tokens1) + len(tokens2) - intersection
+    
+    return intersection / union if union > 0 else 0.0
+
+def calculate_similarity(text1, text2):
+    """
+    Calculates Jaccard similarity between two texts.
+    Simple, fast, and effective for small-to-medium corpuses.
+    """
+    return jaccard(tokenize(text1), tokenize(text2))
+
+class Post:
+    """
+    One essay from content/, read and parsed exactly once.
+
+    Every build stage after loading works from these records instead of going
+    back to disk. The tokens (unless given, as a ContentStore does) are
+    produced on first access, so builds that never score posts never pay
+    for tokenizing.
+    """
+
+    __slots__ = ('slug', 'path', 'metadata', 'body', 'source_hash', '_tokens', '_search_counts')
+
+    def __init__(self, slug, path, metadata, body, source_hash, tokens=None):
+        self.slug = slug
+        self.path = path
+        self.metadata = metadata
+        self.body = body
+        self.source_hash = source_hash
+        self._tokens = tokens
+        self._search_counts = None
+
+    @property
+    def tokens(self):
+        """The body's words, for related-post scoring."""
+        if self._tokens is None:
+            self._tokens = tokenize(self.body)
+        return self._tokens
+
+    def search_counts(self, document):
+        """Search term counts of each SEARCH_BOOSTS field of document (this post's search.json entry) or the body."""
+        if self._search_counts is None:
+            self._search_counts = [search_term_counts(self.body if field == 'body' else document[field])
+                                   for field, _ in SEARCH_BOOSTS]
+        return self._search_counts
+
+def render_body(path, body, cache=None):
+    """HTML for a post body: markdown sources are converted, .html bodies used as-is."""
+    if not path.endswith('.md'):
+        return body
+    return cache.markdown_to_html(body) if cache else markdown_to_html(body)
+
+def renderer_version():
+    """Hash of the markdown renderer's code, so cached HTML never outlives it."""
+    parts = [inspect.getsource(func) for func in (markdown_to_html, render_blocks, render_inline, markdown_image, iter_fences)]
+    parts += [BOLD_RE.pattern, ITALIC_RE.pattern, IMAGE_RE.pattern, LINK_RE.pattern, BLOCK_MARKERS]
+    return hash_text('\n'.join(parts))
+
+class RenderCache:
+    """
+    Rendered markdown bodies kept on disk between builds.
+
+    Every entry is a file under <cache_dir>/render/ named by the hash of the
+    renderer version and the body, so an edited post or renderer just misses.
+    Hits refresh the file's mtime and prune() evicts the least recently used
+    entries once the cache grows past max_bytes. Entries are written
+    atomically, so parallel workers can share one cache.
+    """
+
+    __slots__ = ('root', 'version', 'max_bytes')
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.root = os.path.join(cache_dir or CACHE_DIR, 'render')
+        self.version = renderer_version()
+        self.max_bytes = RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def entry_path(self, body):
+        key = hash_text(self.version + body)
+        return os.path.join(self.root, key[:2], f'{key}.html')
+
+    def markdown_to_html(self, body):
+        path = self.entry_path(body)
+        try:
+            html = read_file(path)
+        except OSError:
+            html = markdown_to_html(body)
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            write_file(temp_path, html)
+            os.replace(temp_path, path)
+            return html
+        os.utime(path) # Mark as recently used
+        return html
+
+    def prune(self):
+        """Deletes least recently used entries until the cache fits max_bytes."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+class ContentStore:
+    """
+    Every file in content/, indexed in SQLite (under CACHE_DIR by default).
+
+    A row holds what the build derives from one file: its metadata (as
+    parse_frontmatter reads it), tags, word count, body and the tokens used
+    for related-post scoring. Posts are also indexed for
+    full-text search (FTS5). sync() brings the store up to date: files whose
+    size and mtime are unchanged are skipped, the rest are read and hashed,
+    and only those whose hash changed are parsed again. The build loads its
+    posts from here (see load_posts) and the admin dashboard lists them with
+    posts() and filters them with search() and tagged(), so neither parses
+    the whole of content/ each time. A store written by
+    other parsing or rendering code is rebuilt from scratch, as is a
+    deleted one.
+    """
+
+    SEARCH_FIELDS = tuple(field for field, _ in SEARCH_BOOSTS) # Columns of files, indexed by search
+    SCHEMA = (
+        'CREATE TABLE files (id INTEGER PRIMARY KEY, filename TEXT UNIQUE, slug TEXT, page INTEGER, '
+        'mtime_ns INTEGER, size INTEGER, source_hash TEXT, metadata TEXT, featured INTEGER, date TEXT, '
+        'words INTEGER, tokens TEXT, ' + ', '.join(f'{field} TEXT' for field in SEARCH_FIELDS) + ')',
+        'CREATE INDEX files_order ON files (page, featured DESC, date DESC, title DESC)',
+        'CREATE TABLE tags (filename TEXT, tag TEXT, slug TEXT)',
+        'CREATE INDEX tags_slug ON tags (slug)',
+        'CREATE INDEX tags_filename ON tags (filename)',
+        # Indexes the posts' rows of files without keeping a second copy of them
+        f"CREATE VIRTUAL TABLE search USING fts5({', '.join(SEARCH_FIELDS)}, content='files', content_rowid='id')",
+        'CREATE TABLE info (version TEXT)',
+    )
+
+    def __init__(self, path=None, content_dir=None):
+        self.path = path or os.path.join(CACHE_DIR, CONTENT_STORE_NAME)
+        self.content_dir = content_dir or CONTENT_DIR
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL') # The admin can list while a build syncs
+        version = self.version()
+        with self.db:
+            stored = None
+            with contextlib.suppress(sqlite3.OperationalError):
+                stored = self.db.execute('SELECT version FROM info').fetchone()
+            if stored != (version,):
+                for table in ('files', 'tags', 'search', 'info'):
+                    self.db.execute(f'DROP TABLE IF EXISTS {table}')
+                for statement in self.SCHEMA:
+                    self.db.execute(statement)
+                self.db.execute('INSERT INTO info VALUES (?)', (version,))
+
+    @staticmethod
+    def version():
+        """Hash of everything a row is derived with, so rows never outlive the code."""
+        parts = [inspect.getsource(func) for func in (parse_frontmatter, parse_metadata, content_words, post_tags, tag_slug,
+                                                      ContentStore.index)]
+        parts += [str(CONTENT_STORE_VERSION), PUNCTUATION_RE.pattern, ' '.join(sorted(STOP_WORDS)),
+                  ' '.join(STANDALONE_PAGES), *ContentStore.SCHEMA]
+        return hash_text('\n'.join(parts))
+
+    def close(self):
+        self.db.close()
+
+    def sync(self):
+        """Updates the store from content_dir; returns the filenames (re)indexed."""
+        known = dict((row[0], tuple(row[1:])) for row in self.db.execute('SELECT filename, mtime_ns, size FROM files'))
+        indexed = []
+        with self.db:
+            for filename in sorted(os.listdir(self.content_dir)):
+                if not filename.endswith('.html') and not filename.endswith('.md'):
+                    continue
+                path = os.path.join(self.content_dir, filename)
+                stat = os.stat(path)
+                key = (stat.st_mtime_ns, stat.st_size)
+                if known.pop(filename, None) == key:
+                    continue
+                raw_content = read_file(path)
+                source_hash = hash_text(raw_content)
+                if self.db.execute('UPDATE files SET mtime_ns = ?, size = ? WHERE filename = ? AND source_hash = ?',
+                                   (*key, filename, source_hash)).rowcount:
+                    continue # Touched, not changed
+                self.index(filename, raw_content, source_hash, key)
+                indexed.append(filename)
+            for filename in known:
+                self.remove(filename)
+        return indexed
+
+    def remove(self, filename):
+        fields = ', '.join(self.SEARCH_FIELDS)
+        row = self.db.execute(f'SELECT id, page, {fields} FROM files WHERE filename = ?', (filename,)).fetchone()
+        if row is None:
+            return
+        if not row[1]:
+            # External content tables are told what to unindex
+            self.db.execute(f"INSERT INTO search (search, rowid, {fields}) VALUES ('delete', ?{', ?' * len(row[2:])})",
+                            (row[0], *row[2:]))
+        self.db.execute('DELETE FROM tags WHERE filename = ?', (filename,))
+        self.db.execute('DELETE FROM files WHERE filename = ?', (filename,))
+
+    def index(self, filename, raw_content, source_hash, key):
+        """Replaces the rows of one file."""
+        self.remove(filename)
+        metadata, body = parse_frontmatter(raw_content)
+        metadata['slug'] = os.path.splitext(filename)[0]
+        page = filename in STANDALONE_PAGES
+        tags = post_tags(metadata)
+        fields = dict(metadata, title=metadata.get('title', ''), tags=', '.join(tags), body=body)
+        row = {
+            'filename': filename, 'slug': metadata['slug'], 'page': page, 'mtime_ns': key[0], 'size': key[1],
+            'source_hash': source_hash, 'metadata': json.dumps(metadata),
+            'featured': metadata.get('featured', 'false').lower() == 'true',
+            'date': metadata.get('date', '1970-01-01'), 'words': len(body.split()),
+            'tokens': ' '.join(sorted(tokenize(body))),
+            **{field: fields.get(field, '') for field in self.SEARCH_FIELDS},
+        }
+        rowid = self.db.execute(f'INSERT INTO files ({", ".join(row)}) VALUES ({", ".join("?" * len(row))})',
+                                tuple(row.values())).lastrowid
+        if page:
+            return # Not a post: no tags, not searchable
+        self.db.executemany('INSERT INTO tags VALUES (?, ?, ?)', [(filename, tag, tag_slug(tag)) for tag in tags])
+        self.db.execute(f'INSERT INTO search (rowid, {", ".join(self.SEARCH_FIELDS)}) '
+                        f'VALUES (?{", ?" * len(self.SEARCH_FIELDS)})',
+                        (rowid, *(row[field] for field in self.SEARCH_FIELDS)))
+
+    def posts(self, pages=False):
+        """
+        Metadata of every post (and, with pages=True, standalone page) in
+        the build's order: featured first, then newest, then by title. Each
+        dict also has the file's name under 'filename'.
+        """
+        rows = self.db.execute('SELECT filename, metadata FROM files WHERE page <= ? '
+                               'ORDER BY page, featured DESC, date DESC, title DESC, filename', (pages,))
+        return [dict(json.loads(metadata), filename=filename) for filename, metadata in rows]
+
+    def tagged(self, tag):
+        """Metadata of the posts on tag's page (any spelling of it), in the order of posts()."""
+        rows = self.db.execute('SELECT DISTINCT files.filename, metadata, featured, date, title FROM files '
+                               'JOIN tags USING (filename) WHERE tags.slug = ? '
+                               'ORDER BY featured DESC, date DESC, title DESC, files.filename', (tag_slug(tag),))
+        return [dict(json.loads(metadata), filename=filename) for filename, metadata, *_ in rows]
+
+    def tags(self):
+        """Tag slug -> number of posts on its page."""
+        return dict(self.db.execute('SELECT slug, COUNT(DISTINCT filename) FROM tags GROUP BY slug'))
+
+    def search(self, text, limit=10):
+        """
+        Metadata of the posts matching every word of text (the last word
+        also as a prefix), best first: BM25 weighted like SEARCH_BOOSTS.
+        limit=None returns every match.
+        """
+        words = SEARCH_WORD_RE.findall(text.lower())
+        if not words:
+            return []
+        query = ' '.join(f'"{word}"' for word in words) + '*'
+        weights = ', '.join(str(boost) for _, boost in SEARCH_BOOSTS)
+        rows = self.db.execute(f'SELECT filename, metadata FROM search JOIN files ON files.id = search.rowid '
+                               f'WHERE search MATCH ? ORDER BY bm25(search, {weights}) LIMIT ?', (query, -1 if limit is None else limit))
+        return [dict(json.loads(metadata), filename=filename) for filename, metadata in rows]
+
+    def load_posts(self, cache=None):
+        """
+        Every post as a Post, ready for the build. cache works as for
+        load_posts: posts with the same size and mtime as last time are
+        reused as they are.
+        """
+        posts = []
+        rows = self.db.execute('SELECT filename, mtime_ns, size, slug, source_hash, metadata, body, tokens '
+                               'FROM files WHERE page = 0 ORDER BY filename')
+        for filename, mtime_ns, size, slug, source_hash, metadata, body, tokens in rows:
+            path = os.path.join(self.content_dir, filename)
+            if cache is not None and path in cache and cache[path][0] == (mtime_ns, size):
+                posts.append(cache[path][1])
+                continue
+            posts.append(Post(slug, path, json.loads(metadata), body, source_hash, set(tokens.split())))
+            if cache is not None:
+                cache[path] = ((mtime_ns, size), posts[-1])
+        return posts
+
+class RelatedPosts:
+    """
+    Inverted-index engine for "Read Next" suggestions.
+
+    Each post's tokens are indexed once (term -> positions of posts using it).
+    Candidates for a post are the posts sharing its rarest terms, up to
+    max_candidates, plus the same-category posts the category boost alone
+    lifts over the threshold; only those are scored. When a post's terms
+    reach fewer than max_candidates posts in total (always true for small
+    corpora) the picks, scores and tie-breaking (earlier posts first) are
+    exactly those of comparing every pair with jaccard().
+    """
+
+    def __init__(self, posts, boost=CATEGORY_BOOST, threshold=RELATED_THRESHOLD, max_candidates=MAX_CANDIDATES):
+        self.posts = posts
+        self.boost = boost
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.positions = {post.slug: i for i, post in enumerate(posts)}
+        self.index = {}
+        self.categories = {}
+        # Terms are interned as small ints: intersecting int sets is much
+        # cheaper than intersecting sets of strings. Ids are handed out in
+        # sorted order, not set order (which varies with the string hash
+        # seed), so ties between candidate terms break the same every run.
+        self.term_ids = {}
+        self.term_sets = []
+        for i, post in enumerate(posts):
+            ids = set()
+            for term in sorted(post.tokens):
+                term_id = self.term_ids.setdefault(term, len(self.term_ids))
+                self.index.setdefault(term_id, []).append(i)
+                ids.add(term_id)
+            self.term_sets.append(ids)
+            self.categories.setdefault(post.metadata.get('category'), []).append(i)
+
+    def candidates(self, post):
+        """Positions of posts sharing post's rarest terms, and whether they cover every shared term."""
+        i = self.positions[post.slug]
+        candidates = set()
+        exhaustive = True
+        for term in sorted(self.term_sets[i], key=lambda t: len(self.index[t])):
+            if len(candidates) > self.max_candidates:
+                exhaustive = False
+                break
+            candidates.update(self.index[term])
+        candidates.discard(i)
+        return candidates, exhaustive
+
+    def scores(self, post, k=RELATED_COUNT):
+        """(score, position) for every candidate of post, in no particular order."""
+        i = self.positions[post.slug]
+        terms = self.term_sets[i]
+        category = post.metadata.get('category')
+        candidates, exhaustive = self.candidates(post)
+
+        scored = []
+        for j in candidates:
+            score = jaccard(terms, self.term_sets[j])
+            if self.posts[j].metadata.get('category') == category:
+                score += self.boost
+            scored.append((score, j))
+
+        # Same-category posts outside the candidates share no terms (or, past
+        # max_candidates, only common ones) and score about the boost; only
+        # the earliest k of them can ever make the cut.
+        if self.boost > self.threshold:
+            filled = 0
+            for j in self.categories[category]:
+                if filled == k:
+                    break
+                if j != i and j not in candidates:
+                    score = 0.0 if exhaustive else jaccard(terms, self.term_sets[j])
+                    scored.append((score + self.boost, j))
+                    filled += 1
+        return scored
+
+    def related(self, post, k=RELATED_COUNT):
+        """The k best-scoring posts above the threshold, best first."""
+        scored = sorted(self.scores(post, k), key=lambda x: (-x[0], x[1]))
+        return [self.posts[j] for score, j in scored[:k] if score > self.threshold]
+
+class TfidfRelatedPosts:
+    """
+    TF-IDF cosine backend for "Read Next" (RELATED_BACKEND = 'tfidf').
+
+    Builds one sparse document-term matrix over the whole corpus (sublinear
+    term frequency, smoothed IDF, L2-normalised rows) and computes the cosine
+    similarities of all posts with a batched sparse matrix product, a block of
+    rows at a time, keeping only the top k per row. The category boost,
+    threshold and tie-breaking are the same as for RelatedPosts.
+
+    Terms used by a single post cannot relate two posts, and terms used by
+    more than MAX_DF of them carry almost no weight while making the product
+    nearly dense, so both are left out of the matrix. Each post is then
+    reduced to its TERMS_PER_POST highest-weighted terms, which keeps the
+    product sparse for long essays.
+    """
+
+    BLOCK_ROWS = 512
+    MAX_DF = 0.5
+    TERMS_PER_POST = 64
+
+    def __init__(self, posts, boost=CATEGORY_BOOST, threshold=RELATED_THRESHOLD, top_k=RELATED_COUNT):
+        try:
+            import numpy as np
+            from scipy import sparse
+        except ImportError as e:
+            raise ImportError("The 'tfidf' related-posts backend needs numpy and scipy: pip install numpy scipy") from e
+
+        self.posts = posts
+        self.positions = {post.slug: i for i, post in enumerate(posts)}
+        self.table = []
+        n = len(posts)
+        if n < 2:
+            self.table = [[] for _ in posts]
+            return
+
+        # term -> column, assigning the next free column on first sight
+        term_ids = defaultdict()
+        term_ids.default_factory = term_ids.__len__
+        lengths, cols, counts = [], [], []
+        for post in posts:
+            frequencies = Counter(content_words(post.body))
+            lengths.append(len(frequencies))
+            cols.extend(map(term_ids.__getitem__, frequencies))
+            counts.extend(frequencies.values())
+
+        cols = np.asarray(cols, dtype=np.int64)
+        matrix = sparse.csr_matrix(
+            (1.0 + np.log(np.asarray(counts, dtype=np.float64)), cols, np.concatenate(([0], np.cumsum(lengths)))),
+            shape=(n, len(term_ids)),
+        )
+        document_frequency = np.bincount(cols, minlength=len(term_ids))
+        idf = np.log((1.0 + n) / (1.0 + document_frequency)) + 1.0
+        keep = (document_frequency > 1) & (document_frequency <= max(2, self.MAX_DF * n))
+        matrix = (matrix[:, keep] @ sparse.diags(idf[keep])).tocsr()
+        weights, indptr = matrix.data, matrix.indptr
+        for i in range(n):
+            start, stop = indptr[i], indptr[i + 1]
+            extra = stop - start - self.TERMS_PER_POST
+            if extra > 0:
+                weights[start + np.argpartition(weights[start:stop], extra)[:extra]] = 0.0
+        matrix.eliminate_zeros()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix = (sparse.diags(1.0 / norms) @ matrix).astype(np.float32).tocsr()
+        transposed = matrix.T.tocsr()
+
+        category_ids = {}
+        categories = np.array([category_ids.setdefault(p.metadata.get('category'), len(category_ids)) for p in posts])
+
+        k = min(top_k, n - 1)
+        for start in range(0, n, self.BLOCK_ROWS):
+            stop = min(start + self.BLOCK_ROWS, n)
+            if k <= 0:
+                self.table.extend([] for _ in range(start, stop))
+                continue
+            scores = (matrix[start:stop] @ transposed).toarray()
+            scores += boost * (categories[start:stop, None] == categories[None, :])
+            scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            # The k-th best score of each row; everything at or above it is a
+            # pick, with ties at the boundary going to the earlier post, as in
+            # RelatedPosts.
+            cutoffs = np.partition(scores, n - k, axis=1)[:, n - k]
+            rows, cols = np.nonzero(scores >= cutoffs[:, None])
+            bounds = np.searchsorted(rows, np.arange(stop - start + 1))
+            for r in range(stop - start):
+                best = cols[bounds[r]:bounds[r + 1]]
+                row = scores[r]
+                best = best[np.lexsort((best, -row[best]))][:k]
+                self.table.append([int(j) for j in best if row[j] > threshold])
+
+    def related(self, post, k=RELATED_COUNT):
+        """The k best-scoring posts above the threshold, best first."""
+        return [self.posts[j] for j in self.table[self.positions[post.slug]][:k]]
+
+RELATED_BACKENDS = {
+    'jaccard': RelatedPosts,
+    'tfidf': TfidfRelatedPosts,
+}
+
+class BuildState:
+    """
+    What one process keeps between builds (watch mode): parsed posts, see
+    load_posts, minified assets and image sizes and hashes, see build_assets
+    and build_images, and the last "Read Next" picks.
+
+    Scoring the picks is the one step whose cost grows with the whole corpus
+    on every build. The picks are reused as they are while no post's tokens,
+    category or position changed. Otherwise build() scores them again, unless
+    asked for a provisional build: then the previous picks stand in and
+    `stale` is set until an exact build has caught up. The full-text search
+    index is deferred the same way.
+    """
+
+    __slots__ = ('posts', 'assets', 'images', 'signature', 'picks', 'stale')
+
+    def __init__(self):
+        self.posts = {}
+        self.assets = {}
+        self.images = {}
+        self.signature = None
+        self.picks = {}
+        self.stale = False
+
+def related_picks(corpus, backend, state=None, provisional=False):
+    """slug -> slugs of the posts its "Read Next" box links to, best first."""
+    signature = [backend] + [(r.slug, r.metadata.get('category'), r.tokens) for r in corpus]
+    if state is not None and (provisional or state.signature == signature):
+        state.stale = state.signature != signature
+        return state.picks
+    with PROFILER.span('index'):
+        engine = RELATED_BACKENDS[backend](corpus)
+    picks = {}
+    for record in corpus:
+        with PROFILER.span('score'):
+            picks[record.slug] = [r.slug for r in engine.related(record)]
+    if state is not None:
+        state.signature, state.picks, state.stale = signature, picks, False
+    return picks
+
+def load_posts(content_dir=None, cache=None):
+    """
+    Reads every post in content_dir (CONTENT_DIR by default) into a Post.
+
+    The build loads from a ContentStore instead unless caching is off.
+    Standalone pages (about, consulting) are not posts and are skipped.
+    cache is a dict kept between calls (watch mode keeps one across
+    rebuilds): posts whose file has the same size and mtime as last time are
+    reused instead of being read, parsed and tokenized again.
+    """
+    content_dir = content_dir or CONTENT_DIR
+    posts = []
+    for filename in os.listdir(content_dir):
+        if not filename.endswith('.html') and not filename.endswith('.md'):
+            continue
+        if filename in STANDALONE_PAGES:
+            continue
+
+        filepath = os.path.join(content_dir, filename)
+        if cache is not None:
+            stat = os.stat(filepath)
+            key = (stat.st_mtime_ns, stat.st_size)
+            if filepath in cache and cache[filepath][0] == key:
+                posts.append(cache[filepath][1])
+                continue
+        with PROFILER.span('read'):
+            raw_content = read_file(filepath)
+        with PROFILER.span('parse'):
+            metadata, body = parse_frontmatter(raw_content)
+
+            # Slug is filename without extension
+            slug = os.path.splitext(filename)[0]
+            metadata['slug'] = slug
+            posts.append(Post(slug, filepath, metadata, body, hash_text(raw_content)))
+        if cache is not None:
+            cache[filepath] = (key, posts[-1])
+    return posts
+
+def post_tags(post):
+    """
+    The tags of a post's metadata, in order and without repeats; posts
+    without tags are filed under their category (General if none).
+    """
+    tags = post.get('tags', '').split(',') if post.get('tags') else [post.get('category', 'General')]
+    return list(dict.fromkeys([tag for tag in map(str.strip, tags) if tag]))
+
+def tag_slug(tag):
+    """The name of a tag's page: tags/<slug>.html."""
+    return tag.lower().replace(' ', '-')
+
+class Tag:
+    """One tag page's worth of posts; see Taxonomy."""
+
+    __slots__ = ('slug', 'name', 'posts')
+
+    def __init__(self, slug, name):
+        self.slug = slug
+        self.name = name
+        self.posts = []
+
+    @property
+    def count(self):
+        return len(self.posts)
+
+class Taxonomy:
+    """
+    Every tag and category, collected in one pass over the posts.
+
+    tags maps each tag slug to its Tag, in order of first use; spellings of
+    a tag that share a slug (Tools, tools) share its page, shown under the
+    spelling most of its posts use. categories maps each category to its
+    posts. Posts keep the order they were given in: newest first in build().
+    """
+
+    __slots__ = ('tags', 'categories')
+
+    def __init__(self, posts):
+        self.tags = {}
+        self.categories = {}
+        respelled = set()
+        for post in posts:
+            if post['slug'] == 'about': continue
+            self.categories.setdefault(post.get('category', 'General'), []).append(post)
+            seen = set()
+            for name in post_tags(post):
+                slug = tag_slug(name)
+                if slug in seen:
+                    continue
+                seen.add(slug)
+                tag = self.tags.get(slug)
+                if tag is None:
+                    tag = self.tags[slug] = Tag(slug, name)
+                elif name != tag.name:
+                    respelled.add(slug)
+                tag.posts.append(post)
+        for slug in respelled:
+            spellings = Counter(next(name for name in post_tags(post) if tag_slug(name) == slug)
+                                for post in self.tags[slug].posts)
+            self.tags[slug].name = spellings.most_common(1)[0][0] # Ties go to the first used
+
+def render_post_page(post, body, related, templates=None):
+    """
+    Renders the full page for one post.
+
+    post is the post's metadata, body its rendered HTML and related the
+    metadata of its "Read Next" posts. Depends on nothing else, so pages can
+    be rendered in any order or process.
+    """
+    slug = post['slug']
+
+    related_html = ""
+    if related:
+        related_items = ""
+        for r in related:
+            r_primary_tag = (post_tags(r) or ['General'])[0]
+            related_items += f"""
+                <a href="{r['slug']}.html" class="post-card">
+                    <span class="post-meta">{r_primary_tag} • {r.get('read_time', '5 min read')}</span>
+                    <h3>{r.get('title')}</h3>
+                </a>
+                """
+        related_html = f"""
+            <div class="related-posts">
+                <div class="related-header">Read Next</div>
+                <div class="related-grid">
+                    {related_items}
+                </div>
+            </div>
+            """
+
+    # Generate Tags HTML
+    tags_html = ""
+    for tag in post_tags(post):
+        color_index = sum(ord(c) for c in tag) % 6
+        tags_html += f'<a href="../tags/{tag_slug(tag)}.html" class="post-tag tag-color-{color_index}">{tag}</a> '
+
+    # Series Indicator
+    series = post.get('series')
+    series_html = ""
+    if series:
+        series_html = f'<div class="series-indicator">Series: {series}</div>'
+
+    # Generate JSON-LD
+    json_ld_data = {
+        "@context": "https://schema.org",
+        "@type": "BlogPosting",
+        "headline": post.get('title', 'Untitled'),
+        "image": [post.get('image', DEFAULT_IMAGE)],
+        "datePublished": post.get('date', ''),
+        "dateModified": post.get('date', ''),
+        "author": [{
+            "@type": "Person",
+            "name": SITE_AUTHOR,
+            "url": BASE_URL
+        }]
+    }
+    json_ld_script = f'<script type="application/ld+json">{json.dumps(json_ld_data)}</script>'
+
+    return render_page('post', {
+        'title': post.get('title', 'Untitled'),
+        'category': post.get('category', 'General'),
+        'tags_html': tags_html,
+        'series_indicator': series_html,
+        'post_content': body,
+        'related_posts': related_html,
+        'root': '../',
+        'slug': slug,
+        'description': post.get('excerpt', 'Thoughts on business, technology, and the human condition.'),
+        'url': f"{BASE_URL}/posts/{slug}.html",
+        'image': post.get('image', DEFAULT_IMAGE),
+        'og_type': 'article',
+        'json_ld': json_ld_script,
+    }, templates)
+
+def post_card_meta(post):
+    """(primary tag, display date) shown on a post's card."""
+    primary_tag = (post_tags(post) or ['General'])[0]
+
+    date_str = post.get('date', '')
+    date_display = ""
+    if date_str:
+        try:
+            date_display = datetime.datetime.strptime(date_str, '%Y-%m-%d').strftime('%b %d, %Y')
+        except ValueError:
+            date_display = date_str
+    return primary_tag, date_display
+
+def paginate(items, page_size):
+    """items in pages of page_size (0: all on one page); there is always a first page."""
+    if not page_size:
+        return [items]
+    return [items[i:i + page_size] for i in range(0, len(items), page_size)] or [[]]
+
+def pagination_html(paths, number, root):
+    """Prev/next links for page `number` (1-based) of the pages at paths (relative to root)."""
+    if len(paths) < 2:
+        return ''
+    newer = older = '<span></span>'
+    if number > 1:
+        newer = f'<a href="{root}{paths[number - 2]}" class="pagination-link" rel="prev">← Newer</a>'
+    if number < len(paths):
+        older = f'<a href="{root}{paths[number]}" class="pagination-link" rel="next">Older →</a>'
+    return (f'<nav class="pagination">{newer}'
+            f'<span class="pagination-status">Page {number} of {len(paths)}</span>{older}</nav>')
+
+class XMLWriter:
+    """
+    Writes an indented XML document one element at a time, so documents of
+    any length stream to a file instead of being built up in memory.
+    """
+
+    __slots__ = ('file', 'depth')
+
+    def __init__(self, file):
+        self.file = file
+        self.depth = 0
+        file.write('<?xml version="1.0" encoding="UTF-8"?>')
+
+    @staticmethod
+    def attributes(attrs):
+        return ''.join(f' {name}={quoteattr(value)}' for name, value in (attrs or {}).items())
+
+    def start(self, tag, attrs=None):
+        self.file.write(f'\n{"  " * self.depth}<{tag}{self.attributes(attrs)}>')
+        self.depth += 1
+
+    def end(self, tag):
+        self.depth -= 1
+        self.file.write(f'\n{"  " * self.depth}</{tag}>')
+        if not self.depth:
+            self.file.write('\n')
+
+    def element(self, tag, text=None, attrs=None):
+        """A complete element: <tag attrs>text</tag>, or <tag attrs/> without text."""
+        indent = "  " * self.depth
+        if text is None:
+            self.file.write(f'\n{indent}<{tag}{self.attributes(attrs)}/>')
+        else:
+            self.file.write(f'\n{indent}<{tag}{self.attributes(attrs)}>{escape(text)}</{tag}>')
+
+def post_datetime(post):
+    """A post's date as an aware datetime (midnight UTC), or None if it has no valid one."""
+    try:
+        return datetime.datetime.strptime(post.get('date', ''), '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return None
+
+class Feed:
+    """
+    One feed being written: start(), then item() for each post, then end().
+
+    Each item is written as soon as it is given, so a feed streams to disk
+    in constant memory however many items it has. channel describes the
+    feed: title, link (its page on the site), url (of the feed itself),
+    description and updated (a datetime). Items are dicts of title, url,
+    summary (the excerpt, which may hold HTML), content (the post's HTML,
+    or None for excerpt-only feeds), date (a datetime or None) and category.
+    """
+
+    media_type = None
+
+    def __init__(self, file, channel):
+        self.file = file
+        self.channel = channel
+
+class RSSFeed(Feed):
+    """RSS 2.0, with full content in content:encoded."""
+
+    media_type = 'application/rss+xml'
+
+    def start(self):
+        self.xml = XMLWriter(self.file)
+        self.xml.start('rss', {'version': '2.0', 'xmlns:atom': 'http://www.w3.org/2005/Atom',
+                               'xmlns:content': 'http://purl.org/rss/1.0/modules/content/'})
+        self.xml.start('channel')
+        self.xml.element('title', self.channel['title'])
+        self.xml.element('link', self.channel['link'])
+        self.xml.element('description', self.channel['description'])
+        self.xml.element('language', 'en-us')
+        self.xml.element('atom:link', attrs={'href': self.channel['url'], 'rel': 'self', 'type': self.media_type})
+
+    def item(self, item):
+        self.xml.start('item')
+        self.xml.element('title', item['title'])
+        self.xml.element('link', item['url'])
+        self.xml.element('description', item['summary'])
+        if item['content'] is not None:
+            self.xml.element('content:encoded', item['content'])
+        self.xml.element('category', item['category'])
+        self.xml.element('guid', item['url'], {'isPermaLink': 'true'})
+        if item['date']:
+            self.xml.element('pubDate', email.utils.format_datetime(item['date']))
+        self.xml.end('item')
+
+    def end(self):
+        self.xml.end('channel')
+        self.xml.end('rss')
+
+class AtomFeed(Feed):
+    """Atom (RFC 4287)."""
+
+    media_type = 'application/atom+xml'
+
+    def start(self):
+        self.xml = XMLWriter(self.file)
+        self.xml.start('feed', {'xmlns': 'http://www.w3.org/2005/Atom', 'xml:lang': 'en-us'})
+        self.xml.element('title', self.channel['title'])
+        self.xml.element('subtitle', self.channel['description'])
+        self.xml.element('link', attrs={'href': self.channel['link']})
+        self.xml.element('link', attrs={'href': self.channel['url'], 'rel': 'self', 'type': self.media_type})
+        self.xml.element('id', self.channel['url'])
+        self.xml.element('updated', self.channel['updated'].isoformat())
+        self.xml.start('author')
+        self.xml.element('name', SITE_AUTHOR)
+        self.xml.end('author')
+
+    def item(self, item):
+        date = (item['date'] or self.channel['updated']).isoformat()
+        self.xml.start('entry')
+        self.xml.element('title', item['title'])
+        self.xml.element('link', attrs={'href': item['url']})
+        self.xml.element('id', item['url'])
+        self.xml.element('published', date)
+        self.xml.element('updated', date)
+        self.xml.element('summary', item['summary'], {'type': 'html'})
+        if item['content'] is not None:
+            self.xml.element('content', item['content'], {'type': 'html'})
+        self.xml.element('category', attrs={'term': item['category']})
+        self.xml.end('entry')
+
+    def end(self):
+        self.xml.end('feed')
+
+class JSONFeed(Feed):
+    """JSON Feed 1.1."""
+
+    media_type = 'application/feed+json'
+
+    def start(self):
+        head = json.dumps({
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': self.channel['title'],
+            'home_page_url': self.channel['link'],
+            'feed_url': self.channel['url'],
+            'description': self.channel['description'],
+            'authors': [{'name': SITE_AUTHOR}],
+            'language': 'en-US',
+        })
+        # Items follow one by one; the closing ]} is written by end()
+        self.file.write(head[:-1] + ', "items": [')
+        self.separator = '\n'
+
+    def item(self, item):
+        entry = {'id': item['url'], 'url': item['url'], 'title': item['title'],
+                 'summary': re.sub('<[^<]+?>', '', item['summary']),
+                 'content_html': item['summary'] if item['content'] is None else item['content'],
+                 'tags': [item['category']]}
+        if item['date']:
+            entry['date_published'] = item['date'].isoformat()
+        self.file.write(self.separator + json.dumps(entry))
+        self.separator = ',\n'
+
+    def end(self):
+        self.file.write('\n]}\n')
+
+FEED_FORMATS = {'feed.xml': RSSFeed, 'atom.xml': AtomFeed, 'feed.json': JSONFeed}
+
+def write_feed(path, feed_class, channel, items):
+    """Streams items (any iterable, consumed one at a time) into a feed_class feed at path."""
+    with open_output(path) as f:
+        feed = feed_class(f, channel)
+        feed.start()
+        for item in items:
+            feed.item(item)
+        feed.end()
+
+def write_sitemap(path, urls):
+    """Streams a sitemap of urls, each (loc, lastmod or None, changefreq, priority)."""
+    with open_output(path) as f:
+        xml = XMLWriter(f)
+        xml.start('urlset', {'xmlns': 'http://www.sitemaps.org/schemas/sitemap/0.9'})
+        for loc, lastmod, changefreq, priority in urls:
+            xml.start('url')
+            xml.element('loc', loc)
+            if lastmod:
+                xml.element('lastmod', lastmod)
+            xml.element('changefreq', changefreq)
+            xml.element('priority', priority)
+            xml.end('url')
+        xml.end('urlset')
+
+def write_sitemap_index(path, sitemaps):
+    """Writes a sitemap index of sitemaps, each (loc, lastmod or None)."""
+    with open_output(path) as f:
+        xml = XMLWriter(f)
+        xml.start('sitemapindex', {'xmlns': 'http://www.sitemaps.org/schemas/sitemap/0.9'})
+        for loc, lastmod in sitemaps:
+            xml.start('sitemap')
+            xml.element('loc', loc)
+            if lastmod:
+                xml.element('lastmod', lastmod)
+            xml.end('sitemap')
+        xml.end('sitemapindex')
+
+def feed_items_for(posts, records=None, cache=None, assets=None):
+    """
+    Feed items for posts (metadata dicts), made one at a time. Given the
+    Post records by slug, items carry each post's full HTML, rendered
+    through cache (so pages already built are not converted again) with the
+    same asset links and absolute URLs in place of {{ root }}.
+    """
+    for post in posts:
+        content = None
+        if records is not None:
+            record = records[post['slug']]
+            body = rewrite_asset_refs(record.body, assets) if assets else record.body
+            content = expand_root(render_body(record.path, body, cache), f'{BASE_URL}/')
+        yield {
+            'title': post.get('title', 'Untitled'),
+            'url': f"{BASE_URL}/posts/{post['slug']}.html",
+            'summary': post.get('excerpt', ''),
+            'content': content,
+            'date': post_datetime(post),
+            'category': post.get('category', 'General'),
+        }
+
+def write_post_pages(pages, templates, output_dir, cache=None, images=None):
+    """
+    Renders and writes a batch of post pages; the unit of work for --jobs.
+
+    Each page is (slug, source path, metadata, raw body, related metadata).
+    Bodies go through the render cache when one is given, and their <img>
+    tags through rewrite_img_tags() when given an image map. Returns the
+    number of pages written.
+    """
+    for slug, path, post, body, related in pages:
+        with PROFILER.span('markdown'):
+            html = render_body(path, body, cache)
+        if images is not None:
+            with PROFILER.span('images'):
+                html = rewrite_img_tags(html, images)
+        with PROFILER.span('template'):
+            full_page = render_post_page(post, html, related, templates)
+        with PROFILER.span('write'):
+            write_file(os.path.join(output_dir, 'posts', f'{slug}.html'), full_page)
+    return len(pages)
+
+def run_in_chunks(func, items, jobs, *args):
+    """
+    Calls func(chunk, *args) over items, in this process or fanned out over
+    `jobs` worker processes in chunks, and returns the sum of the results.
+    """
+    if jobs <= 1 or len(items) < 2:
+        return func(items, *args)
+
+    # A few chunks per worker keeps them all busy without paying process
+    # round-trips for every single item.
+    chunk_size = max(1, -(-len(items) // (jobs * 4)))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(func, chunk, *args) for chunk in chunks]
+        return sum(future.result() for future in futures)
+
+def render_posts(pages, jobs=1, cache=None, output_dir=None, images=None):
+    """
+    Writes all post pages into output_dir (OUTPUT_DIR), in this process or
+    fanned out over `jobs` worker processes in chunks. Every page is a pure
+    function of its own inputs, so the output is byte-identical either way.
+    """
+    run_in_chunks(write_post_pages, pages, jobs, TEMPLATES, output_dir or OUTPUT_DIR, cache, images)
+
+def search_term_counts(text):
+    """
+    Counts of the searchable words of text, lowercased. Unlike content_words,
+    punctuation splits words ("ai-assisted" is "ai" and "assisted") and
+    two-letter words ("ai", "ux") are kept; stop words are dropped.
+    """
+    counts = Counter(SEARCH_WORD_RE.findall(SEARCH_MARKUP_RE.sub(' ', text.lower())))
+    for word in [w for w in counts if len(w) < 2 or w in STOP_WORDS]:
+        del counts[word]
+    return counts
+
+def search_index_files(documents, counts):
+    """
+    The full-text search index for search.json's documents (doc id = list
+    position), given each one's term counts (Post.search_counts), as
+    {path under SEARCH_DIR: JSON text}.
+
+    Each term of a post gets a BM25 score per field, like lunr.js: the
+    fields' scores times their boosts add up to an integer impact. A
+    term's postings are [doc id delta, impact, ...] in doc id order, and
+    terms are grouped into shards (terms/<prefix>.json) by their first
+    SEARCH_PREFIX_LENGTH characters; a shard over SEARCH_SHARD_MAX_BYTES is
+    split by one more character, leaving just the term equal to the prefix
+    behind. meta.json maps each split prefix to the prefixes split from it,
+    so search.js fetches one shard per query word, and for a word still
+    being typed that is a split prefix, the shards split from it as well.
+    The fields results show are written in chunks (docs/<n>.json) of
+    SEARCH_DOCS_PER_CHUNK.
+    """
+    k1, b = SEARCH_BM25
+    lengths = [[sum(field.values()) for field in fields] for fields in counts]
+    averages = [sum(column) / len(column) or 1 for column in zip(*lengths)]
+    frequency = Counter(term for fields in counts for term in set().union(*fields))
+    # The parts of a term's score that do not depend on the post
+    weights = {term: math.log(1 + (len(counts) - n + 0.5) / (n + 0.5)) * (k1 + 1) * SEARCH_IMPACT_SCALE
+               for term, n in frequency.items()}
+
+    postings = defaultdict(list)
+    for doc_id, (fields, field_lengths) in enumerate(zip(counts, lengths)):
+        scores = Counter()
+        for (_, boost), field, length, average in zip(SEARCH_BOOSTS, fields, field_lengths, averages):
+            norm = k1 * (1 - b + b * length / average)
+            for term, tf in field.items():
+                scores[term] += boost * tf / (tf + norm)
+        for term, score in scores.items():
+            postings[term] += (doc_id, int(weights[term] * score + 0.5) or 1)
+    encoded = {}
+    for term, flat in postings.items():
+        ids = flat[0::2]
+        flat[2::2] = [after - before for before, after in zip(ids, ids[1:])]
+        encoded[term] = f'{json.dumps(term)}:{json.dumps(flat, separators=(",", ":"))}'
+
+    files = {}
+    children = defaultdict(set)
+    pending = defaultdict(list)
+    for term in sorted(encoded):
+        pending[term[:SEARCH_PREFIX_LENGTH]].append(term)
+    while pending:
+        prefix, terms = pending.popitem()
+        longer = [term for term in terms if len(term) > len(prefix)]
+        if longer and sum(len(encoded[term]) + 1 for term in terms) > SEARCH_SHARD_MAX_BYTES:
+            for term in longer:
+                children[prefix].add(term[:len(prefix) + 1])
+                pending[term[:len(prefix) + 1]].append(term)
+            terms = [term for term in terms if len(term) == len(prefix)]
+            if not terms:
+                continue
+        files[f'terms/{prefix}.json'] = '{' + ','.join(encoded[term] for term in terms) + '}'
+
+    for start in range(0, len(documents), SEARCH_DOCS_PER_CHUNK):
+        chunk = [{field: doc[field] for field in SEARCH_STORE_FIELDS}
+                 for doc in documents[start:start + SEARCH_DOCS_PER_CHUNK]]
+        files[f'docs/{start // SEARCH_DOCS_PER_CHUNK}.json'] = json.dumps(chunk, separators=(',', ':'))
+    files['meta.json'] = json.dumps({
+        'docs': len(documents),
+        'chunk': SEARCH_DOCS_PER_CHUNK,
+        'prefix': SEARCH_PREFIX_LENGTH,
+        'children': {prefix: sorted(keys) for prefix, keys in sorted(children.items())},
+        'stop_words': sorted(STOP_WORDS),
+    }, separators=(',', ':'))
+    return files
+
+def load_brotli():
+    """The optional brotli module, or None when it is not installed."""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+def compress_files(files, encodings, verify=False):
+    """
+    Writes the compressed siblings (path + '.gz', path + '.br') of a batch
+    of files; the unit of work for parallel precompression.
+
+    files are (path, write) pairs. With write False the existing siblings are
+    kept and, if verify is set, only checked. verify decompresses every
+    sibling and raises RuntimeError unless it matches the file exactly.
+    Returns the number of files written.
+    """
+    codecs = {'.gz': gzip}
+    if '.br' in encodings:
+        codecs['.br'] = load_brotli()
+    written = 0
+    for path, write in files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        for suffix in encodings:
+            codec = codecs[suffix]
+            if write:
+                # mtime=0 keeps .gz output reproducible from build to build
+                packed = gzip.compress(data, 9, mtime=0) if suffix == '.gz' else codec.compress(data, quality=11)
+                temp_path = f'{path}{suffix}.{os.getpid()}.tmp'
+                with open(temp_path, 'wb') as f:
+                    f.write(packed)
+                os.replace(temp_path, path + suffix)
+                if PROFILER.enabled:
+                    PROFILER.add_bytes(len(packed))
+            elif verify:
+                with open(path + suffix, 'rb') as f:
+                    packed = f.read()
+            if verify and codec.decompress(packed) != data:
+                raise RuntimeError(f'{path}{suffix} does not decompress to {path}')
+        written += write
+    return written
+
+def precompress(manifest, jobs=1, verify=False):
+    """
+    Writes .gz/.br siblings for every text file this build produced (per the
+    manifest) that is at least PRECOMPRESS_MIN_BYTES. Siblings are recorded
+    in the manifest against the file's hash: unchanged files are skipped and
+    siblings of deleted pages are removed as stale outputs.
+    Returns (written, unchanged).
+    """
+    encodings = ('.gz', '.br') if load_brotli() else ('.gz',)
+    files = []
+    unchanged = 0
+    for rel_path in sorted(manifest.outputs):
+        path = os.path.join(manifest.output_dir, rel_path)
+        if not rel_path.endswith(PRECOMPRESS_EXTENSIONS) or os.path.getsize(path) < PRECOMPRESS_MIN_BYTES:
+            continue
+        inputs = {'source': hash_file(path)}
+        write = False
+        for suffix in encodings:
+            write = bool(manifest.changed_inputs(rel_path + suffix, inputs)) or write
+            manifest.outputs[rel_path + suffix] = inputs
+        if write or verify:
+            files.append((path, write))
+        unchanged += not write
+    written = run_in_chunks(compress_files, files, jobs, encodings, verify)
+    return written, unchanged
+
+def sync_file(src, dst, link=False):
+    """
+    Makes dst an exact copy of src and reports whether it had to be written.
+
+    A dst with the same size and mtime (or, failing that, the same hash) is
+    kept as is. New copies keep src's mtime, so deploy tooling sees stable
+    mtimes. They are real copies: a file in static/ may be edited in place,
+    which would change a hardlinked output, and every kept build sharing
+    it, behind the build's back (an output still linked to src is copied
+    again). With link=True, for sources that are only ever replaced (the
+    image cache), they are hardlinks where the filesystem allows.
+    """
+    src_stat = os.stat(src)
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+    else:
+        if (dst_stat.st_ino, dst_stat.st_dev) == (src_stat.st_ino, src_stat.st_dev):
+            if link:
+                return False
+        elif dst_stat.st_size == src_stat.st_size and (
+            dst_stat.st_mtime_ns == src_stat.st_mtime_ns or hash_file(dst) == hash_file(src)
+        ):
+            return False
+        os.remove(dst)
+    if link:
+        with contextlib.suppress(OSError):
+            os.link(src, dst)
+            return True
+    shutil.copy2(src, dst)
+    if PROFILER.enabled:
+        PROFILER.add_bytes(src_stat.st_size)
+    return True
+
+def sync_assets(src_dir, dst_dir):
+    """Mirrors every file of src_dir into dst_dir; yields (relative path, written)."""
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            src = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(src, src_dir)
+            yield rel_path, sync_file(src, os.path.join(dst_dir, rel_path))
+
+def minify_css(css):
+    """Drops comments and redundant whitespace; strings are left untouched."""
+    parts = CSS_STRING_RE.split(CSS_COMMENT_RE.sub(lambda m: m[1] or '', css))
+    for i in range(0, len(parts), 2):
+        code = CSS_PUNCTUATION_RE.sub(r'\1', CSS_SPACE_RE.sub(' ', parts[i]))
+        parts[i] = code.replace(': ', ':').replace(';}', '}')
+    return ''.join(parts).strip()
+
+def minify_js(js):
+    """
+    Drops comments, indentation and blank lines. Line breaks are kept so
+    automatic semicolon insertion still sees the same statements; strings,
+    template literals and regex literals are copied verbatim.
+    """
+    out = []
+    code = []
+    pieces = JS_TOKEN_RE.split(js)
+    for i in range(0, len(pieces), 3):
+        code.append(pieces[i])
+        if i + 1 == len(pieces):
+            break
+        literal, comment = pieces[i + 1], pieces[i + 2]
+        if literal is not None:
+            out.append(JS_SPACE_RE.sub('\n', ''.join(code)))
+            out.append(literal)
+            code = []
+        elif '\n' in comment:
+            code.append('\n')
+        elif comment.startswith('/*'):
+            code.append(' ')
+    out.append(JS_SPACE_RE.sub('\n', ''.join(code)))
+    return ''.join(out).strip()
+
+def build_assets(static_dir, output_dir, bundle=(), cache=None):
+    """
+    Writes a minified, content-hashed copy of every CSS and JS file in
+    static_dir (css/style.css -> css/style.<hash>.css) to output_dir.
+
+    Scripts listed in `bundle` are instead concatenated, in order, into a
+    single js/bundle.<hash>.js. Files already present under their hashed
+    name are not rewritten. cache is a dict kept between calls (watch mode
+    keeps one across rebuilds) of each file's minified text and hash, by
+    mtime and size, so only edited files are minified again. Returns the
+    map of original -> hashed paths that rewrite_asset_refs() applies.
+    """
+    minified = {}
+    digests = {}
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            ext = os.path.splitext(name)[1]
+            if ext in ('.css', '.js'):
+                path = os.path.join(dirpath, name)
+                rel_path = os.path.relpath(path, static_dir).replace(os.sep, '/')
+                stat = os.stat(path)
+                key = (stat.st_mtime_ns, stat.st_size)
+                if cache is not None and path in cache and cache[path][0] == key:
+                    minified[rel_path], digests[rel_path] = cache[path][1]
+                    continue
+                text = (minify_css if ext == '.css' else minify_js)(read_file(path))
+                minified[rel_path], digests[rel_path] = text, hash_text(text)
+                if cache is not None:
+                    cache[path] = (key, (text, digests[rel_path]))
+
+    bundled = [rel_path for rel_path in bundle if rel_path in minified]
+    if bundled:
+        minified['js/bundle.js'] = ';\n'.join(minified.pop(rel_path) for rel_path in bundled)
+        digests['js/bundle.js'] = hash_text(minified['js/bundle.js'])
+
+    assets = {}
+    for rel_path, text in minified.items():
+        stem, ext = os.path.splitext(rel_path)
+        hashed = f'{stem}.{digests[rel_path][:10]}{ext}'
+        target = os.path.join(output_dir, hashed)
+        if not os.path.exists(target):
+            write_file(target, text)
+        assets[rel_path] = hashed
+    for rel_path in bundled:
+        assets[rel_path] = assets['js/bundle.js']
+    return assets
+
+def rewrite_asset_refs(html, assets):
+    """
+    Points {{ root }}css/... and {{ root }}js/... references at the hashed
+    files from build_assets(). Of several script tags loading the same file
+    (the members of a bundle) only the first is kept.
+    """
+    if '{{ root }}' not in html:
+        return html
+    loaded = set()
+
+    def script_tag(match):
+        url = assets.get(match[1], match[1])
+        if url in loaded:
+            return ''
+        loaded.add(url)
+        return match[0].replace(match[1], url)
+
+    html = SCRIPT_TAG_RE.sub(script_tag, html)
+    return ASSET_REF_RE.sub(lambda m: '{{ root }}' + assets.get(m[1], m[1]), html)
+
+def load_pillow():
+    """Pillow's PIL.Image module, or None when Pillow is not installed."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+def image_format_supported(ext):
+    """Whether the installed Pillow can write IMAGE_TYPES[ext] (WebP and AVIF need codecs)."""
+    if ext not in ('webp', 'avif'):
+        return True
+    from PIL import features
+    try:
+        return features.check_module(ext)
+    except ValueError: # A Pillow that predates the format
+        return False
+
+def encode_images(images, quality):
+    """
+    Writes the resized and re-encoded copies of a batch of images; the unit
+    of work for parallel encoding. images are (source path, copies), each
+    copy a (path, width, extension). Returns the number of copies written.
+    """
+    from PIL import Image, ImageOps
+    written = 0
+    for source, copies in images:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            for path, width, ext in copies:
+                fmt, _, options = IMAGE_TYPES[ext]
+                copy = image
+                if width != image.width:
+                    copy = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+                if fmt == 'JPEG' and copy.mode not in ('RGB', 'L'):
+                    copy = copy.convert('RGB')
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Written aside and renamed, so concurrent builds never see half a file
+                copy.save(f'{path}.{os.getpid()}.tmp', fmt, quality=quality, **options)
+                os.replace(f'{path}.{os.getpid()}.tmp', path)
+                written += 1
+    return written
+
+def build_images(static_dir, output_dir, jobs=1, cache_dir=None, cache=None):
+    """
+    Makes responsive copies of every JPEG and PNG under static_dir's
+    IMAGE_DIR: one per IMAGE_WIDTHS width below the original's, in its own
+    format and in each of IMAGE_FORMATS (which also get a full-size copy).
+
+    Copies are encoded under cache_dir (CACHE_DIR) and named by the source
+    hash and settings, so only new or edited images are encoded (over
+    `jobs` processes); they are linked into output_dir next to the
+    originals, in both mirrors of static/, if smaller than the original
+    file. Returns the map of image path (images/photo.jpg) -> width, height
+    and its sources: [media type, [[path, width], ...]] pairs, best encoding
+    first and the original's format last, that rewrite_img_tags() applies.
+    cache is a dict kept between calls (watch mode keeps one across
+    rebuilds) of each original's size and hash, by mtime and file size, so
+    only edited images are opened and hashed again. Without Pillow the map
+    is empty.
+    """
+    Image = load_pillow()
+    if Image is None:
+        return {}
+    cache_root = os.path.join(cache_dir or CACHE_DIR, 'images')
+    formats = [ext for ext in IMAGE_FORMATS if image_format_supported(ext)]
+    planned = []
+    pending = []
+    for dirpath, dirnames, filenames in os.walk(os.path.join(static_dir, IMAGE_DIR)):
+        dirnames.sort()
+        for name in sorted(filenames):
+            ext = os.path.splitext(name)[1][1:].lower()
+            if ext not in ('jpg', 'jpeg', 'png'):
+                continue
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            key = (stat.st_mtime_ns, stat.st_size)
+            if cache is not None and path in cache and cache[path][0] == key:
+                width, height, source_hash = cache[path][1]
+            else:
+                with Image.open(path) as image:
+                    width, height = image.size
+                    if image.getexif().get(EXIF_ORIENTATION, 1) > 4:
+                        width, height = height, width
+                source_hash = hash_file(path)
+                if cache is not None:
+                    cache[path] = (key, (width, height, source_hash))
+            copies = []
+            for out_ext in formats + [ext]:
+                for w in [w for w in IMAGE_WIDTHS if w < width] + ([width] if out_ext != ext else []):
+                    key = hash_data([source_hash, w, out_ext, IMAGE_QUALITY, IMAGE_TYPES[out_ext][2]])
+                    copies.append((os.path.join(cache_root, key[:2], f'{key}.{out_ext}'), w, out_ext))
+            missing = [copy for copy in copies if not os.path.exists(copy[0])]
+            if missing:
+                pending.append((path, missing))
+            planned.append((path, ext, width, height, copies))
+
+    if pending:
+        with PROFILER.span('encode'):
+            run_in_chunks(encode_images, pending, jobs, IMAGE_QUALITY)
+
+    # Only copies smaller than the original file are worth offering (a
+    # resized PNG can easily be bigger than a well compressed original)
+    images = {}
+    for path, ext, width, height, copies in planned:
+        rel_path = os.path.relpath(path, static_dir).replace(os.sep, '/')
+        stem = os.path.splitext(rel_path)[0]
+        size = os.path.getsize(path)
+        candidates = {out_ext: [] for out_ext in formats + [ext]}
+        for cached, w, out_ext in copies:
+            if os.path.getsize(cached) < size:
+                variant = f'{stem}-{w}w.{out_ext}'
+                for target in ('static', ''):
+                    sync_file(cached, os.path.join(output_dir, target, variant), link=True)
+                candidates[out_ext].append([variant, w])
+        candidates[ext].append([rel_path, width])
+        images[rel_path] = {'width': width, 'height': height, 'sources': [
+            [IMAGE_TYPES[out_ext][1], found] for out_ext, found in candidates.items() if found]}
+
+    # Copies of images that were edited or deleted since are of no more use
+    used = {cached for *_, copies in planned for cached, _, _ in copies}
+    for dirpath, _, filenames in os.walk(cache_root):
+        for name in filenames:
+            if os.path.join(dirpath, name) not in used:
+                os.remove(os.path.join(dirpath, name))
+    return images
+
+def rewrite_img_tags(html, images):
+    """
+    Adds loading="lazy" and decoding="async" to every <img> in html. Tags
+    showing an image from build_images() (by a {{ root }}, / or ../ relative
+    src) also get its width, height and srcset, and are wrapped in a
+    <picture> offering the modern encodings first. sizes is the tag's own
+    width in pixels, or IMAGE_SIZES. Tags that have a srcset already are
+    otherwise left alone.
+    """
+    if '<img' not in html and '<IMG' not in html:
+        return html
+
+    def responsive(match):
+        tag = match[0]
+        head, close = (tag[:-2].rstrip(), ' />') if tag.endswith('/>') else (tag[:-1], '>')
+        lowered = head.lower()
+        if ' loading=' not in lowered:
+            head += ' loading="lazy"'
+        if ' decoding=' not in lowered:
+            head += ' decoding="async"'
+        src = IMG_SRC_RE.search(tag)
+        image = images.get(src[2]) if src else None
+        if image is None or ' srcset=' in lowered:
+            return head + close
+        width = IMG_WIDTH_RE.search(head)
+        sizes = f'{width[1]}px' if width else IMAGE_SIZES
+        if ' width=' not in lowered and ' height=' not in lowered:
+            head += f' width="{image["width"]}" height="{image["height"]}"'
+        srcsets = [', '.join(f'{src[1]}{path} {w}w' for path, w in candidates) for _, candidates in image['sources']]
+        head += f' srcset="{srcsets[-1]}" sizes="{sizes}"'
+        picture = ''.join(f'<source type="{media_type}" srcset="{srcset}" sizes="{sizes}">'
+                          for (media_type, _), srcset in zip(image['sources'][:-1], srcsets))
+        return f'<picture>{picture}{head}{close}</picture>'
 
-def parse_frontmatter(content):
+    return IMG_TAG_RE.sub(responsive, html)
+
+def builds_dir(output_dir=None):
+    """Staging and kept builds of output_dir (OUTPUT_DIR): a hidden sibling, so renames never cross filesystems."""
+    output_dir = os.path.abspath(output_dir or OUTPUT_DIR)
+    return os.path.join(os.path.dirname(output_dir), f'.{os.path.basename(output_dir)}-builds')
+
+def link_or_copy(src, dst):
+    """Hardlinks src to dst, or copies it (keeping mtimes) where links are not possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def stage_output(seed=None):
     """
-    Parses simple frontmatter bounded by ---
-    Returns metadata dict and body content.
+    Creates an empty staging directory for the next build and returns it.
+
+    With seed (the live output, for an incremental build) it starts as a
+    copy of seed made of hardlinks, so no data is copied; write_file and
+    sync_file replace files instead of writing into them, so the live site
+    and kept builds are never modified. Leftovers of a failed build are
+    discarded first.
     """
-    parts = content.split('---', 2)
-    if len(parts) < 3:
-        return {}, content # No frontmatter
-    
-    frontmatter = parts[1].strip()
-    body = parts[2].strip()
-    
-    metadata = {}
-    for line in frontmatter.split('\n'):
-        if ':' in line:
-            key, value = line.split(':', 1)
-            metadata[key.strip()] = value.strip()
-            
-    return metadata, body
+    staging = os.path.join(builds_dir(), 'staging')
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    if seed and os.path.isdir(seed):
+        shutil.copytree(seed, staging, symlinks=True, copy_function=link_or_copy)
+    else:
+        os.makedirs(staging)
+    return staging
 
-def markdown_to_html(text):
-    import re
-    
-    lines = text.split('\n')
-    html_lines = []
-    in_list = False
-    in_code_block = False
-    paragraph_buffer = []
-    
-    def flush_paragraph():
-        if paragraph_buffer:
-            content = ' '.join(paragraph_buffer)
-            html_lines.append(f'<p>{content}</p>')
-            paragraph_buffer.clear()
-
-    for line in lines:
-        # Code Blocks
-        if line.strip().startswith('```'):
-            flush_paragraph()
-            if in_code_block:
-                html_lines.append('</code></pre>')
-                in_code_block = False
-            else:
-                if in_list:
-                    html_lines.append('</ul>')
-                    in_list = False
-                html_lines.append('<pre><code>')
-                in_code_block = True
-            continue
-            
-        if in_code_block:
-            html_lines.append(line) # Keep indentation in code blocks
-            continue
+def exchange_paths(path1, path2):
+    """
+    Atomically swaps two paths (renameat2 on Linux, renamex_np on macOS).
+    Returns False where the system cannot.
+    """
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    path1, path2 = os.fsencode(path1), os.fsencode(path2)
+    if hasattr(libc, 'renameat2'):
+        result = libc.renameat2(AT_FDCWD, path1, AT_FDCWD, path2, RENAME_SWAP)
+    elif hasattr(libc, 'renamex_np'):
+        result = libc.renamex_np(path1, path2, RENAME_SWAP)
+    else:
+        return False
+    if result == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP): # Not on this kernel or filesystem
+        return False
+    raise OSError(error, os.strerror(error), path1, None, path2)
 
-        line = line.rstrip()
-        
-        # Empty lines (Paragraph breaks)
-        if not line:
-            flush_paragraph()
-            continue
+def kept_builds():
+    """Paths of the kept previous builds, newest first."""
+    root = builds_dir()
+    if not os.path.isdir(root):
+        return []
+    return [os.path.join(root, name) for name in sorted(os.listdir(root), reverse=True) if name != 'staging']
 
-        # Headers
-        if line.startswith('#'):
-            flush_paragraph()
-            if in_list:
-                html_lines.append('</ul>')
-                in_list = False
-                
-            level = len(line.split(' ')[0])
-            content = line[level+1:].strip()
-            html_lines.append(f'<h{level}>{content}</h{level}>')
-            continue
-            
-        # Lists
-        if line.startswith('* ') or line.startswith('- '):
-            flush_paragraph()
-            if not in_list:
-                html_lines.append('<ul>')
-                in_list = True
-            content = line[2:].strip()
-            html_lines.append(f'<li>{content}</li>')
-            continue
+def publish_output(path, keep=None):
+    """
+    Swaps the complete build at path into OUTPUT_DIR. The build it replaces
+    is kept under builds_dir() as the newest of the `keep` (KEEP_BUILDS)
+    previous builds; older ones are deleted.
+    """
+    keep = KEEP_BUILDS if keep is None else keep
+    if not os.path.exists(OUTPUT_DIR):
+        os.rename(path, OUTPUT_DIR)
+    else:
+        replaced = os.path.join(builds_dir(), datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+        if exchange_paths(path, OUTPUT_DIR):
+            os.rename(path, replaced)
         else:
-            if in_list:
-                html_lines.append('</ul>')
-                in_list = False
-        
-        # Blockquotes
-        if line.startswith('> '):
-            flush_paragraph()
-            html_lines.append(f'<blockquote>{line[2:].strip()}</blockquote>')
-            continue
-            
-        # Regular text - append to buffer
-        paragraph_buffer.append(line.strip())
-        
-    # End of loop cleanup
-    flush_paragraph()
-    if in_list:
-        html_lines.append('</ul>')
-    if in_code_block:
-        html_lines.append('</code></pre>')
-        
-    html = '\n'.join(html_lines)
-    
-    # Inline formatting
-    # Bold
-    html = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', html)
-    # Italic
-    html = re.sub(r'\*(.*?)\*', r'<em>\1</em>', html)
-    # Links
-    html = re.sub(r'\[(.*?)\]\((.*?)\)', r'<a href="\2">\1</a>', html)
-    
-    return html
+            # The output is missing for the instant between the two renames
+            os.rename(OUTPUT_DIR, replaced)
+            os.rename(path, OUTPUT_DIR)
+    for old in kept_builds()[keep:]:
+        shutil.rmtree(old)
 
-def calculate_similarity(text1, text2):
+def rollback(keep=None):
+    """Puts the newest kept build back in OUTPUT_DIR; the current one is kept, so rolling back again undoes it."""
+    builds = kept_builds()
+    if not builds:
+        raise FileNotFoundError(f"No previous builds in {builds_dir()}")
+    publish_output(builds[0], keep)
+    print(f"Restored the build from {os.path.basename(builds[0])}.")
+
+def build(incremental=False, related_backend=None, jobs=1, cache=True, fingerprint=None, bundle_js=None,
+          precompress_outputs=False, verify_compression=False, state=None, provisional=False, explain=False,
+          profile=None, page_size=None, keep_builds=None, feed_items=None, feed_full_content=None,
+          responsive_images=None):
     """
-    Calculates Jaccard similarity between two texts.
-    Simple, fast, and effective for small-to-medium corpuses.
+    Builds the site into OUTPUT_DIR.
+
+    The site is written to a staging directory and swapped into OUTPUT_DIR
+    only once complete; the build it replaces is kept, with the newest
+    keep_builds (KEEP_BUILDS) before it, for rollback(). Incremental builds
+    with a BuildState (watch mode) update OUTPUT_DIR in place instead, and
+    keep nothing. A full build starts
+    from nothing. With incremental=True staging starts from the current
+    output and only pages whose inputs changed (per the manifest written by
+    the last build) are rendered again. related_backend picks the
+    "Read Next" scoring (see RELATED_BACKENDS); defaults to RELATED_BACKEND.
+    Post pages are rendered by `jobs` processes (0 means one per CPU).
+    Posts are loaded from the ContentStore and markdown bodies looked up in
+    the RenderCache, both under CACHE_DIR, unless cache=False. fingerprint and bundle_js switch the asset pipeline
+    (see build_assets); they default to FINGERPRINT_ASSETS and BUNDLE_JS.
+    precompress_outputs adds .gz/.br siblings of the text outputs, checked
+    for a byte-exact round trip with verify_compression. A BuildState lets
+    repeated builds in one process (see watch) skip re-reading unchanged
+    posts and, with provisional=True, re-scoring "Read Next" picks.
+    explain lists every rendered page with the inputs that changed. profile
+    is a path to write a Chrome trace of every stage to (see Profiler); a
+    summary table is printed too. page_size is the number of cards per
+    homepage or tag page (POSTS_PER_PAGE by default, 0 for a single page).
+    feed_items caps the posts in each feed (FEED_ITEMS by default, 0 for
+    all) and feed_full_content puts whole posts in them (FEED_FULL_CONTENT).
+    responsive_images (RESPONSIVE_IMAGES) adds resized and WebP/AVIF copies
+    of static images and points <img> tags at them (see build_images).
+    Returns the build's manifest.
     """
-    import re
-    
-    # Simple stop words list
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'that', 'this', 'it', 'he', 'she', 'they', 'i', 'you', 'we', 'as', 'from', 'can', 'will', 'not', 'have', 'has', 'had', 'do', 'does', 'did', 'but', 'at', 'by', 'with', 'from', 'here', 'when', 'where', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', 'should', 'now'}
-    
-    def tokenize(text):
-        # Lowercase and remove non-alphanumeric
-        text = re.sub(r'[^\w\s]', '', text.lower())
-        words = text.split()
-        return set(w for w in words if w not in stop_words and len(w) > 2)
-        
-    tokens1 = tokenize(text1)
-    tokens2 = tokenize(text2)
-    
-    if not tokens1 or not tokens2:
-        return 0.0
-        
-    intersection = len(tokens1.intersection(tokens2))
-    union = len(tokens1.union(tokens2))
-    
-    return intersection / union if union > 0 else 0.0
+    if profile:
+        PROFILER.start()
+    jobs = jobs or os.cpu_count() or 1
+    page_size = POSTS_PER_PAGE if page_size is None else page_size
+    feed_items = FEED_ITEMS if feed_items is None else feed_items
+    feed_full_content = FEED_FULL_CONTENT if feed_full_content is None else feed_full_content
+    render_cache = RenderCache() if cache else None
+    generator = hash_text(read_file(os.path.abspath(__file__)))
 
-def build():
     # 1. Prepare Output Directory
-    if os.path.exists(OUTPUT_DIR):
-        shutil.rmtree(OUTPUT_DIR)
-    os.makedirs(OUTPUT_DIR)
+    PROFILER.stage('prepare output')
+    # Pages are written to a staging directory that replaces OUTPUT_DIR only
+    # once the build is complete (see publish_output). Seeding it links every
+    # file of the site, too much for each save in watch mode, whose builds
+    # update OUTPUT_DIR in place.
+    manifest = BuildManifest.load(OUTPUT_DIR, generator, outputs=incremental)
+    in_place = incremental and state is not None
+    if in_place:
+        output_dir = OUTPUT_DIR
+        os.makedirs(output_dir, exist_ok=True)
+    else:
+        output_dir = stage_output(OUTPUT_DIR if manifest.previous else None)
+    manifest.output_dir = output_dir
     
-    # 2. Copy Static Assets
-    shutil.copytree(STATIC_DIR, os.path.join(OUTPUT_DIR, 'static'))
-    # Also copy style.css to root css/ folder for compatibility if needed, 
-    # but our templates use {{ root }}static/css so we should be good.
-    # Wait, templates use {{ root }}css/style.css. 
-    # Let's match the template expectation: static/css -> docs/css
-    # Actually, let's just copy static/* to docs/*
-    # So docs/css/style.css exists.
-    
-    # Re-copying to match structure
-    # static/css -> docs/css
-    # static/js -> docs/js
-    for item in os.listdir(STATIC_DIR):
-        s = os.path.join(STATIC_DIR, item)
-        d = os.path.join(OUTPUT_DIR, item)
-        if os.path.isdir(s):
-            shutil.copytree(s, d)
-        else:
-            shutil.copy2(s, d)
+    # 2. Sync Static Assets
+    PROFILER.stage('sync static assets')
+    # static/ is mirrored twice: to docs/static/ (absolute /static/... URLs)
+    # and to the docs root, where templates expect {{ root }}css/... and
+    # {{ root }}js/.... Unchanged files are left alone on incremental builds.
+    synced = unchanged_assets = 0
+    for target in ('static', ''):
+        for rel_path, copied in sync_assets(STATIC_DIR, os.path.join(output_dir, target)):
+            manifest.outputs[os.path.join(target, rel_path).replace(os.sep, '/')] = {'asset': rel_path}
+            synced += copied
+            unchanged_assets += not copied
 
-    # 3. Load Templates
-    base_template = read_file(os.path.join(TEMPLATE_DIR, 'base.html'))
-    post_template = read_file(os.path.join(TEMPLATE_DIR, 'post.html'))
-    index_template = read_file(os.path.join(TEMPLATE_DIR, 'index.html'))
+    # 2b. Minify and fingerprint CSS/JS; pages link the hashed copies
+    PROFILER.stage('fingerprint assets')
+    assets = {}
+    if FINGERPRINT_ASSETS if fingerprint is None else fingerprint:
+        bundle = ()
+        if BUNDLE_JS if bundle_js is None else bundle_js:
+            bundle = SCRIPT_TAG_RE.findall(read_file(os.path.join(TEMPLATE_DIR, 'base.html')))
+        assets = build_assets(STATIC_DIR, output_dir, bundle, cache=state.assets if state else None)
+        for hashed in assets.values():
+            manifest.outputs[hashed] = {'asset': hashed}
 
-    # 4. Process Posts
-    posts = []
-    for filename in os.listdir(CONTENT_DIR):
-        if not filename.endswith('.html') and not filename.endswith('.md'):
-            continue
-            
-        # Skip standalone pages
-        if filename in ['about.html', 'consulting.md']:
-            continue
-            
-        filepath = os.path.join(CONTENT_DIR, filename)
-        raw_content = read_file(filepath)
-        metadata, body = parse_frontmatter(raw_content)
-        
-        # Convert Markdown to HTML if it's a markdown file or just generally
-        # Since we are writing raw markdown in the files, we should convert it.
-        if filename.endswith('.md') or True: # Always try to convert for now
-            body = markdown_to_html(body)
-        
-        # Slug is filename without extension
-        slug = os.path.splitext(filename)[0]
-        metadata['slug'] = slug
-        
-        # Series Indicator
-        series = metadata.get('series')
-        series_html = ""
-        if series:
-            series_html = f'<div class="series-indicator">Series: {series}</div>'
+    # 2c. Resize and re-encode images; pages offer the copies in a srcset
+    PROFILER.stage('responsive images')
+    images = None
+    if RESPONSIVE_IMAGES if responsive_images is None else responsive_images:
+        images = build_images(STATIC_DIR, output_dir, jobs, cache=state.images if state else None)
+        for image in images.values():
+            for _, candidates in image['sources']:
+                for rel_path, _ in candidates:
+                    for target in ('static/', ''):
+                        manifest.outputs.setdefault(target + rel_path, {'asset': rel_path})
+        if not load_pillow():
+            print("Pillow is not installed, so images are served at their original size (pip install pillow).")
 
+    # 3. Load Templates (compiled once, shared by every page below)
+    PROFILER.stage('load templates')
+    templates = load_templates(assets=assets, images=images)
+    template_hashes = {f'template:{name}': template.digest for name, template in templates.items()}
+    # Post bodies and standalone pages can link assets and images too; every
+    # page is wrapped in base.html, so that is where both maps are accounted for.
+    template_hashes['template:base'] = hash_data([template_hashes['template:base'], assets, images])
 
+    # 4. Load Posts: from the content store, which only re-reads files that
+    # changed; without it every file is read once, here
+    PROFILER.stage('load posts')
+    if cache:
+        with contextlib.closing(ContentStore()) as store:
+            with PROFILER.span('sync'):
+                store.sync()
+            corpus = store.load_posts(cache=state.posts if state else None)
+    else:
+        corpus = load_posts(cache=state.posts if state else None)
+    for record in corpus:
+        manifest.posts[record.slug] = {'source': record.source_hash, 'metadata': dict(record.metadata)}
+    manifest.date_posts(corpus)
 
-        # Related Posts (Placeholder for now, we need a second pass or pre-calculation)
-        # Since we are iterating through posts to generate them, we might not have the full list yet if we do it in one pass.
-        # However, we collected `posts` list earlier? No, we are inside the loop that populates `posts`.
-        # We need to change the order: First collect all metadata, THEN generate HTML.
-        
-        # For now, let's just append metadata to list first, then do a second pass for generation.
-        posts.append(metadata)
-
-    # Sort posts: Featured first, then by Date (descending), then by Title (ascending)
-    def post_sort_key(p):
-        is_featured = p.get('featured', 'false').lower() == 'true'
-        date_str = p.get('date', '1970-01-01')
-        title = p.get('title', '')
-        return (not is_featured, date_str, title) # False < True for boolean sort? No, False=0, True=1. We want True first.
-        # Wait, False < True. So (True, ...) comes AFTER (False, ...).
-        # We want Featured (True) to be FIRST (smallest index) or LAST (largest index)?
-        # If we sort descending (reverse=True), True > False, so True comes first.
-        # But date should be descending (newest first).
-        # And title should be ascending (A-Z).
-        # Complex sort. Let's use a tuple with negation for descending parts if we use default sort.
-        # Or just use reverse=True and negate the ascending parts.
-        # Let's do: (is_featured, date_str) -> reverse=True.
-        # Title is secondary.
-        
-    # Let's keep it simple.
-    # Primary: Featured (True > False)
-    # Secondary: Date (New > Old)
-    # Tertiary: Title (Z > A if reverse=True, which is weird).
-    
-    # Better approach:
-    posts.sort(key=lambda x: (
-        x.get('featured', 'false').lower() == 'true', # True (1) > False (0)
-        x.get('date', '1970-01-01'),
-        x.get('title', '')
+    # Sort posts: Featured first (True > False), then by Date (newest first), then by Title
+    corpus.sort(key=lambda r: (
+        r.metadata.get('featured', 'false').lower() == 'true', # True (1) > False (0)
+        r.metadata.get('date', '1970-01-01'),
+        r.metadata.get('title', '')
     ), reverse=True)
+    posts = [record.metadata for record in corpus]
+    # Pages list posts newest first; sorted stably, so featured posts still lead within a date
+    posts.sort(key=lambda x: x.get('date', '0000-00-00'), reverse=True)
+    taxonomy = Taxonomy(posts)
 
-    # 4b. Second Pass: Generate HTML for Posts (now that we have all metadata for related posts)
-    for post in posts:
-        slug = post['slug']
-        # Re-read body because we didn't store it in metadata (to save memory/complexity, though we could have)
-        # Actually, let's just re-read the file. It's fast enough.
-        # Wait, we need the body content.
-        # Let's refactor slightly to store body in a separate dict or just re-read.
-        # Re-reading is safer for now to avoid breaking the loop structure too much.
-        
-        # Find related posts using AI (Jaccard Similarity)
-        # We compare the current post's body with every other post's body
-        related_scores = []
-        
-        # Get current post body (we need to find it in the list or re-read)
-        # Since we are iterating `posts`, `post` is the metadata. We need the body.
-        # Let's re-read the body for the current post
-        current_slug = post['slug']
-        current_filepath = os.path.join(CONTENT_DIR, current_slug + '.md')
-        if not os.path.exists(current_filepath): current_filepath = os.path.join(CONTENT_DIR, current_slug + '.html')
-        _, current_body = parse_frontmatter(read_file(current_filepath))
-        
-        for p in posts:
-            if p['slug'] == slug: continue
-            
-            # Re-read other post body
-            p_filepath = os.path.join(CONTENT_DIR, p['slug'] + '.md')
-            if not os.path.exists(p_filepath): p_filepath = os.path.join(CONTENT_DIR, p['slug'] + '.html')
-            _, p_body = parse_frontmatter(read_file(p_filepath))
-            
-            # Calculate score
-            score = calculate_similarity(current_body, p_body)
-            
-            # Boost score if categories match
-            if p.get('category') == post.get('category'):
-                score += 0.1
-                
-            related_scores.append((score, p))
-            
-        # Sort by score descending
-        related_scores.sort(key=lambda x: x[0], reverse=True)
-        
-        # Take top 2
-        related = [item[1] for item in related_scores[:2] if item[0] > 0.05] # Threshold to avoid garbage matches
-        
-        related_html = ""
-        if related:
-            related_items = ""
-            for r in related:
-                r_tags = r.get('tags', '').split(',') if r.get('tags') else [r.get('category', 'General')]
-                r_primary_tag = r_tags[0].strip() if r_tags else 'General'
-                related_items += f"""
-                <a href="{r['slug']}.html" class="post-card">
-                    <span class="post-meta">{r_primary_tag} • {r.get('read_time', '5 min read')}</span>
-                    <h3>{r.get('title')}</h3>
-                </a>
-                """
-            related_html = f"""
-            <div class="related-posts">
-                <div class="related-header">Read Next</div>
-                <div class="related-grid">
-                    {related_items}
-                </div>
-            </div>
-            """
+    # 4a. Score "Read Next" picks
+    PROFILER.stage('related posts')
+    picks = related_picks(corpus, related_backend or RELATED_BACKEND, state, provisional)
+    records = {record.slug: record for record in corpus}
 
-        # Re-read content for generation
-        # We need to duplicate some logic here, or better yet, just move the generation here.
-        # Let's grab the body again.
-        filepath = os.path.join(CONTENT_DIR, post['slug'] + ('.md' if os.path.exists(os.path.join(CONTENT_DIR, post['slug'] + '.md')) else '.html'))
-        # Actually filename was lost. Let's just look for it.
-        if os.path.exists(os.path.join(CONTENT_DIR, slug + '.md')):
-            filepath = os.path.join(CONTENT_DIR, slug + '.md')
-        else:
-            filepath = os.path.join(CONTENT_DIR, slug + '.html')
-            
-        raw_content = read_file(filepath)
-        _, body = parse_frontmatter(raw_content)
-        if filepath.endswith('.md'):
-            body = markdown_to_html(body)
-
-        # Generate Tags HTML again
-        tags = post.get('tags', '').split(',') if post.get('tags') else [post.get('category', 'General')]
-        tags_html = ""
-        for tag in tags:
-            tag = tag.strip()
-            if not tag: continue
-            tag_slug = tag.lower().replace(' ', '-')
-            color_index = sum(ord(c) for c in tag) % 6
-            tags_html += f'<a href="{{{{ root }}}}tags/{tag_slug}.html" class="post-tag tag-color-{color_index}">{tag}</a> '
-
-        # Series HTML again (since we are in new loop)
-        series = post.get('series')
-        series_html = ""
-        if series:
-            series_html = f'<div class="series-indicator">Series: {series}</div>'
-
-        post_html = post_template.replace('{{ title }}', post.get('title', 'Untitled'))
-        post_html = post_html.replace('{{ category }}', post.get('category', 'General'))
-        post_html = post_html.replace('{{ tags_html }}', tags_html)
-        post_html = post_html.replace('{{ series_indicator }}', series_html)
-        post_html = post_html.replace('{{ post_content }}', body)
-        # post_html = post_html.replace('{{ reply_section }}', reply_html) # Removed
-        post_html = post_html.replace('{{ related_posts }}', related_html)
-        post_html = post_html.replace('{{ root }}', '../')
-        post_html = post_html.replace('{{ slug }}', slug)
+    # 4b. Generate HTML for Posts (now that we have all metadata for related posts)
+    PROFILER.stage('post pages')
+    pending = []
+    for record in corpus:
+        post = record.metadata
+        slug = record.slug
         
-        # Generate JSON-LD
-        import json
-        json_ld_data = {
-            "@context": "https://schema.org",
-            "@type": "BlogPosting",
-            "headline": post.get('title', 'Untitled'),
-            "image": [post.get('image', DEFAULT_IMAGE)],
-            "datePublished": post.get('date', ''),
-            "dateModified": post.get('date', ''),
-            "author": [{
-                "@type": "Person",
-                "name": "Isaac Hernandez",
-                "url": BASE_URL
-            }]
+        # Find related posts
+        related = [records[s].metadata for s in picks.get(slug, ()) if s in records]
+
+        # Skip the page if neither its source, its templates nor the related
+        # posts it links to changed since the last build.
+        inputs = {
+            'template:base': template_hashes['template:base'],
+            'template:post': template_hashes['template:post'],
+            'source': record.source_hash,
+            'related': hash_fields(related, RELATED_FIELDS),
         }
-        json_ld_script = f'<script type="application/ld+json">{json.dumps(json_ld_data)}</script>'
-
-        full_page = base_template.replace('{{ title }}', post.get('title', 'Untitled'))
-        full_page = full_page.replace('{{ content }}', post_html)
-        full_page = full_page.replace('{{ root }}', '../')
-        full_page = full_page.replace('{{ description }}', post.get('excerpt', 'Thoughts on business, technology, and the human condition.'))
-        full_page = full_page.replace('{{ url }}', f"{BASE_URL}/posts/{slug}.html")
-        full_page = full_page.replace('{{ image }}', post.get('image', DEFAULT_IMAGE))
-        full_page = full_page.replace('{{ og_type }}', 'article')
-        full_page = full_page.replace('{{ json_ld }}', json_ld_script)
+        if not manifest.needs_render(f'posts/{slug}.html', inputs):
+            continue
         
-        write_file(os.path.join(OUTPUT_DIR, 'posts', f'{slug}.html'), full_page)
+        body = rewrite_asset_refs(record.body, assets) if assets else record.body
+        pending.append((slug, record.path, post, body, related))
+    render_posts(pending, jobs, render_cache, output_dir, images)
 
     # 5. Generate Homepage
-    # Sort posts by date (descending)
-    posts.sort(key=lambda x: x.get('date', '0000-00-00'), reverse=True)
-    
+    PROFILER.stage('homepage')
     # Generate Filter HTML
-    categories = sorted(list(set(p.get('category', 'General') for p in posts if p.get('slug') != 'about')))
+    categories = sorted(taxonomy.categories)
     filter_html = '<div class="filter-bar">'
     filter_html += '<button class="filter-btn active" data-filter="all">All</button>'
     for cat in categories:
         filter_html += f'<button class="filter-btn" data-filter="{cat}">{cat}</button>'
     filter_html += '</div>'
-    
+
     # Add Sort Controls
     filter_html += '''
     <div class="sort-bar" style="margin-top: 1rem; display: flex; gap: 0.5rem; align-items: center;">
@@ -414,11 +2368,11 @@ def build():
         <button class="sort-btn" data-sort="date-asc" style="background:none; border:none; cursor:pointer; font-size:0.9rem; color:#666; font-weight:400; padding:0;">Oldest</button>
     </div>
     '''
-    
+
     # Split Featured vs Recent
     featured_post = None
     recent_posts = []
-    
+
     # Find first non-about post for featured
     for i, post in enumerate(posts):
         if post['slug'] != 'about':
@@ -426,25 +2380,11 @@ def build():
                 featured_post = post
             else:
                 recent_posts.append(post)
-    
+
     # Generate Featured Post HTML
     featured_html = ""
     if featured_post:
-        tags = featured_post.get('tags', '').split(',') if featured_post.get('tags') else [featured_post.get('category', 'General')]
-        tags = [t.strip() for t in tags if t.strip()]
-        primary_tag = tags[0] if tags else 'General'
-        
-        # Format date
-        date_str = featured_post.get('date', '')
-        if date_str:
-            try:
-                date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-                date_display = date_obj.strftime('%b %d, %Y')
-            except:
-                date_display = date_str
-        else:
-            date_display = ""
-            
+        primary_tag, date_display = post_card_meta(featured_post)
         featured_html = f"""
             <a href="posts/{featured_post['slug']}.html" class="featured-card">
                 <div class="featured-content">
@@ -459,27 +2399,55 @@ def build():
             </a>
         """
 
-    # Generate Recent Posts HTML
-    posts_html = ""
-    for post in recent_posts:
-        # Handle tags for display
-        tags = post.get('tags', '').split(',') if post.get('tags') else [post.get('category', 'General')]
-        tags = [t.strip() for t in tags if t.strip()]
-        primary_tag = tags[0] if tags else 'General'
-        
-        # Format date
-        date_str = post.get('date', '')
-        if date_str:
-            try:
-                date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-                date_display = date_obj.strftime('%b %d, %Y')
-            except:
-                date_display = date_str
-        else:
-            date_display = ""
-            
-        posts_html += f"""
-            <a href="posts/{post['slug']}.html" class="post-card" data-category="{post.get('category', 'General')}" data-date="{post.get('date', '')}">
+    # Generate Sidebar Collections List: the top 5 tags by post count
+    top_tags = sorted(taxonomy.tags.values(), key=lambda tag: tag.count, reverse=True)[:5]
+
+    collections_list_html = ""
+    for tag in top_tags:
+        collections_list_html += f"""
+            <li>
+                <a href="{{{{ root }}}}tags/{tag.slug}.html" class="collection-link">
+                    <span class="name">{tag.name}</span>
+                    <span class="count">{tag.count}</span>
+                </a>
+            </li>
+        """
+
+    # Recent posts are split into pages: index.html, page/2.html, ... Each
+    # page's cards are also written to page/N.json for the client-side
+    # filter and sort, which fetch them only when they need every post.
+    home_pages = paginate(recent_posts, page_size)
+    home_paths = ['index.html'] + [f'page/{n}.html' for n in range(2, len(home_pages) + 1)]
+    sidebar_hash = hash_text(filter_html + collections_list_html)
+    for number, page_posts in enumerate(home_pages, 1):
+        root = '' if number == 1 else '../'
+        page_data = [dict(zip(('tag', 'date_display'), post_card_meta(post)),
+                          url=f"posts/{post['slug']}.html", title=post.get('title', 'Untitled'),
+                          excerpt=post.get('excerpt', ''), category=post.get('category', 'General'),
+                          date=post.get('date', ''), read_time=post.get('read_time', '5 min read'))
+                     for post in page_posts]
+        data_path = f'page/{number}.json'
+        if manifest.needs_render(data_path, {'posts': hash_data(page_data), 'pages': len(home_pages)}):
+            write_file(os.path.join(output_dir, data_path), json.dumps(
+                {'page': number, 'pages': len(home_pages), 'posts': page_data}))
+
+        index_inputs = {
+            'template:base': template_hashes['template:base'],
+            'template:index': template_hashes['template:index'],
+            'posts': hash_fields(([featured_post] if number == 1 and featured_post else []) + page_posts, INDEX_FIELDS),
+            'sidebar': sidebar_hash,
+            'pages': len(home_pages),
+            'page_size': page_size,
+        }
+        if not manifest.needs_render(home_paths[number - 1], index_inputs):
+            continue
+
+        # Generate Recent Posts HTML
+        posts_html = ""
+        for post in page_posts:
+            primary_tag, date_display = post_card_meta(post)
+            posts_html += f"""
+            <a href="{root}posts/{post['slug']}.html" class="post-card" data-category="{post.get('category', 'General')}" data-date="{post.get('date', '')}">
                 <h2 class="post-title">{post.get('title', 'Untitled')}</h2>
                 <p class="post-excerpt">{post.get('excerpt', '')}</p>
                 <div class="post-meta-row">
@@ -488,141 +2456,129 @@ def build():
                 </div>
             </a>
         """
-        
-    # Generate Sidebar Collections List
-    # We need to calculate counts first (which we do later in step 6, but let's do a quick pass here or reorder)
-    # Let's just do a quick pass to get counts
-    tag_counts = {}
-    for post in posts:
-        if post['slug'] == 'about': continue
-        post_tags = post.get('tags', '').split(',') if post.get('tags') else [post.get('category', 'General')]
-        for tag in post_tags:
-            tag = tag.strip()
-            if not tag: continue
-            tag_counts[tag] = tag_counts.get(tag, 0) + 1
-            
-    # Sort tags by count (descending) and take top 5
-    top_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-    
-    collections_list_html = ""
-    for tag, count in top_tags:
-        tag_slug = tag.lower().replace(' ', '-')
-        collections_list_html += f"""
-            <li>
-                <a href="tags/{tag_slug}.html" class="collection-link">
-                    <span class="name">{tag}</span>
-                    <span class="count">{count}</span>
-                </a>
-            </li>
-        """
-        
-    index_content = index_template.replace('{{ featured_post }}', featured_html)
-    index_content = index_content.replace('{{ recent_posts }}', posts_html)
-    index_content = index_content.replace('{{ filters }}', filter_html)
-    index_content = index_content.replace('{{ collections_list }}', collections_list_html)
-    
-    full_index = base_template.replace('{{ title }}', 'Does This Feel Right?')
-    full_index = full_index.replace('{{ content }}', index_content)
-    full_index = full_index.replace('{{ root }}', '') # Root is empty for index
-    full_index = full_index.replace('{{ description }}', 'Thoughts on business, technology, and the human condition.')
-    full_index = full_index.replace('{{ url }}', f"{BASE_URL}/index.html")
-    full_index = full_index.replace('{{ image }}', DEFAULT_IMAGE)
-    full_index = full_index.replace('{{ og_type }}', 'website')
-    full_index = full_index.replace('{{ json_ld }}', '')
-    
-    write_file(os.path.join(OUTPUT_DIR, 'index.html'), full_index)
+
+        page_suffix = '' if number == 1 else f' - Page {number}'
+        full_index = render_page('index', {
+            'featured_post': featured_html if number == 1 else '',
+            'recent_posts': posts_html,
+            'filters': filter_html,
+            'collections_list': expand_root(collections_list_html, root),
+            'pagination': pagination_html(home_paths, number, root),
+            'page_count': str(len(home_pages)),
+            'page_size': str(page_size),
+            'title': f'Does This Feel Right?{page_suffix}',
+            'root': root,
+            'description': 'Thoughts on business, technology, and the human condition.',
+            'url': f"{BASE_URL}/{home_paths[number - 1]}",
+            'image': DEFAULT_IMAGE,
+            'og_type': 'website',
+            'json_ld': '',
+        })
+
+        write_file(os.path.join(output_dir, home_paths[number - 1]), full_index)
 
     # 6. Generate Tag Pages & Collections Index
-    # Collect all tags
-    all_tags = {}
-    for post in posts:
-        if post['slug'] == 'about': continue
-        
-        post_tags = post.get('tags', '').split(',') if post.get('tags') else [post.get('category', 'General')]
-        for tag in post_tags:
-            tag = tag.strip()
-            if not tag: continue
-            if tag not in all_tags:
-                all_tags[tag] = []
-            all_tags[tag].append(post)
-            
-    # Generate individual tag pages
-    tag_template = read_file(os.path.join(TEMPLATE_DIR, 'tag.html'))
-    
-    for tag, tag_posts in all_tags.items():
-        tag_slug = tag.lower().replace(' ', '-')
-        
-        tag_posts_html = ""
-        for post in tag_posts:
-            tag_posts_html += f"""
-                <a href="../posts/{post['slug']}.html" class="post-card">
+    PROFILER.stage('tag pages')
+    # Generate individual tag pages: tags/<slug>.html, then tags/<slug>/page/N.html
+    for tag in taxonomy.tags.values():
+        tag_pages = paginate(tag.posts, page_size)
+        tag_paths = [f'tags/{tag.slug}.html'] + [f'tags/{tag.slug}/page/{n}.html' for n in range(2, len(tag_pages) + 1)]
+        for number, page_posts in enumerate(tag_pages, 1):
+            tag_inputs = {
+                'template:base': template_hashes['template:base'],
+                'template:tag': template_hashes['template:tag'],
+                'posts': hash_fields(page_posts, TAG_PAGE_FIELDS),
+                'name': tag.name,
+                'count': tag.count,
+                'pages': len(tag_pages),
+            }
+            if not manifest.needs_render(tag_paths[number - 1], tag_inputs):
+                continue
+
+            root = '../' if number == 1 else '../../../'
+            tag_posts_html = ""
+            for post in page_posts:
+                tag_posts_html += f"""
+                <a href="{root}posts/{post['slug']}.html" class="post-card">
                     <span class="post-meta">{post.get('read_time', '5 min read')}</span>
                     <h2>{post.get('title', 'Untitled')}</h2>
                     <p class="post-excerpt">{post.get('excerpt', '')}</p>
                 </a>
             """
-            
-        tag_page = tag_template.replace('{{ tag }}', tag)
-        tag_page = tag_page.replace('{{ count }}', str(len(tag_posts)))
-        tag_page = tag_page.replace('{{ posts_list }}', tag_posts_html)
-        tag_page = tag_page.replace('{{ root }}', '../')
-        
-        full_tag_page = base_template.replace('{{ title }}', f'{tag} - Does This Feel Right?')
-        full_tag_page = full_tag_page.replace('{{ content }}', tag_page)
-        full_tag_page = full_tag_page.replace('{{ root }}', '../')
-        full_tag_page = full_tag_page.replace('{{ description }}', f'Essays about {tag}.')
-        full_tag_page = full_tag_page.replace('{{ url }}', f"{BASE_URL}/tags/{tag_slug}.html")
-        full_tag_page = full_tag_page.replace('{{ image }}', DEFAULT_IMAGE)
-        full_tag_page = full_tag_page.replace('{{ og_type }}', 'website')
-        full_tag_page = full_tag_page.replace('{{ json_ld }}', '')
-        
-        write_file(os.path.join(OUTPUT_DIR, 'tags', f'{tag_slug}.html'), full_tag_page)
-        
+
+            page_suffix = '' if number == 1 else f' - Page {number}'
+            full_tag_page = render_page('tag', {
+                'tag': tag.name,
+                'count': str(tag.count),
+                'feed_link': f' · <a href="{root}tags/{tag.slug}/feed.xml">RSS</a>' if TAG_FEEDS else '',
+                'posts_list': tag_posts_html,
+                'pagination': pagination_html(tag_paths, number, root),
+                'title': f'{tag.name}{page_suffix} - Does This Feel Right?',
+                'root': root,
+                'description': f'Essays about {tag.name}.',
+                'url': f"{BASE_URL}/{tag_paths[number - 1]}",
+                'image': DEFAULT_IMAGE,
+                'og_type': 'website',
+                'json_ld': '',
+            })
+
+            write_file(os.path.join(output_dir, tag_paths[number - 1]), full_tag_page)
+
     # Generate Collections Index
-    collections_template = read_file(os.path.join(TEMPLATE_DIR, 'collections.html'))
-    
-    collections_html = ""
-    for tag in sorted(all_tags.keys()):
-        tag_slug = tag.lower().replace(' ', '-')
-        count = len(all_tags[tag])
-        collections_html += f"""
-            <a href="tags/{tag_slug}.html" class="collection-card">
-                <h3>{tag}</h3>
-                <span class="count">{count} essay{'s' if count != 1 else ''}</span>
+    PROFILER.stage('collections')
+    collections_inputs = {
+        'template:base': template_hashes['template:base'],
+        'template:collections': template_hashes['template:collections'],
+        'tags': hash_data(sorted((tag.name, tag.slug, tag.count) for tag in taxonomy.tags.values())),
+    }
+    if manifest.needs_render('collections.html', collections_inputs):
+        collections_html = ""
+        for tag in sorted(taxonomy.tags.values(), key=lambda tag: tag.name):
+            collections_html += f"""
+            <a href="tags/{tag.slug}.html" class="collection-card">
+                <h3>{tag.name}</h3>
+                <span class="count">{tag.count} essay{'s' if tag.count != 1 else ''}</span>
             </a>
         """
         
-    full_collections = collections_template.replace('{{ collections_list }}', collections_html)
-    
-    full_collections_page = base_template.replace('{{ title }}', 'Collections - Does This Feel Right?')
-    full_collections_page = full_collections_page.replace('{{ content }}', full_collections)
-    full_collections_page = full_collections_page.replace('{{ root }}', '')
-    full_collections_page = full_collections_page.replace('{{ description }}', 'Explore essays by topic.')
-    full_collections_page = full_collections_page.replace('{{ url }}', f"{BASE_URL}/collections.html")
-    full_collections_page = full_collections_page.replace('{{ image }}', DEFAULT_IMAGE)
-    full_collections_page = full_collections_page.replace('{{ og_type }}', 'website')
-    full_collections_page = full_collections_page.replace('{{ json_ld }}', '')
+        full_collections_page = render_page('collections', {
+            'collections_list': collections_html,
+            'title': 'Collections - Does This Feel Right?',
+            'root': '',
+            'description': 'Explore essays by topic.',
+            'url': f"{BASE_URL}/collections.html",
+            'image': DEFAULT_IMAGE,
+            'og_type': 'website',
+            'json_ld': '',
+        })
     
-    write_file(os.path.join(OUTPUT_DIR, 'collections.html'), full_collections_page)
+        write_file(os.path.join(output_dir, 'collections.html'), full_collections_page)
 
 
 
     # 9. Generate About Page (Special Case)
+    PROFILER.stage('about page')
     # We can just have an about.md in content and treat it differently or just hardcode it.
     # Let's look for about.html in content
     if os.path.exists(os.path.join(CONTENT_DIR, 'about.html')):
         raw_about = read_file(os.path.join(CONTENT_DIR, 'about.html'))
-        meta, body = parse_frontmatter(raw_about)
-        
-        # About page uses a simpler layout, usually just the article content
-        # We can reuse post template logic but without the newsletter box if we wanted, 
-        # but for now let's just use the generic page logic.
-        
-        # Actually, the about page in the design had a newsletter box too.
-        # Let's just render it like a post but without the "Back to Home" link maybe?
-        # Or just render it.
-        
-        about_html = f"""
+        about_inputs = {'template:base': template_hashes['template:base'], 'source': hash_text(raw_about)}
+        if manifest.needs_render('about.html', about_inputs):
+            meta, body = parse_frontmatter(raw_about)
+            if assets:
+                body = rewrite_asset_refs(body, assets)
+            if images is not None:
+                body = rewrite_img_tags(body, images)
+
+            # About page uses a simpler layout, usually just the article content
+            # We can reuse post template logic but without the newsletter box if we wanted, 
+            # but for now let's just use the generic page logic.
+
+            # Actually, the about page in the design had a newsletter box too.
+            # Let's just render it like a post but without the "Back to Home" link maybe?
+            # Or just render it.
+
+            about_html = f"""
             <article>
                 <h1>{meta.get('title')}</h1>
                 {body}
@@ -631,102 +2587,129 @@ def build():
                 </div>
             </article>
         """
-        
-        full_about = base_template.replace('{{ title }}', meta.get('title'))
-        full_about = full_about.replace('{{ content }}', about_html)
-        full_about = full_about.replace('{{ root }}', '')
-        full_about = full_about.replace('{{ description }}', meta.get('excerpt', 'About us.'))
-        full_about = full_about.replace('{{ url }}', f"{BASE_URL}/about.html")
-        full_about = full_about.replace('{{ image }}', DEFAULT_IMAGE)
-        full_about = full_about.replace('{{ og_type }}', 'website')
-        full_about = full_about.replace('{{ json_ld }}', '')
-        
-        write_file(os.path.join(OUTPUT_DIR, 'about.html'), full_about)
+
+            full_about = render_page('page', {
+                'content': about_html,
+                'title': meta.get('title'),
+                'root': '',
+                'description': meta.get('excerpt', 'About us.'),
+                'url': f"{BASE_URL}/about.html",
+                'image': DEFAULT_IMAGE,
+                'og_type': 'website',
+                'json_ld': '',
+            })
+
+            write_file(os.path.join(output_dir, 'about.html'), full_about)
 
     # 9b. Generate Consulting Page
+    PROFILER.stage('consulting page')
     if os.path.exists(os.path.join(CONTENT_DIR, 'consulting.md')):
         raw_consulting = read_file(os.path.join(CONTENT_DIR, 'consulting.md'))
-        meta, body = parse_frontmatter(raw_consulting)
-        body = markdown_to_html(body)
-        
-        consulting_html = f"""
+        consulting_inputs = {'template:base': template_hashes['template:base'], 'source': hash_text(raw_consulting)}
+        if manifest.needs_render('consulting.html', consulting_inputs):
+            meta, body = parse_frontmatter(raw_consulting)
+            if assets:
+                body = rewrite_asset_refs(body, assets)
+            body = render_body('consulting.md', body, render_cache)
+            if images is not None:
+                body = rewrite_img_tags(body, images)
+
+            consulting_html = f"""
             <article>
                 <h1>{meta.get('title')}</h1>
                 {body}
             </article>
         """
-        
-        full_consulting = base_template.replace('{{ title }}', meta.get('title'))
-        full_consulting = full_consulting.replace('{{ content }}', consulting_html)
-        full_consulting = full_consulting.replace('{{ root }}', '')
-        full_consulting = full_consulting.replace('{{ description }}', meta.get('excerpt', 'Consulting services.'))
-        full_consulting = full_consulting.replace('{{ url }}', f"{BASE_URL}/consulting.html")
-        full_consulting = full_consulting.replace('{{ image }}', DEFAULT_IMAGE)
-        full_consulting = full_consulting.replace('{{ og_type }}', 'website')
-        full_consulting = full_consulting.replace('{{ json_ld }}', '')
-        
-        write_file(os.path.join(OUTPUT_DIR, 'consulting.html'), full_consulting)
 
-    # 10. Generate RSS Feed
-    import html
-    
-    rss_items = ""
-    for post in posts:
-        if post['slug'] == 'about':
-            continue
-        
-        # Escape XML special characters
-        title = html.escape(post.get('title', 'Untitled'))
-        excerpt = html.escape(post.get('excerpt', ''))
-        category = html.escape(post.get('category', 'General'))
-        
-        rss_items += f"""
-        <item>
-            <title>{title}</title>
-            <link>{BASE_URL}/posts/{post['slug']}.html</link>
-            <description>{excerpt}</description>
-            <category>{category}</category>
-            <guid>{BASE_URL}/posts/{post['slug']}.html</guid>
-        </item>
-        """
-    
-    rss_feed = f"""<?xml version="1.0" encoding="UTF-8" ?>
-<rss version="2.0">
-<channel>
-    <title>Does This Feel Right?</title>
-    <link>{BASE_URL}</link>
-    <description>Thoughts on business, technology, and the human condition.</description>
-    <language>en-us</language>
-    {rss_items}
-</channel>
-</rss>"""
-    
-    write_file(os.path.join(OUTPUT_DIR, 'feed.xml'), rss_feed)
+            full_consulting = render_page('page', {
+                'content': consulting_html,
+                'title': meta.get('title'),
+                'root': '',
+                'description': meta.get('excerpt', 'Consulting services.'),
+                'url': f"{BASE_URL}/consulting.html",
+                'image': DEFAULT_IMAGE,
+                'og_type': 'website',
+                'json_ld': '',
+            })
+
+            write_file(os.path.join(output_dir, 'consulting.html'), full_consulting)
+
+    # 10. Generate Feeds: RSS, Atom and JSON Feed of the newest posts, for
+    # the site and every tag; items are streamed, so size is no concern
+    PROFILER.stage('feeds')
+    feed_posts = [post for post in posts if post['slug'] != 'about']
+    feeds = [('', 'Does This Feel Right?', f'{BASE_URL}/',
+              'Thoughts on business, technology, and the human condition.', feed_posts)]
+    if TAG_FEEDS:
+        feeds += [(f'tags/{tag.slug}/', f'{tag.name} - Does This Feel Right?', f'{BASE_URL}/tags/{tag.slug}.html',
+                   f'Essays about {tag.name}.', tag.posts) for tag in taxonomy.tags.values()]
+    for prefix, title, link, description, entries in feeds:
+        entries = entries[:feed_items] if feed_items else entries
+        feed_inputs = {'posts': hash_fields(entries, FEED_FIELDS), 'channel': hash_data([title, description])}
+        if feed_full_content:
+            feed_inputs['content'] = hash_data([[records[post['slug']].source_hash for post in entries], assets])
+        dates = [date for date in map(post_datetime, entries) if date]
+        updated = max(dates, default=datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc))
+        for name, feed_class in FEED_FORMATS.items():
+            if not manifest.needs_render(prefix + name, feed_inputs):
+                continue
+            channel = {'title': title, 'link': link, 'url': f'{BASE_URL}/{prefix}{name}',
+                       'description': description, 'updated': updated}
+            items = feed_items_for(entries, records if feed_full_content else None, render_cache, assets)
+            write_feed(os.path.join(output_dir, prefix + name), feed_class, channel, items)
 
     # 10b. Generate Search Index
-    import json
+    PROFILER.stage('search index')
     search_index = []
     for post in posts:
         if post['slug'] == 'about': continue
-        
+
         # Strip HTML from excerpt for cleaner search
-        import re
         clean_excerpt = re.sub('<[^<]+?>', '', post.get('excerpt', ''))
-        
+
         search_index.append({
             'title': post.get('title', 'Untitled'),
             'slug': post['slug'],
             'excerpt': clean_excerpt,
-            'tags': post.get('tags', ''),
+            'tags': ', '.join(post_tags(post)),
             'category': post.get('category', 'General'),
             'date': post.get('date', '')
         })
-    
-    search_index_path = os.path.join(OUTPUT_DIR, 'search.json')
-    write_file(search_index_path, json.dumps(search_index))
-    
+
+    search_inputs = {'posts': hash_fields(posts, SEARCH_FIELDS)}
+    if manifest.needs_render('search.json', search_inputs):
+        search_index_path = os.path.join(output_dir, 'search.json')
+        write_file(search_index_path, json.dumps(search_index))
+
+    # 10c. Full-text search shards (search/), recomputed only when searchable
+    # text changed; each file is rewritten only if its contents did. Watch
+    # mode's provisional builds keep the previous index until an exact build
+    # (without a BuildState to flag that, a build is always exact).
+    PROFILER.stage('search shards')
+    shard_inputs = dict(search_inputs, bodies=hash_data([records[doc['slug']].source_hash for doc in search_index]))
+    meta_path = f'{SEARCH_DIR}/meta.json'
+    previous_files = sorted(p for p in manifest.previous if p.startswith(f'{SEARCH_DIR}/'))
+    current = manifest.previous.get(meta_path) == shard_inputs
+    intact = meta_path in previous_files and not any(
+        manifest.changed_inputs(p, manifest.previous[p]) for p in previous_files)
+    if intact and (current or (provisional and state is not None)):
+        if not current:
+            state.stale = True
+        for rel_path in previous_files:
+            manifest.needs_render(rel_path, manifest.previous[rel_path])
+    else:
+        with PROFILER.span('tokenize'):
+            counts = [records[doc['slug']].search_counts(doc) for doc in search_index]
+        with PROFILER.span('index'):
+            search_files = search_index_files(search_index, counts)
+        for name, text in search_files.items():
+            rel_path = f'{SEARCH_DIR}/{name}'
+            if manifest.needs_render(rel_path, shard_inputs if rel_path == meta_path else {'content': hash_text(text)}):
+                write_file(os.path.join(output_dir, rel_path), text)
+
     # Generate Manifest.json (PWA)
-    manifest = {
+    PROFILER.stage('pwa manifest')
+    pwa_manifest = {
       "name": "Does This Feel Right?",
       "short_name": "DTFR",
       "start_url": "/index.html",
@@ -747,58 +2730,386 @@ def build():
         }
       ]
     }
-    manifest_path = os.path.join(OUTPUT_DIR, 'manifest.json')
-    write_file(manifest_path, json.dumps(manifest, indent=2))
-
-    # 11. Generate Sitemap
-    sitemap_items = ""
-    # Homepage
-    sitemap_items += f"""
-    <url>
-        <loc>{BASE_URL}/</loc>
-        <changefreq>daily</changefreq>
-        <priority>1.0</priority>
-    </url>
-    """
-    # Static Pages
-    static_pages = ['about.html', 'collections.html', 'consulting.html']
-    for page in static_pages:
-        sitemap_items += f"""
-        <url>
-            <loc>{BASE_URL}/{page}</loc>
-            <changefreq>monthly</changefreq>
-            <priority>0.8</priority>
-        </url>
-        """
-    # Posts
-    for post in posts:
-        if post['slug'] == 'about': continue
-        sitemap_items += f"""
-        <url>
-            <loc>{BASE_URL}/posts/{post['slug']}.html</loc>
-            <lastmod>{post.get('date', datetime.datetime.now().strftime('%Y-%m-%d'))}</lastmod>
-            <changefreq>monthly</changefreq>
-            <priority>0.9</priority>
-        </url>
-        """
-    
-    sitemap_content = f"""<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-{sitemap_items}
-</urlset>"""
-    write_file(os.path.join(OUTPUT_DIR, 'sitemap.xml'), sitemap_content)
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    write_file(manifest_path, json.dumps(pwa_manifest, indent=2))
+
+    # 11. Generate Sitemaps: sitemap-N.xml of up to SITEMAP_MAX_URLS each,
+    # listed by the sitemap.xml index
+    PROFILER.stage('sitemap')
+    urls = [(f'{BASE_URL}/', None, 'daily', '1.0')]
+    urls += [(f'{BASE_URL}/{page}', None, 'monthly', '0.8') for page in ('about.html', 'collections.html', 'consulting.html')]
+    urls += [(f"{BASE_URL}/posts/{post['slug']}.html", manifest.lastmod[post['slug']]['date'], 'monthly', '0.9')
+             for post in posts if post['slug'] != 'about']
+    sitemaps = []
+    for start in range(0, len(urls), SITEMAP_MAX_URLS):
+        chunk = urls[start:start + SITEMAP_MAX_URLS]
+        name = f'sitemap-{len(sitemaps) + 1}.xml'
+        if manifest.needs_render(name, {'urls': hash_data(chunk)}):
+            write_sitemap(os.path.join(output_dir, name), chunk)
+        sitemaps.append((f'{BASE_URL}/{name}', max((url[1] for url in chunk if url[1]), default=None)))
+    if manifest.needs_render('sitemap.xml', {'sitemaps': hash_data(sitemaps)}):
+        write_sitemap_index(os.path.join(output_dir, 'sitemap.xml'), sitemaps)
 
     # 12. Generate Robots.txt
+    PROFILER.stage('robots.txt')
     robots_content = f"""User-agent: *
 Allow: /
 Sitemap: {BASE_URL}/sitemap.xml
 """
-    write_file(os.path.join(OUTPUT_DIR, 'robots.txt'), robots_content)
+    write_file(os.path.join(output_dir, 'robots.txt'), robots_content)
 
     # 13. Generate CNAME for GitHub Pages
-    write_file(os.path.join(OUTPUT_DIR, 'CNAME'), 'www.doesthisfeelright.com')
+    PROFILER.stage('cname')
+    write_file(os.path.join(output_dir, 'CNAME'), 'www.doesthisfeelright.com')
 
+    # 14. Precompress text outputs, now that every page has been registered
+    PROFILER.stage('precompress')
+    if precompress_outputs:
+        compressed, unchanged_compressed = precompress(manifest, jobs, verify_compression)
+        print(f"Precompressed {compressed} files, {unchanged_compressed} unchanged.")
+        if not load_brotli():
+            print("brotli is not installed, so only .gz files were written (pip install brotli).")
+
+    # 15. Drop pages the previous build produced but this one no longer does
+    # (deleted posts, tags nobody uses any more) and record this build.
+    PROFILER.stage('finish')
+    for rel_path in manifest.stale_outputs():
+        stale_path = os.path.join(output_dir, rel_path)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+        # Along with any directory that held nothing else (tags/<slug>/page/)
+        parent = os.path.dirname(rel_path)
+        while parent and os.path.isdir(os.path.join(output_dir, parent)) and not os.listdir(os.path.join(output_dir, parent)):
+            os.rmdir(os.path.join(output_dir, parent))
+            parent = os.path.dirname(parent)
+    manifest.save()
+    if not in_place:
+        publish_output(output_dir, keep_builds)
+    if render_cache:
+        render_cache.prune()
+    if profile:
+        PROFILER.stop()
+        PROFILER.save(profile)
+        PROFILER.print_summary()
+        print(f"Trace written to {profile} (open in chrome://tracing or ui.perfetto.dev).")
+
+    if incremental:
+        print(f"Rendered {manifest.rendered} pages, {manifest.unchanged} unchanged.")
+        print(f"Synced {synced} static files, {unchanged_assets} unchanged.")
+    if explain:
+        for rel_path, reasons in manifest.reasons.items():
+            print(f"  {rel_path}: {', '.join(reasons)}")
     print("Build complete.")
+    return manifest
+
+def is_ignored_change(path):
+    """Editor droppings (swap, backup and hidden temp files) that should not trigger a rebuild."""
+    name = os.path.basename(path)
+    return not name or name.startswith('.') or name.endswith(('~', '.swp', '.tmp')) or name.isdigit()
+
+class PollingWatcher:
+    """
+    Finds changed files under some directories by comparing size and mtime
+    snapshots every WATCH_POLL_INTERVAL seconds. Works everywhere; the
+    InotifyWatcher is preferred where the kernel supports it.
+    """
+
+    def __init__(self, roots, interval=None):
+        self.roots = [root for root in roots if os.path.isdir(root)]
+        self.interval = WATCH_POLL_INTERVAL if interval is None else interval
+        self.files = self.snapshot()
+
+    def snapshot(self):
+        files = {}
+        for root in self.roots:
+            for dirpath, _, filenames in os.walk(root):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError: # Deleted while scanning
+                        continue
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def scan(self):
+        """Paths added, removed or modified since the previous scan."""
+        files = self.snapshot()
+        changed = {path for path in files.keys() | self.files.keys() if files.get(path) != self.files.get(path)}
+        self.files = files
+        return changed
+
+    def wait(self, timeout=None):
+        """
+        Blocks until something changes, or for at most timeout seconds, and
+        returns the changed paths (empty on timeout). Changes that follow
+        within WATCH_DEBOUNCE are collected into the same batch.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = self.scan()
+        while not changed:
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+            time.sleep(self.interval)
+            changed = self.scan()
+        time.sleep(WATCH_DEBOUNCE)
+        return changed | self.scan()
+
+class InotifyWatcher:
+    """
+    Same interface as PollingWatcher, fed by the kernel through inotify(7)
+    (Linux only; the constructor raises OSError or AttributeError
+    elsewhere). Nothing is scanned, so a save is seen immediately however
+    many files are watched.
+    """
+
+    def __init__(self, roots):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        for root in roots:
+            if os.path.isdir(root):
+                self.add_tree(root)
+
+    def add_tree(self, root):
+        for dirpath, _, _ in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), INOTIFY_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'Cannot watch {dirpath}')
+            self.dirs[wd] = dirpath
+
+    def read_events(self):
+        changed = set()
+        data = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = struct.unpack_from('iIII', data, offset)
+            offset += 16
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if wd not in self.dirs:
+                continue
+            path = os.path.join(self.dirs[wd], name)
+            if mask & INOTIFY_ISDIR and os.path.isdir(path):
+                self.add_tree(path) # New directory: watch it and report what it holds
+                changed.update(os.path.join(dirpath, f) for dirpath, _, files in os.walk(path) for f in files)
+            changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        changed = set()
+        while select.select([self.fd], [], [], timeout)[0]:
+            changed |= self.read_events()
+            timeout = WATCH_DEBOUNCE
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def open_watcher(roots):
+    """An InotifyWatcher for roots when the platform has inotify, else a PollingWatcher."""
+    try:
+        return InotifyWatcher(roots)
+    except (OSError, AttributeError):
+        return PollingWatcher(roots)
+
+def inject_live_reload(html):
+    """html with LIVE_RELOAD_SNIPPET added just before </body> (or at the end)."""
+    index = html.rfind('</body>')
+    if index == -1:
+        return html + LIVE_RELOAD_SNIPPET
+    return html[:index] + LIVE_RELOAD_SNIPPET + html[index:]
+
+def page_urls(rel_paths):
+    """URL paths a browser may show each output file under (index.html also as its directory)."""
+    urls = []
+    for rel_path in rel_paths:
+        urls.append(f'/{rel_path}')
+        if rel_path == 'index.html' or rel_path.endswith('/index.html'):
+            urls.append(f'/{rel_path[:-len("index.html")]}')
+    return urls
+
+class LiveReload:
+    """Counts finished builds; open pages wait on it through LIVE_RELOAD_PATH."""
+
+    def __init__(self):
+        self.version = 0
+        self.pages = None
+        self.condition = threading.Condition()
+
+    def notify(self, pages=None):
+        """Announces a build that changed pages (URL paths), or every page when None."""
+        with self.condition:
+            self.version += 1
+            self.pages = pages
+            self.condition.notify_all()
+
+    def wait(self, version, timeout=None):
+        """
+        Blocks until a build newer than version finishes (or timeout) and
+        returns (current version, pages it changed). A waiter more than one
+        build behind gets None, as it cannot know what the others changed.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.pages if self.version == version + 1 else None
+
+class LiveReloadHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves the output directory for watch mode. HTML pages get
+    LIVE_RELOAD_SNIPPET on the way out (the files on disk are left alone) and
+    LIVE_RELOAD_PATH is a server-sent event stream that says "reload" after
+    every build.
+    """
+
+    reloader = None # Set per server by serve_live_reload
+
+    def end_headers(self):
+        self.send_header('Cache-Control', 'no-cache')
+        super().end_headers()
+
+    def do_GET(self):
+        if self.path == LIVE_RELOAD_PATH:
+            return self.stream_reloads()
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?')[0].endswith('/'):
+            path = os.path.join(path, 'index.html')
+        if not path.endswith('.html') or not os.path.isfile(path):
+            return super().do_GET()
+        page = inject_live_reload(read_file(path)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def stream_reloads(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        version = self.reloader.version
+        try:
+            while True:
+                current, pages = self.reloader.wait(version, timeout=15)
+                if current == version:
+                    self.wfile.write(b': ping\n\n') # Keeps proxies from timing out, notices closed tabs
+                else:
+                    self.wfile.write(f'data: {json.dumps(pages)}\n\n'.encode('utf-8'))
+                self.wfile.flush()
+                version = current
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_live_reload(reloader, port=8000, directory=None):
+    """Starts serving directory (OUTPUT_DIR) on localhost:port in a background thread."""
+    handler = type('Handler', (LiveReloadHandler,), {'reloader': reloader})
+    server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', port), functools.partial(handler, directory=directory or OUTPUT_DIR))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def watch(port=8000, **options):
+    """
+    Builds once, then serves OUTPUT_DIR with live reload and rebuilds
+    incrementally whenever something under CONTENT_DIR, TEMPLATE_DIR or
+    STATIC_DIR changes. options are passed on to build().
+
+    Every save is published by a provisional build (see BuildState), which
+    renders only the edited page and the aggregate pages its metadata
+    appears on, and reloads open pages. When the edit changed what "Read
+    Next" is scored on, an exact build follows unless more changes are
+    already waiting; it reloads only the pages whose picks moved. A failed
+    build is reported and the watch goes on.
+    """
+    state = BuildState()
+    reloader = LiveReload()
+    watcher = open_watcher([CONTENT_DIR, TEMPLATE_DIR, STATIC_DIR])
+
+    def rebuild(provisional):
+        started = time.perf_counter()
+        try:
+            manifest = build(incremental=True, state=state, provisional=provisional, **options)
+        except Exception:
+            traceback.print_exc()
+            state.stale = False # Wait for the next change rather than retrying
+            return
+        pending = ' ("Read Next" picks and search index pending)' if state.stale else ''
+        print(f"Rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms{pending}.")
+        reloader.notify(None if provisional else page_urls(manifest.reasons))
+
+    rebuild(provisional=False)
+    server = serve_live_reload(reloader, port)
+    print(f"Serving http://localhost:{port}/ and watching {CONTENT_DIR}/, {TEMPLATE_DIR}/, {STATIC_DIR}/ "
+          f"({type(watcher).__name__}). Press Ctrl+C to stop.")
+    try:
+        while True:
+            changed = watcher.wait(0 if state.stale else None)
+            changed = sorted(path for path in changed if not is_ignored_change(path))
+            if changed:
+                print(f"Changed: {', '.join(changed)}")
+                rebuild(provisional=True)
+            elif state.stale:
+                rebuild(provisional=False)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
 
 if __name__ == "__main__":
-    build()
+    parser = argparse.ArgumentParser(description='Build the static site into docs/.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep the previous output and only re-render pages whose inputs changed.')
+    parser.add_argument('--related', choices=sorted(RELATED_BACKENDS), default=None,
+                        help=f'"Read Next" scoring backend (default: {RELATED_BACKEND}).')
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help='Render post pages in N processes (0 = one per CPU).')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help=f'Parse and render every post from scratch instead of using {CACHE_DIR}/.')
+    parser.add_argument('--no-fingerprint', dest='fingerprint', action='store_false', default=None,
+                        help='Link the original CSS/JS instead of minified, content-hashed copies.')
+    parser.add_argument('--bundle-js', action='store_true', default=None,
+                        help="Serve base.html's own scripts as one bundled file.")
+    parser.add_argument('--no-responsive-images', dest='responsive_images', action='store_false', default=None,
+                        help='Serve images as they are instead of adding resized WebP/AVIF copies and srcsets.')
+    parser.add_argument('--precompress', action='store_true',
+                        help='Write .gz (and .br, with brotli installed) siblings of the HTML, JSON, XML, CSS and JS output.')
+    parser.add_argument('--verify-compression', action='store_true',
+                        help='With --precompress, check that every compressed file decompresses to its source.')
+    parser.add_argument('--page-size', type=int, default=None, metavar='N',
+                        help=f'Posts per homepage/tag page (default: {POSTS_PER_PAGE}; 0 = no pagination).')
+    parser.add_argument('--feed-items', type=int, default=None, metavar='N',
+                        help=f'Newest posts in each RSS/Atom/JSON feed (default: {FEED_ITEMS}; 0 = every post).')
+    parser.add_argument('--full-content-feeds', dest='feed_full_content', action='store_true', default=None,
+                        help='Put whole posts in the feeds instead of their excerpts.')
+    parser.add_argument('--explain', action='store_true',
+                        help='List every rendered page with the inputs that made it necessary.')
+    parser.add_argument('--profile', nargs='?', const='build-profile.json', default=None, metavar='TRACE',
+                        help='Time every build stage (and per-post step, unless --jobs fans them out), print a '
+                             'summary and write a Chrome trace to TRACE (default: build-profile.json).')
+    parser.add_argument('--keep-builds', type=int, default=None, metavar='N',
+                        help=f'Previous builds to keep for --rollback (default: {KEEP_BUILDS}).')
+    parser.add_argument('--rollback', action='store_true',
+                        help='Swap the most recent previous build back into docs/ (run again to undo) and exit.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Serve docs/ with live reload and rebuild incrementally on every change.')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='Port for --watch to serve on (default: 8000).')
+    args = parser.parse_args()
+    options = dict(related_backend=args.related, jobs=args.jobs, cache=args.cache,
+                   fingerprint=args.fingerprint, bundle_js=args.bundle_js,
+                   precompress_outputs=args.precompress, verify_compression=args.verify_compression,
+                   explain=args.explain, profile=args.profile, page_size=args.page_size,
+                   keep_builds=args.keep_builds, feed_items=args.feed_items,
+                   feed_full_content=args.feed_full_content, responsive_images=args.responsive_images)
+    if args.rollback:
+        rollback(args.keep_builds)
+    elif args.watch:
+        watch(args.port, **options)
+    else:
+        build(incremental=args.incremental, **options)
@@ -1,68 +1,123 @@
 document.addEventListener('DOMContentLoaded', () => {
     // Newsletter Form Handling (Replaced by Substack Embeds)
 
-    // Post Filtering Logic
+    // Post Filtering and Sorting Logic
     const filterBtns = document.querySelectorAll('.filter-btn');
-    const posts = document.querySelectorAll('.post-card');
+    const sortBtns = document.querySelectorAll('.sort-btn');
+    const postsContainer = document.querySelector('.posts-container');
+
+    // A paginated homepage only holds one page of cards. The first filter or
+    // sort fetches every page's card data (page/N.json); from then on the
+    // matches are filtered and sorted in memory and shown one page at a time,
+    // so the DOM never holds more than a page of cards.
+    const pageCount = postsContainer ? parseInt(postsContainer.dataset.pages || '1', 10) : 1;
+    // Cards per page as the build paginates them; 0 (or missing) means one page
+    const pageSize = postsContainer ? parseInt(postsContainer.dataset.pageSize, 10) || 0 : 0;
+    const view = { filter: 'all', sort: 'date-desc', page: 1 };
+    let allPosts = null;
+
+    function renderCard(post) {
+        return `<a href="${postsContainer.dataset.root}${post.url}" class="post-card" data-category="${post.category}" data-date="${post.date}">
+                <h2 class="post-title">${post.title}</h2>
+                <p class="post-excerpt">${post.excerpt}</p>
+                <div class="post-meta-row">
+                    <span class="post-tag">${post.tag}</span>
+                    <span class="post-meta">${post.date_display} • ${post.read_time}</span>
+                </div>
+            </a>`;
+    }
+
+    // Every post's card data, newest first; concurrent callers share the promise
+    function loadAllPosts() {
+        if (!allPosts) {
+            const pageUrl = postsContainer.dataset.pageUrl;
+            allPosts = Promise.all(Array.from({ length: pageCount }, (_, i) =>
+                fetch(`${pageUrl}${i + 1}.json`).then(response => {
+                    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                    return response.json();
+                })
+            )).then(pages => pages.flatMap(page => page.posts)).catch(err => {
+                allPosts = null; // Try again on the next click
+                throw err;
+            });
+        }
+        return allPosts;
+    }
 
-    if (filterBtns.length > 0) {
+    function comparePosts(sortType) {
+        if (sortType === 'date-asc') return (a, b) => (a.date || '').localeCompare(b.date || ''); // Oldest first
+        if (sortType === 'title') return (a, b) => a.title.localeCompare(b.title);
+        return (a, b) => (b.date || '').localeCompare(a.date || ''); // Newest first
+    }
+
+    // The homepage's prev/next nav, reused to page through the matches
+    function pager() {
+        let nav = postsContainer.parentElement.querySelector('.pagination');
+        if (!nav) {
+            nav = document.createElement('nav');
+            nav.className = 'pagination';
+            postsContainer.after(nav);
+        }
+        return nav;
+    }
+
+    function renderPager(pages) {
+        const nav = pager();
+        nav.style.display = pages > 1 ? '' : 'none';
+        const newer = view.page > 1 ? `<a href="#" class="pagination-link" data-page="${view.page - 1}" rel="prev">← Newer</a>` : '<span></span>';
+        const older = view.page < pages ? `<a href="#" class="pagination-link" data-page="${view.page + 1}" rel="next">Older →</a>` : '<span></span>';
+        nav.innerHTML = `${newer}<span class="pagination-status">Page ${view.page} of ${pages}</span>${older}`;
+    }
+
+    async function showMatches() {
+        let posts;
+        try {
+            posts = await loadAllPosts();
+        } catch (err) {
+            console.error('Error loading posts:', err);
+            return;
+        }
+        const matches = posts
+            .filter(post => view.filter === 'all' || post.category === view.filter)
+            .sort(comparePosts(view.sort));
+        const size = pageSize > 0 ? pageSize : Math.max(1, matches.length);
+        const pages = Math.max(1, Math.ceil(matches.length / size));
+        view.page = Math.min(view.page, pages);
+        const start = (view.page - 1) * size;
+        postsContainer.innerHTML = matches.slice(start, start + size).map(renderCard).join('');
+        renderPager(pages);
+    }
+
+    if (postsContainer) {
         filterBtns.forEach(btn => {
             btn.addEventListener('click', () => {
-                // 1. Update Active State
                 filterBtns.forEach(b => b.classList.remove('active'));
                 btn.classList.add('active');
-
-                // 2. Filter Posts
-                const filterValue = btn.getAttribute('data-filter');
-
-                posts.forEach(post => {
-                    if (filterValue === 'all' || post.getAttribute('data-category') === filterValue) {
-                        post.style.display = 'block';
-                    } else {
-                        post.style.display = 'none';
-                    }
-                });
+                view.filter = btn.getAttribute('data-filter');
+                view.page = 1;
+                showMatches();
             });
         });
-    }
 
-    // Post Sorting Logic
-    const sortBtns = document.querySelectorAll('.sort-btn');
-    const postsContainer = document.querySelector('.posts-container');
-
-    if (sortBtns.length > 0 && postsContainer) {
         sortBtns.forEach(btn => {
             btn.addEventListener('click', (e) => {
                 e.preventDefault();
-
-                // Update active state
                 sortBtns.forEach(b => b.classList.remove('active'));
                 btn.classList.add('active');
-
-                const sortType = btn.getAttribute('data-sort');
-                const postsArray = Array.from(posts);
-
-                postsArray.sort((a, b) => {
-                    if (sortType === 'date-desc') {
-                        const dateA = a.getAttribute('data-date') || '';
-                        const dateB = b.getAttribute('data-date') || '';
-                        return dateB.localeCompare(dateA); // Newest first
-                    } else if (sortType === 'date-asc') {
-                        const dateA = a.getAttribute('data-date') || '';
-                        const dateB = b.getAttribute('data-date') || '';
-                        return dateA.localeCompare(dateB); // Oldest first
-                    } else if (sortType === 'title') {
-                        const titleA = a.querySelector('h2').textContent;
-                        const titleB = b.querySelector('h2').textContent;
-                        return titleA.localeCompare(titleB);
-                    }
-                    return 0;
-                });
-
-                // Re-append in sorted order
-                postsArray.forEach(post => postsContainer.appendChild(post));
+                view.sort = btn.getAttribute('data-sort');
+                view.page = 1;
+                showMatches();
             });
         });
+
+        // Once the cards come from memory, the nav pages through them
+        postsContainer.parentElement.addEventListener('click', (e) => {
+            const link = e.target.closest('.pagination-link[data-page]');
+            if (!link || !allPosts) return;
+            e.preventDefault();
+            view.page = parseInt(link.dataset.page, 10);
+            showMatches().then(() => postsContainer.scrollIntoView({ behavior: 'smooth' }));
+        });
     }
 
     // Mobile Menu Toggle
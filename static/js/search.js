@@ -1,12 +1,116 @@
 /**
- * Search functionality using Lunr.js
+ * Full-text search over the index build.py writes to search/.
+ *
+ * Nothing is downloaded until the search overlay is first opened. Each query
+ * word then needs one small shard of postings (search/terms/<prefix>.json),
+ * and the results' titles and excerpts come from search/docs/<n>.json.
  */
 
+const SEARCH_ROOT = '/search/';
+const MAX_RESULTS = 10;
+const PREFIX_WEIGHT = 0.5; // The word being typed also matches longer terms, at this weight
+
 const Search = {
-    index: null,
-    store: {},
+    meta: null,
+    split: null,
+    stopWords: null,
+    loading: null,
+    files: new Map(),
+    latest: 0,
+
+    // Fetches meta.json once; concurrent callers share the promise.
+    load: () => {
+        if (!Search.loading) {
+            Search.loading = fetch(`${SEARCH_ROOT}meta.json`)
+                .then(response => {
+                    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                    return response.json();
+                })
+                .then(meta => {
+                    Search.meta = meta;
+                    Search.split = new Set(Object.keys(meta.children));
+                    Search.stopWords = new Set(meta.stop_words);
+                })
+                .catch(e => {
+                    Search.loading = null; // Retry on the next query
+                    throw e;
+                });
+        }
+        return Search.loading;
+    },
+
+    // A shard or doc chunk, fetched once. A missing shard means no term has that prefix.
+    file: (path, missing) => {
+        if (!Search.files.has(path)) {
+            Search.files.set(path, fetch(SEARCH_ROOT + path).then(response => {
+                if (response.status === 404) return missing;
+                if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                return response.json();
+            }).catch(e => {
+                Search.files.delete(path);
+                throw e;
+            }));
+        }
+        return Search.files.get(path);
+    },
+
+    // Same words as build.py's search_term_counts
+    terms: (text) => (text.toLowerCase().match(/[\p{L}\p{N}_]+/gu) || [])
+        .filter(term => term.length > 1 && !Search.stopWords.has(term)),
+
+    shardKey: (term) => {
+        let key = term.slice(0, Search.meta.prefix);
+        while (Search.split.has(key) && term.length > key.length) {
+            key = term.slice(0, key.length + 1);
+        }
+        return key;
+    },
+
+    // key's shard and every shard split from it: all the terms starting with key
+    shardKeys: (key) => [key, ...(Search.meta.children[key] || []).flatMap(Search.shardKeys)],
+
+    // doc id -> score of term (or, with prefix, of the best term starting with it)
+    postings: async (term, prefix) => {
+        // A split prefix's own shard only holds the term equal to it
+        const keys = prefix ? Search.shardKeys(Search.shardKey(term)) : [Search.shardKey(term)];
+        const shards = await Promise.all(keys.map(key => Search.file(`terms/${encodeURIComponent(key)}.json`, {})));
+        const scores = new Map();
+        for (const [candidate, postings] of shards.flatMap(Object.entries)) {
+            const weight = candidate === term ? 1 : (prefix && candidate.startsWith(term) ? PREFIX_WEIGHT : 0);
+            if (!weight) continue;
+            // [doc id delta, impact, doc id delta, impact, ...]
+            let doc = 0;
+            for (let i = 0; i < postings.length; i += 2) {
+                doc += postings[i];
+                scores.set(doc, Math.max(scores.get(doc) || 0, postings[i + 1] * weight));
+            }
+        }
+        return scores;
+    },
+
+    // The best matching docs for a query; every word has to match.
+    query: async (text) => {
+        const terms = Search.terms(text);
+        if (terms.length === 0) return [];
+
+        const lists = await Promise.all(terms.map((term, i) => Search.postings(term, i === terms.length - 1)));
+        let scores = lists[0];
+        for (const list of lists.slice(1)) {
+            scores = new Map([...scores]
+                .filter(([doc]) => list.has(doc))
+                .map(([doc, score]) => [doc, score + list.get(doc)]));
+        }
 
-    init: async () => {
+        const top = [...scores].sort((a, b) => b[1] - a[1] || a[0] - b[0]).slice(0, MAX_RESULTS);
+        const chunk = Search.meta.chunk;
+        const docs = await Promise.all(top.map(async ([doc]) => {
+            const chunkDocs = await Search.file(`docs/${Math.floor(doc / chunk)}.json`, []);
+            return chunkDocs[doc % chunk];
+        }));
+        return docs.filter(Boolean);
+    },
+
+    init: () => {
         const searchOverlay = document.getElementById('search-overlay');
         const searchInput = document.getElementById('search-input');
         const searchResults = document.getElementById('search-results');
@@ -15,36 +119,13 @@ const Search = {
 
         if (!searchOverlay || !searchInput) return;
 
-        // Fetch Index
-        try {
-            const response = await fetch('/search.json');
-            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-            const data = await response.json();
-
-            // Initialize Lunr
-            Search.index = lunr(function () {
-                this.field('title', { boost: 10 });
-                this.field('tags', { boost: 5 });
-                this.field('excerpt');
-                this.field('category');
-                this.ref('slug');
-
-                data.forEach(doc => {
-                    this.add(doc);
-                    Search.store[doc.slug] = doc;
-                });
-            });
-
-        } catch (e) {
-            console.error('Failed to load search index', e);
-        }
-
         // Event Listeners
         searchToggle.addEventListener('click', (e) => {
             e.preventDefault();
             searchOverlay.style.display = 'flex';
             searchInput.focus();
             document.body.style.overflow = 'hidden'; // Prevent scrolling
+            Search.load().catch(e => console.error('Failed to load search index', e));
         });
 
         closeSearch.addEventListener('click', () => {
@@ -62,50 +143,44 @@ const Search = {
         });
 
         // Handle Input
-        searchInput.addEventListener('input', (e) => {
-            const query = e.target.value;
+        searchInput.addEventListener('input', async () => {
+            const query = searchInput.value;
+            const current = ++Search.latest;
             if (query.length < 2) {
                 searchResults.innerHTML = '';
                 return;
             }
 
-            if (!Search.index) {
-                return;
+            try {
+                await Search.load();
+                const results = await Search.query(query);
+                // Drop results for a query the user has already typed past
+                if (current === Search.latest) {
+                    Search.renderResults(results, searchResults);
+                }
+            } catch (e) {
+                console.error('Search failed', e);
             }
-
-            const results = Search.index.search(query);
-            Search.renderResults(results, searchResults);
         });
     },
 
-    renderResults: (results, container) => {
-        if (results.length === 0) {
+    renderResults: (docs, container) => {
+        if (docs.length === 0) {
             container.innerHTML = '<div class="no-results">No results found.</div>';
             return;
         }
 
-        const html = results.map(result => {
-            const doc = Search.store[result.ref];
-            return `
+        const html = docs.map(doc => `
                 <a href="/posts/${doc.slug}.html" class="search-result-item">
                     <h3>${doc.title}</h3>
                     <p>${doc.excerpt}</p>
                     <span class="meta">${doc.date} • ${doc.category}</span>
                 </a>
-            `;
-        }).join('');
+            `).join('');
 
         container.innerHTML = html;
     }
 };
 
 // Initialize
-document.addEventListener('DOMContentLoaded', () => {
-    // Check if lunr is loaded
-    if (typeof lunr !== 'undefined') {
-        Search.init();
-    } else {
-        // Wait for script to load if async
-        window.addEventListener('load', Search.init);
-    }
-});
+document.addEventListener('DOMContentLoaded', Search.init);
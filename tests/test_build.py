@@ -1,7 +1,15 @@
 """
 Tests for build.py - Static site generation functions.
 """
+import contextlib
+import gzip
+import json
+import os
+import subprocess
+import types
+import zlib
 import pytest
+from xml.etree import ElementTree
 from pathlib import Path
 import sys
 
@@ -53,6 +61,13 @@ class TestMarkdownToHtml:
         assert '<h2>Header 2</h2>' in html
         assert '<h3>Header 3</h3>' in html
 
+    def test_images(self):
+        """![alt](src "title") becomes an <img>, not a link."""
+        html = build.markdown_to_html('See ![A "photo"](/images/a.jpg "Caption") and [a link](/x).')
+
+        assert html == ('<p>See <img src="/images/a.jpg" alt="A &quot;photo&quot;" title="Caption">'
+                        ' and <a href="/x">a link</a>.</p>')
+
     def test_paragraphs(self):
         """Test paragraph conversion."""
         md = "First paragraph\n\nSecond paragraph"
@@ -103,6 +118,34 @@ class TestMarkdownToHtml:
         assert '<blockquote>' in html
         assert 'This is a quote' in html
 
+    def test_code_blocks_skip_inline_formatting(self):
+        """Code is copied verbatim; only the prose around it is formatted."""
+        md = "**before**\n\n```python\nx = a**2 * b*c\n    [i](j)\n```\n*after*"
+        html = build.markdown_to_html(md)
+
+        assert html == (
+            "<p><strong>before</strong></p>\n<pre><code>\nx = a**2 * b*c\n    [i](j)\n"
+            "</code></pre>\n<p><em>after</em></p>"
+        )
+
+    def test_unclosed_code_block(self):
+        """An unclosed fence runs to the end of the document."""
+        html = build.markdown_to_html("text\n```\n*raw*")
+
+        assert html == "<p>text</p>\n<pre><code>\n*raw*\n</code></pre>"
+
+    def test_wrapped_paragraph(self):
+        """Consecutive lines join into one paragraph; a whitespace-only line splits it."""
+        html = build.markdown_to_html("one\n  two **b**\n   \nthree")
+
+        assert html == "<p>one two <strong>b</strong></p>\n<p>three</p>"
+
+    def test_list_spans_blank_lines(self):
+        """Blank lines between items keep the list open; other blocks close it."""
+        html = build.markdown_to_html("- a\n\n- *b*\n# Next\n- c")
+
+        assert html == "<ul>\n<li>a</li>\n<li><em>b</em></li>\n</ul>\n<h1>Next</h1>\n<ul>\n<li>c</li>\n</ul>"
+
 
 class TestCalculateSimilarity:
     """Tests for text similarity calculation."""
@@ -164,3 +207,1321 @@ class TestFileOperations:
         build.write_file(str(nested_file), content)
         assert nested_file.exists()
         assert build.read_file(str(nested_file)) == content
+
+
+REPO_ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture
+def site(temp_dir, monkeypatch):
+    """A tiny site (content, templates, static) with build.py pointed at it."""
+    content = temp_dir / "content"
+    content.mkdir()
+    posts = {
+        "first-post.md": "---\ntitle: First Post\ndate: 2024-01-01\ncategory: Testing\ntags: python, testing\nexcerpt: The first one\n---\n\nPython testing with fixtures and builds.",
+        "second-post.md": "---\ntitle: Second Post\ndate: 2024-02-01\ncategory: Testing\ntags: python\nexcerpt: The second one\n---\n\nPython builds with fixtures and more testing.",
+        "third-post.md": "---\ntitle: Third Post\ndate: 2024-03-01\ncategory: Cooking\ntags: recipes\nexcerpt: Something else\n---\n\nDelicious recipes for slow weekend cooking.",
+    }
+    for name, text in posts.items():
+        (content / name).write_text(text, encoding="utf-8")
+
+    templates = temp_dir / "templates"
+    templates.mkdir()
+    for template in (REPO_ROOT / "templates").iterdir():
+        (templates / template.name).write_text(template.read_text(encoding="utf-8"), encoding="utf-8")
+
+    static = temp_dir / "static"
+    (static / "css").mkdir(parents=True)
+    (static / "css" / "style.css").write_text("body { color: black; }", encoding="utf-8")
+
+    monkeypatch.setattr(build, "CONTENT_DIR", str(content))
+    monkeypatch.setattr(build, "TEMPLATE_DIR", str(templates))
+    monkeypatch.setattr(build, "STATIC_DIR", str(static))
+    monkeypatch.setattr(build, "OUTPUT_DIR", str(temp_dir / "docs"))
+    monkeypatch.setattr(build, "CACHE_DIR", str(temp_dir / ".cache"))
+    return temp_dir
+
+
+def read_outputs(root):
+    """Maps every generated file (except the manifest) to its contents."""
+    return {
+        str(path.relative_to(root)): path.read_bytes()
+        for path in sorted(root.rglob("*"))
+        if path.is_file() and path.name != build.MANIFEST_NAME
+    }
+
+
+class TestIncrementalBuild:
+    """Tests for manifest-driven incremental builds."""
+
+    def test_full_build_writes_manifest(self, site):
+        """A full build records every generated page in the manifest."""
+        build.build()
+
+        manifest = json.loads((site / "docs" / build.MANIFEST_NAME).read_text())
+        assert "posts/first-post.html" in manifest["outputs"]
+        assert "index.html" in manifest["outputs"]
+        assert manifest["posts"]["first-post"]["metadata"]["title"] == "First Post"
+
+    def test_unchanged_build_renders_nothing(self, site):
+        """A second incremental build with no edits re-renders no pages."""
+        build.build()
+        page = site / "docs" / "posts" / "first-post.html"
+        mtime = page.stat().st_mtime_ns
+
+        build.build(incremental=True)
+
+        assert page.stat().st_mtime_ns == mtime
+
+    def test_edit_rerenders_only_affected_pages(self, site):
+        """Editing one post leaves unrelated post pages untouched."""
+        build.build()
+        docs = site / "docs"
+        untouched = docs / "posts" / "third-post.html"
+        mtime = untouched.stat().st_mtime_ns
+
+        source = site / "content" / "first-post.md"
+        source.write_text(source.read_text() + "\n\nA typo fix.", encoding="utf-8")
+        build.build(incremental=True)
+
+        assert "A typo fix." in (docs / "posts" / "first-post.html").read_text()
+        assert untouched.stat().st_mtime_ns == mtime
+
+    def test_incremental_matches_full_build(self, site):
+        """Incremental output is identical to a clean build of the same inputs."""
+        build.build()
+        (site / "content" / "second-post.md").write_text(
+            "---\ntitle: Second Post, Renamed\ndate: 2024-02-01\ncategory: Testing\ntags: python, renamed\n---\n\nNew body.",
+            encoding="utf-8",
+        )
+        build.build(incremental=True)
+        incremental = read_outputs(site / "docs")
+
+        build.build()
+        assert read_outputs(site / "docs") == incremental
+
+    def test_body_edit_skips_aggregate_pages(self, site):
+        """Aggregate pages never show a body, so editing one re-renders just the post (and its lastmod)."""
+        build.build()
+        post = site / "content" / "third-post.md"
+        post.write_text(post.read_text() + "\n\nAnother paragraph.", encoding="utf-8")
+
+        manifest = build.build(incremental=True)
+
+        pages = {path: reasons for path, reasons in manifest.reasons.items() if not path.startswith("search/")}
+        assert pages == {"posts/third-post.html": ["source"], "sitemap-1.xml": ["urls"], "sitemap.xml": ["sitemaps"]}
+        assert manifest.reasons["search/meta.json"] == ["bodies"] # Bodies are searchable
+
+    def test_tag_edit_rerenders_affected_pages(self, site, capsys):
+        """A new tag touches the pages listing tags, not the other tag pages or the feed."""
+        build.build()
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text().replace("tags: python, testing", "tags: python, fixtures"), encoding="utf-8")
+
+        manifest = build.build(incremental=True, explain=True)
+
+        assert {"index.html", "collections.html", "search.json", "tags/fixtures.html"} <= set(manifest.reasons)
+        assert not {"tags/python.html", "feed.xml"} & set(manifest.reasons)
+        assert manifest.reasons["tags/fixtures.html"] == ["output"]
+        assert not (site / "docs" / "tags" / "testing.html").exists()
+        assert "  index.html: posts, sidebar\n" in capsys.readouterr().out
+
+    def test_deleted_post_is_removed(self, site):
+        """Pages for deleted posts and unused tags disappear from the output."""
+        build.build()
+        (site / "content" / "third-post.md").unlink()
+
+        build.build(incremental=True)
+
+        assert not (site / "docs" / "posts" / "third-post.html").exists()
+        assert not (site / "docs" / "tags" / "recipes.html").exists()
+
+
+class TestLoadPosts:
+    """Tests for the single-pass corpus loader."""
+
+    def test_loads_every_post_once(self, site):
+        """Each post becomes one Post record; standalone pages are skipped."""
+        (site / "content" / "about.html").write_text("---\ntitle: About\n---\nHi", encoding="utf-8")
+
+        posts = build.load_posts()
+
+        assert sorted(p.slug for p in posts) == ["first-post", "second-post", "third-post"]
+        first = next(p for p in posts if p.slug == "first-post")
+        assert first.metadata["title"] == "First Post"
+        assert first.metadata["slug"] == "first-post"
+        assert "python" in first.tokens
+        assert build.render_body(first.path, first.body) == "<p>Python testing with fixtures and builds.</p>"
+
+    def test_html_bodies_are_not_converted(self, site):
+        """Bodies of .html sources are used verbatim."""
+        (site / "content" / "raw.html").write_text("---\ntitle: Raw\n---\n<p>*kept*</p>", encoding="utf-8")
+
+        raw = next(p for p in build.load_posts() if p.slug == "raw")
+
+        assert build.render_body(raw.path, raw.body) == "<p>*kept*</p>"
+
+    def test_post_uses_slots(self, site):
+        """Post records carry no per-instance __dict__."""
+        post = build.load_posts()[0]
+
+        assert not hasattr(post, "__dict__")
+
+    def test_build_reads_each_source_once(self, site, monkeypatch):
+        """A full build opens every content file exactly once."""
+        reads = []
+        real_read = build.read_file
+
+        def counting_read(path):
+            reads.append(path)
+            return real_read(path)
+
+        monkeypatch.setattr(build, "read_file", counting_read)
+        build.build()
+
+        content_reads = [p for p in reads if p.startswith(build.CONTENT_DIR)]
+        assert len(content_reads) == len(set(content_reads)) == 3
+
+
+class TestContentStore:
+    """Tests for the SQLite index of content/."""
+
+    def test_sync_reindexes_only_changed_files(self, site):
+        """Unchanged and merely touched files are not parsed again; deletions are dropped."""
+        content = site / "content"
+        with contextlib.closing(build.ContentStore()) as store:
+            assert store.sync() == ["first-post.md", "second-post.md", "third-post.md"]
+            assert store.sync() == []
+
+            os.utime(content / "first-post.md", ns=(0, 0))
+            (content / "second-post.md").write_text("---\ntitle: Second, Edited\n---\nNew body", encoding="utf-8")
+            (content / "third-post.md").unlink()
+
+            assert store.sync() == ["second-post.md"]
+            assert [post["title"] for post in store.posts()] == ["First Post", "Second, Edited"]
+            assert [post["slug"] for post in store.search("fixtures")] == ["first-post"]
+            assert [post["slug"] for post in store.search("new body")] == ["second-post"]
+            store.db.execute("INSERT INTO search (search) VALUES ('integrity-check')")
+
+    def test_loads_the_same_posts(self, site):
+        """Posts from the store match posts read from content/."""
+        with contextlib.closing(build.ContentStore()) as store:
+            store.sync()
+            stored = {post.slug: post for post in store.load_posts()}
+
+        for post in build.load_posts():
+            other = stored[post.slug]
+            assert (other.metadata, other.body, other.source_hash) == (post.metadata, post.body, post.source_hash)
+            assert other.tokens == post.tokens
+
+    def test_queries(self, site):
+        """Listing, tag and full-text queries read from the index."""
+        (site / "content" / "about.html").write_text("---\ntitle: About\n---\n<p>Python</p>", encoding="utf-8")
+        with contextlib.closing(build.ContentStore()) as store:
+            store.sync()
+
+            assert [p["slug"] for p in store.posts()] == ["third-post", "second-post", "first-post"]
+            assert [p["filename"] for p in store.posts(pages=True)][-1] == "about.html"
+            assert [p["slug"] for p in store.tagged("python")] == ["second-post", "first-post"]
+            assert store.tags() == {"python": 2, "testing": 1, "recipes": 1}
+            assert [p["slug"] for p in store.search("weekend")] == ["third-post"]
+            assert [p["slug"] for p in store.search("fixt")] != []
+            assert [p["slug"] for p in store.search("python cook")] == []
+            assert store.search("!!") == []
+
+    def test_incremental_build_reads_no_unchanged_source(self, site, monkeypatch):
+        """With a warm store a build never opens an unchanged post."""
+        build.build()
+        reads = []
+        real_read = build.read_file
+        monkeypatch.setattr(build, "read_file", lambda path: reads.append(path) or real_read(path))
+
+        build.build(incremental=True)
+
+        assert [p for p in reads if p.startswith(build.CONTENT_DIR)] == []
+
+
+class TestTaxonomy:
+    """Tests for the tag and category index built once per build."""
+
+    def test_spellings_share_a_tag(self):
+        """Tags are keyed by slug, named by their most used spelling, and list posts in order."""
+        posts = [
+            {"slug": "a", "tags": "Dev Tools, python", "category": "Tech"},
+            {"slug": "b", "tags": "dev tools, Python, python", "category": "Tech"},
+            {"slug": "c", "tags": "Dev Tools", "category": "Life"},
+            {"slug": "d", "category": "Life"},
+            {"slug": "e"},
+        ]
+
+        taxonomy = build.Taxonomy(posts)
+
+        assert list(taxonomy.tags) == ["dev-tools", "python", "life", "general"]
+        tools = taxonomy.tags["dev-tools"]
+        assert (tools.name, tools.count, [p["slug"] for p in tools.posts]) == ("Dev Tools", 3, ["a", "b", "c"])
+        assert (taxonomy.tags["python"].name, taxonomy.tags["python"].count) == ("python", 2)
+        assert {name: [p["slug"] for p in group] for name, group in taxonomy.categories.items()} == {
+            "Tech": ["a", "b"], "Life": ["c", "d"], "General": ["e"]}
+
+    def test_case_variants_get_one_page(self, site):
+        """Posts tagged Python and python are listed together, once, everywhere."""
+        first = site / "content" / "first-post.md"
+        first.write_text(first.read_text(encoding="utf-8").replace("tags: python,", "tags: Python,"), encoding="utf-8")
+
+        build.build()
+
+        docs = site / "docs"
+        tag_page = (docs / "tags" / "python.html").read_text()
+        assert "first-post.html" in tag_page and "second-post.html" in tag_page
+        collections = (docs / "collections.html").read_text()
+        assert collections.count('href="tags/python.html"') == 1
+        assert "2 essays" in collections
+
+
+def make_post(slug, body, category="General"):
+    """A Post record built in memory, without touching content/."""
+    return build.Post(slug, f"{slug}.md", {"slug": slug, "category": category}, body, "")
+
+
+def brute_force_related(posts, post, k=2):
+    """Reference "Read Next" selection comparing every pair of posts."""
+    scored = []
+    for other in posts:
+        if other.slug == post.slug:
+            continue
+        score = build.jaccard(post.tokens, other.tokens)
+        if other.metadata["category"] == post.metadata["category"]:
+            score += 0.1
+        scored.append((score, other))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [p.slug for score, p in scored[:k] if score > 0.05]
+
+
+class TestRelatedPosts:
+    """Tests for the inverted-index related-posts engine."""
+
+    @pytest.fixture
+    def corpus(self):
+        import random
+
+        rng = random.Random(7)
+        vocabulary = [f"word{i:03d}" for i in range(150)]
+        categories = ["Tech", "Life", "Business", "Music"]
+        return [
+            make_post(f"post-{i}", " ".join(rng.sample(vocabulary, rng.randint(0, 25))), rng.choice(categories))
+            for i in range(80)
+        ]
+
+    def test_matches_all_pairs_scoring(self, corpus):
+        """Picks are identical to scoring every pair with jaccard()."""
+        engine = build.RelatedPosts(corpus)
+
+        for post in corpus:
+            assert [p.slug for p in engine.related(post)] == brute_force_related(corpus, post)
+
+    def test_capped_candidates_keep_exact_scores(self, corpus):
+        """Capping candidates limits who is scored, not how they are scored."""
+        engine = build.RelatedPosts(corpus, max_candidates=5)
+        full = build.RelatedPosts(corpus)
+
+        for post in corpus:
+            exact = dict((j, s) for s, j in full.scores(post, k=len(corpus)))
+            capped = engine.scores(post)
+            if len(post.tokens) > 5:
+                assert len(capped) < len(corpus) - 1
+            for score, j in capped:
+                assert score == pytest.approx(exact[j])
+
+    def test_top_k(self, corpus):
+        """More suggestions can be requested than the default two."""
+        engine = build.RelatedPosts(corpus)
+
+        for post in corpus[:10]:
+            assert [p.slug for p in engine.related(post, k=5)] == brute_force_related(corpus, post, k=5)
+
+    def test_category_boost_without_shared_terms(self):
+        """Same-category posts are suggested even when no terms overlap."""
+        posts = [
+            make_post("a", "python programming", "Tech"),
+            make_post("b", "gardening tomatoes", "Tech"),
+            make_post("c", "baking bread", "Food"),
+        ]
+
+        related = build.RelatedPosts(posts).related(posts[0])
+
+        assert [p.slug for p in related] == ["b"]
+
+
+class TestTfidfRelatedPosts:
+    """Tests for the TF-IDF related-posts backend."""
+
+    @pytest.fixture(autouse=True)
+    def needs_scipy(self):
+        pytest.importorskip("numpy")
+        pytest.importorskip("scipy")
+
+    def test_most_similar_post_ranks_first(self):
+        """Posts sharing distinctive vocabulary are each other's best pick."""
+        posts = [
+            make_post("sourdough", "sourdough starter flour hydration levain bake bake", "Food"),
+            make_post("levain", "levain sourdough hydration crumb bake", "Life"),
+            make_post("compilers", "compilers parsing tokens grammar", "Tech"),
+            make_post("parsers", "parsing grammar tokens recursive descent", "Tech"),
+        ]
+        engine = build.TfidfRelatedPosts(posts)
+
+        assert engine.related(posts[0])[0].slug == "levain"
+        assert engine.related(posts[2])[0].slug == "parsers"
+
+    def test_threshold_drops_unrelated_posts(self):
+        """Unrelated posts in other categories are not suggested."""
+        posts = [
+            make_post("a", "python programming language", "Tech"),
+            make_post("b", "gardening tomatoes compost", "Garden"),
+            make_post("c", "baking bread flour", "Food"),
+        ]
+
+        assert build.TfidfRelatedPosts(posts).related(posts[0]) == []
+
+    def test_category_boost_and_ties(self):
+        """Same-category posts are boosted; ties go to the earlier post."""
+        posts = [
+            make_post("a", "python", "Tech"),
+            make_post("b", "gardening", "Tech"),
+            make_post("c", "baking", "Tech"),
+            make_post("d", "knitting", "Tech"),
+        ]
+
+        related = build.TfidfRelatedPosts(posts).related(posts[3])
+
+        assert [p.slug for p in related] == ["a", "b"]
+
+    def test_single_post(self):
+        """A corpus of one post has no suggestions."""
+        post = make_post("only", "lonely words here")
+
+        assert build.TfidfRelatedPosts([post]).related(post) == []
+
+    def test_selectable_from_build(self, site):
+        """The backend can be chosen per build."""
+        build.build(related_backend="tfidf")
+
+        assert (site / "docs" / "posts" / "first-post.html").exists()
+
+
+def test_tfidf_backend_reports_missing_dependencies(monkeypatch):
+    """Without numpy/scipy the TF-IDF backend explains what to install."""
+    monkeypatch.setitem(sys.modules, "scipy", None)
+
+    with pytest.raises(ImportError, match="pip install numpy scipy"):
+        build.TfidfRelatedPosts([make_post("a", "words")])
+
+
+class TestParallelRender:
+    """Tests for rendering post pages in worker processes."""
+
+    def test_parallel_build_is_byte_identical(self, site):
+        """--jobs N produces exactly the files of a serial build."""
+        for i in range(12):
+            (site / "content" / f"extra-{i}.md").write_text(
+                f"---\ntitle: Extra {i}\ndate: 2024-04-{i + 1:02d}\ncategory: Testing\ntags: python\n---\n\n"
+                f"Python testing **extra** number {i}.\n\n* one\n* two",
+                encoding="utf-8",
+            )
+        build.build()
+        serial = read_outputs(site / "docs")
+
+        build.build(jobs=3)
+
+        assert read_outputs(site / "docs") == serial
+
+    def test_render_post_page(self):
+        """A post page is rendered from its metadata, body and related posts."""
+        post = {"slug": "hello", "title": "Hello", "category": "Life", "tags": "one, two"}
+        related = [{"slug": "other", "title": "Other", "tags": "one"}]
+
+        templates = {
+            "base": build.Template("{{ title }}|{{ content }}"),
+            "post": build.Template("{{ post_content }}{{ related_posts }}{{ tags_html }}"),
+        }
+
+        page = build.render_post_page(post, "<p>Body</p>", related, templates)
+
+        assert page.startswith("Hello|<p>Body</p>")
+        assert 'href="other.html"' in page
+        assert 'href="../tags/two.html"' in page
+
+
+class TestTemplates:
+    """Tests for the compiled template engine."""
+
+    def test_render_fills_slots(self):
+        """Every occurrence of a slot is filled from the context."""
+        template = build.Template("<h1>{{ title }}</h1><title>{{ title }}</title>{{ body }}")
+
+        assert template.render({"title": "Hi", "body": "<p>x</p>"}) == "<h1>Hi</h1><title>Hi</title><p>x</p>"
+
+    def test_missing_slots_are_left_as_written(self):
+        """Placeholders without a value survive, as they did with str.replace."""
+        template = build.Template('<meta content="{{ og_image }}">{{ title }}')
+
+        assert template.render({"title": "T"}) == '<meta content="{{ og_image }}">T'
+
+    def test_values_are_not_rescanned(self):
+        """Inserted values are not treated as templates themselves."""
+        template = build.Template("{{ a }}{{ b }}")
+
+        assert template.render({"a": "{{ b }}", "b": "x"}) == "{{ b }}x"
+
+    def test_render_page_wraps_in_base(self, site):
+        """render_page renders the kind's template inside base.html."""
+        build.load_templates()
+
+        page = build.render_page("tag", {"tag": "python", "count": "2", "posts_list": "", "root": "../", "title": "T"})
+
+        assert "<h1>#python</h1>" in page
+        assert 'href="../collections.html"' in page
+        assert "<title>T</title>" in page
+
+    def test_root_in_authored_html_is_resolved(self, site):
+        """Post bodies and standalone pages may link with {{ root }}."""
+        build.load_templates()
+
+        page = build.render_page("page", {"content": '<script src="{{ root }}js/x.js"></script>', "root": ""})
+
+        assert '<script src="js/x.js"></script>' in page
+
+
+class TestRenderCache:
+    """Tests for the on-disk markdown render cache."""
+
+    def test_build_renders_from_cache(self, site):
+        """A warm build takes post HTML from the cache instead of re-rendering."""
+        build.build()
+        cache = build.RenderCache()
+        body = "Python testing with fixtures and builds."
+        entry = Path(cache.entry_path(body))
+        assert entry.read_text(encoding="utf-8") == "<p>Python testing with fixtures and builds.</p>"
+
+        entry.write_text("<p>From the cache</p>", encoding="utf-8")
+        build.build()
+
+        assert "From the cache" in (site / "docs" / "posts" / "first-post.html").read_text()
+
+    def test_edited_body_misses(self, site):
+        """Entries are keyed by the body, so an edited post is rendered afresh."""
+        build.build()
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text().replace("fixtures and builds.", "*edited*"), encoding="utf-8")
+
+        build.build()
+
+        assert "<em>edited</em>" in (site / "docs" / "posts" / "first-post.html").read_text()
+
+    def test_no_cache(self, site):
+        """cache=False neither reads nor writes the cache."""
+        build.build(cache=False)
+
+        assert not (site / ".cache").exists()
+
+    def test_prune_evicts_least_recently_used(self, site):
+        """prune() deletes the oldest entries until the cache fits its size bound."""
+        cache = build.RenderCache(max_bytes=45)
+        paths = []
+        for i, body in enumerate(["one " * 3, "two " * 3, "three " * 3]):
+            cache.markdown_to_html(body)
+            path = cache.entry_path(body)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+        cache.markdown_to_html("one " * 3) # A hit makes the oldest entry the newest
+
+        cache.prune()
+
+        assert [os.path.exists(p) for p in paths] == [True, False, True]
+
+
+class TestAssetSync:
+    """Tests for mirroring static/ into the output."""
+
+    def test_assets_are_mirrored_twice(self, site):
+        """static/ lands both in docs/static/ and in the docs root."""
+        build.build()
+
+        for target in (site / "docs" / "static" / "css", site / "docs" / "css"):
+            assert (target / "style.css").read_text() == "body { color: black; }"
+
+    def test_incremental_build_skips_unchanged_assets(self, site):
+        """Unchanged files are not rewritten; replaced and deleted ones are synced."""
+        (site / "static" / "js").mkdir()
+        (site / "static" / "js" / "old.js").write_text("old()", encoding="utf-8")
+        build.build()
+        kept = site / "docs" / "css" / "style.css"
+        kept_stat = kept.stat()
+
+        (site / "static" / "js" / "old.js").unlink()
+        style = site / "static" / "css" / "style.css"
+        style.unlink()
+        style.write_text("body { color: red; }", encoding="utf-8")
+        build.build(incremental=True)
+
+        assert kept.read_text() == "body { color: red; }"
+        assert kept.stat().st_ino != kept_stat.st_ino
+        assert not (site / "docs" / "js" / "old.js").exists()
+        assert not (site / "docs" / "static" / "js" / "old.js").exists()
+
+    def test_sync_file_keeps_identical_copy(self, temp_dir):
+        """A copy with the same content but a different mtime is left alone."""
+        src, dst = temp_dir / "a.txt", temp_dir / "out" / "a.txt"
+        src.write_text("same", encoding="utf-8")
+        dst.parent.mkdir()
+        dst.write_text("same", encoding="utf-8")
+        os.utime(dst, (1000, 1000))
+
+        assert build.sync_file(str(src), str(dst)) is False
+        assert dst.stat().st_mtime == 1000
+
+    def test_sync_file_copies_by_default(self, temp_dir):
+        """Copies never share an inode with their source, even one an older build linked."""
+        src, dst = temp_dir / "a.txt", temp_dir / "out" / "a.txt"
+        src.write_text("data", encoding="utf-8")
+
+        assert build.sync_file(str(src), str(dst)) is True
+        assert dst.stat().st_ino != src.stat().st_ino
+
+        dst.unlink()
+        os.link(src, dst)
+        build.sync_file(str(src), str(dst))
+        assert dst.stat().st_ino != src.stat().st_ino
+        assert build.sync_file(str(src), str(dst), link=True) is False
+
+    def test_sync_file_falls_back_to_copy(self, temp_dir, monkeypatch):
+        """Without hardlink support linked files are copied with their mtime."""
+        def no_links(src, dst):
+            raise OSError("cross-device link")
+
+        monkeypatch.setattr(build.os, "link", no_links)
+        src, dst = temp_dir / "a.txt", temp_dir / "out" / "a.txt"
+        src.write_text("data", encoding="utf-8")
+        os.utime(src, (1000, 1000))
+
+        assert build.sync_file(str(src), str(dst), link=True) is True
+        assert dst.read_text() == "data"
+        assert dst.stat().st_ino != src.stat().st_ino
+        assert dst.stat().st_mtime == 1000
+
+
+class TestAssetPipeline:
+    """Tests for minified, fingerprinted CSS/JS."""
+
+    def test_minify_css_keeps_strings(self):
+        """Comments and whitespace go; quoted text is left alone."""
+        css = '/* header */\na > b,\nc {\n    content: "  /* kept */  ";\n    margin: 0 auto;\n}\n'
+
+        assert build.minify_css(css) == 'a>b,c{content:"  /* kept */  ";margin:0 auto}'
+
+    def test_minify_js_keeps_literals_and_line_breaks(self):
+        """Comments and indentation go; strings, templates and regexes stay as written."""
+        js = "const a = 'http://x'; // note\n  /* block */\nlet t = `a\n  // b`;\n\n    x = s.replace(/\\/\\//g, '');\n"
+
+        assert build.minify_js(js) == "const a = 'http://x';\nlet t = `a\n  // b`;\nx = s.replace(/\\/\\//g, '');"
+
+    @pytest.mark.parametrize("js", [
+        "function f(s) {\n    return /\"/.test(s) ? \"http://x\" : s // quote\n}",
+        "if (typeof /'/ === 'object') x = 'http://x'; // done",
+        "switch (s) { case /\"/: return \"http://x\" }",
+        "throw /'/; void 'http://x'",
+        "delete /\"/.x; new /\"/.constructor(\"http://x\")",
+        "for (const k of /'/.exec(s)) k = 'http://x'\nif (k in /\"/) k = \"http://x\"",
+        "const f = s => /'/.test(s) || 'http://x' // arrow",
+    ])
+    def test_minify_js_regex_after_keywords(self, js):
+        """A / after a keyword starts a regex, so a quote inside it starts no string."""
+        assert build.minify_js(js) == "\n".join(line.split(" //")[0].strip() for line in js.split("\n"))
+
+    def test_pages_link_fingerprinted_assets(self, site):
+        """Pages reference the hashed stylesheet, which holds the minified CSS."""
+        build.build()
+        page = (site / "docs" / "index.html").read_text()
+
+        hashed = [p.name for p in (site / "docs" / "css").glob("style.*.css")]
+        assert len(hashed) == 1
+        assert f'href="css/{hashed[0]}"' in page
+        assert (site / "docs" / "css" / hashed[0]).read_text() == "body{color:black}"
+
+    def test_changed_asset_replaces_fingerprint(self, site):
+        """An incremental build links the new file and drops the old one."""
+        build.build()
+        old = next((site / "docs" / "css").glob("style.*.css"))
+        (site / "static" / "css" / "style.css").write_text("body { color: red; }", encoding="utf-8")
+
+        build.build(incremental=True)
+
+        new = next((site / "docs" / "css").glob("style.*.css"))
+        assert not old.exists()
+        assert f"css/{new.name}" in (site / "docs" / "posts" / "first-post.html").read_text()
+
+    def test_bundle_js(self, site):
+        """Bundled scripts load through a single tag."""
+        (site / "static" / "js").mkdir()
+        (site / "static" / "js" / "config.js").write_text("const A = 1; // config\n", encoding="utf-8")
+        (site / "static" / "js" / "main.js").write_text("console.log(A);\n", encoding="utf-8")
+
+        build.build(bundle_js=True)
+        page = (site / "docs" / "index.html").read_text()
+
+        bundle = next((site / "docs" / "js").glob("bundle.*.js"))
+        assert bundle.read_text() == "const A = 1;;\nconsole.log(A);"
+        assert page.count(f'src="js/{bundle.name}"') == 1
+        assert 'src="js/config.js"' not in page
+        assert 'src="js/main.js"' not in page
+        assert 'src="js/search.js"' in page
+
+
+class TestResponsiveImages:
+    """Tests for resized, re-encoded images and the <img> tags pointing at them."""
+
+    @pytest.fixture
+    def photo(self, site):
+        """A 1000x500 JPEG in static/images/, shown by the first post."""
+        Image = pytest.importorskip("PIL.Image")
+        images = site / "static" / "images"
+        images.mkdir()
+        Image.linear_gradient("L").resize((1000, 500)).convert("RGB").save(images / "photo.jpg", quality=95)
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text() + "\n\n![A photo](/images/photo.jpg)", encoding="utf-8")
+        return images / "photo.jpg"
+
+    def test_img_tags_are_lazy(self):
+        """Every <img> is lazy; ones of unknown images or with a srcset get nothing more."""
+        html = ('<img src="https://example.com/a.png" alt="x"><IMG SRC="/images/b.png" loading="eager" />'
+                '<img src="/images/photo.jpg" srcset="a.jpg 1x">')
+        images = {"images/photo.jpg": {"width": 10, "height": 5, "sources": [["image/jpeg", [["images/photo.jpg", 10]]]]}}
+
+        assert build.rewrite_img_tags(html, images) == (
+            '<img src="https://example.com/a.png" alt="x" loading="lazy" decoding="async">'
+            '<IMG SRC="/images/b.png" loading="eager" decoding="async" />'
+            '<img src="/images/photo.jpg" srcset="a.jpg 1x" loading="lazy" decoding="async">')
+
+    def test_posts_get_srcset_and_modern_formats(self, site, photo):
+        """Resized copies are written and offered in a <picture>, best encoding first."""
+        build.build()
+        docs = site / "docs"
+
+        for name in ("photo-320w.jpg", "photo-640w.webp", "photo-1000w.webp"):
+            assert (docs / "images" / name).exists() and (docs / "static" / "images" / name).exists()
+        page = (docs / "posts" / "first-post.html").read_text()
+        picture = page[page.index("<picture>"):page.index("</picture>")]
+        types = [t.split('"')[0] for t in picture.split('type="')[1:]]
+        assert types[-1] == "image/webp" and types[0] in ("image/avif", "image/webp")
+        assert ('<img src="/images/photo.jpg" alt="A photo" loading="lazy" decoding="async" width="1000" height="500" '
+                'srcset="/images/photo-320w.jpg 320w, /images/photo-640w.jpg 640w, /images/photo-960w.jpg 960w, '
+                f'/images/photo.jpg 1000w" sizes="{build.IMAGE_SIZES}">') in picture
+
+    def test_copies_are_encoded_once(self, site, photo, monkeypatch):
+        """Copies are cached by source hash; an edited image replaces its copies."""
+        build.build()
+        cached = set((site / ".cache" / "images").rglob("*.*"))
+
+        def encode_images(images, quality):
+            raise AssertionError("nothing should be encoded again")
+        with monkeypatch.context() as m:
+            m.setattr(build, "encode_images", encode_images)
+            build.build(incremental=True)
+
+        from PIL import Image
+        Image.linear_gradient("L").resize((800, 400)).convert("RGB").save(photo, quality=95)
+        build.build(incremental=True)
+        docs = site / "docs"
+        assert not (docs / "images" / "photo-960w.jpg").exists()
+        assert 'width="800" height="400"' in (docs / "posts" / "first-post.html").read_text()
+        assert not cached & set((site / ".cache" / "images").rglob("*.*"))
+
+    def test_watch_builds_hash_edited_images_only(self, site, photo, monkeypatch):
+        """Watch mode keeps each image's size and hash until the file changes."""
+        state = build.BuildState()
+        build.build(incremental=True, state=state)
+        hashed = []
+        hash_file = build.hash_file
+        monkeypatch.setattr(build, "hash_file", lambda path: hashed.append(path) or hash_file(path))
+
+        build.build(incremental=True, state=state)
+        assert str(photo) not in hashed
+        from PIL import Image
+        Image.linear_gradient("L").resize((800, 400)).convert("RGB").save(photo, quality=95)
+        build.build(incremental=True, state=state)
+        assert str(photo) in hashed
+        assert 'width="800" height="400"' in (site / "docs" / "posts" / "first-post.html").read_text()
+
+
+class TestPrecompress:
+    """Tests for the .gz/.br precompression stage."""
+
+    def test_writes_gzip_siblings(self, site):
+        """Large text outputs get a .gz that decompresses to the original; small ones don't."""
+        build.build(precompress_outputs=True, verify_compression=True)
+        docs = site / "docs"
+
+        page = docs / "posts" / "first-post.html"
+        assert gzip.decompress((docs / "posts" / "first-post.html.gz").read_bytes()) == page.read_bytes()
+        assert not (docs / "css" / "style.css.gz").exists()
+
+    def test_incremental_skips_unchanged_files(self, site):
+        """Only files whose content changed are compressed again; stale siblings go."""
+        build.build(precompress_outputs=True)
+        docs = site / "docs"
+        kept = (docs / "posts" / "second-post.html.gz").stat().st_mtime_ns
+        edited = docs / "posts" / "first-post.html.gz"
+        edited_before = edited.read_bytes()
+
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text().replace("fixtures and builds.", "an edit."), encoding="utf-8")
+        (site / "content" / "third-post.md").unlink()
+        build.build(incremental=True, precompress_outputs=True)
+
+        assert (docs / "posts" / "second-post.html.gz").stat().st_mtime_ns == kept
+        assert edited.read_bytes() != edited_before
+        assert not (docs / "posts" / "third-post.html.gz").exists()
+
+    def test_verify_detects_corrupt_sibling(self, site):
+        """verify_compression also checks siblings an incremental build kept."""
+        build.build(precompress_outputs=True)
+        (site / "docs" / "posts" / "second-post.html.gz").write_bytes(gzip.compress(b"wrong"))
+
+        with pytest.raises(RuntimeError, match="does not decompress"):
+            build.build(incremental=True, precompress_outputs=True, verify_compression=True)
+
+    def test_brotli_when_installed(self, site, monkeypatch):
+        """With brotli available every sibling is written in both encodings."""
+        fake_brotli = types.SimpleNamespace(compress=lambda data, quality: zlib.compress(data), decompress=zlib.decompress)
+        monkeypatch.setattr(build, "load_brotli", lambda: fake_brotli)
+
+        build.build(precompress_outputs=True, verify_compression=True)
+
+        page = site / "docs" / "index.html"
+        assert zlib.decompress((site / "docs" / "index.html.br").read_bytes()) == page.read_bytes()
+        assert (site / "docs" / "index.html.gz").exists()
+
+
+class TestSyntheticCorpus:
+    """The benchmark corpus generator doubles as a larger build fixture."""
+
+    def test_generated_site_builds_incrementally(self, temp_dir, monkeypatch):
+        """Generation is reproducible and an incremental rebuild matches a clean build."""
+        from benchmarks.corpus import generate_corpus
+
+        words = (["software", "people", "build", "feel", "right", "tools", "write", "human"], [8, 7, 6, 5, 4, 3, 2, 1])
+        content, templates, static = generate_corpus(str(temp_dir / "a"), 30, seed=3, words=words)
+        generate_corpus(str(temp_dir / "b"), 30, seed=3, words=words)
+        assert read_outputs(temp_dir / "a" / "content") == read_outputs(temp_dir / "b" / "content")
+
+        monkeypatch.setattr(build, "CONTENT_DIR", content)
+        monkeypatch.setattr(build, "TEMPLATE_DIR", templates)
+        monkeypatch.setattr(build, "STATIC_DIR", static)
+        monkeypatch.setattr(build, "OUTPUT_DIR", str(temp_dir / "docs"))
+        monkeypatch.setattr(build, "CACHE_DIR", str(temp_dir / ".cache"))
+        build.build()
+        assert len(list((temp_dir / "docs" / "posts").iterdir())) == 30
+
+        post = next(Path(content).glob("*-7.md"))
+        post.write_text(post.read_text().replace("tags: ", "tags: Extra, "), encoding="utf-8")
+        build.build(incremental=True)
+        incremental = read_outputs(temp_dir / "docs")
+        build.build()
+        assert read_outputs(temp_dir / "docs") == incremental
+
+
+class TestProfiler:
+    """Tests for build(profile=...)."""
+
+    def test_trace_and_summary(self, site, capsys):
+        """Every stage and per-post step lands in the trace, with the bytes it wrote."""
+        trace = site / "trace.json"
+        build.build(profile=str(trace))
+
+        events = json.loads(trace.read_text())["traceEvents"]
+        assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+        names = [event["name"] for event in events]
+        assert {"load posts", "related posts", "post pages", "homepage", "finish"} <= set(names)
+        assert names.count("markdown") == names.count("write") == 3
+
+        pages = sum(path.stat().st_size for path in (site / "docs" / "posts").iterdir())
+        assert sum(event["args"]["bytes"] for event in events if event["name"] == "write") == pages
+        out = capsys.readouterr().out
+        assert "  markdown" in out
+        assert "total" in out
+        assert not build.PROFILER.enabled
+
+    def test_spans_are_free_when_disabled(self):
+        """Without a profile nothing is recorded."""
+        profiler = build.Profiler()
+        with profiler.span("step"):
+            profiler.add_bytes(10)
+        profiler.stage("stage")
+        assert profiler.events == [] and profiler.stack == []
+
+    def test_summary_keeps_spans_under_their_stage(self):
+        """A span name used by two stages is summed separately for each."""
+        profiler = build.Profiler()
+        profiler.start()
+        for stage in ("related posts", "search shards"):
+            profiler.stage(stage)
+            for _ in range(2 if stage == "related posts" else 1):
+                with profiler.span("index"):
+                    pass
+        profiler.stop()
+
+        assert [(name, depth, calls) for name, depth, _, calls, _ in profiler.summary()] == [
+            ("related posts", 0, 1), ("index", 1, 2), ("search shards", 0, 1), ("index", 1, 1)]
+
+
+class TestWatch:
+    """Tests for --watch: change detection, provisional rebuilds and live reload."""
+
+    @pytest.mark.parametrize("factory", [
+        lambda roots: build.PollingWatcher(roots, interval=0.01),
+        build.open_watcher,
+    ])
+    def test_watcher_reports_changes(self, temp_dir, factory):
+        """Created, modified and deleted files are all reported."""
+        (temp_dir / "sub").mkdir()
+        kept = temp_dir / "sub" / "kept.md"
+        kept.write_text("one", encoding="utf-8")
+        gone = temp_dir / "gone.md"
+        gone.write_text("gone", encoding="utf-8")
+        watcher = factory([str(temp_dir)])
+
+        kept.write_text("two words", encoding="utf-8")
+        (temp_dir / "new.md").write_text("new", encoding="utf-8")
+        gone.unlink()
+        changed = watcher.wait(timeout=2)
+
+        assert {str(kept), str(temp_dir / "new.md"), str(gone)} <= changed
+        assert watcher.wait(timeout=0) == set()
+
+    def test_editor_temp_files_are_ignored(self):
+        """Swap and backup files written while saving do not trigger rebuilds."""
+        assert build.is_ignored_change("content/.post.md.swp")
+        assert build.is_ignored_change("content/post.md~")
+        assert not build.is_ignored_change("content/post.md")
+
+    def test_provisional_build_then_exact_build(self, site):
+        """A provisional build reuses the old picks; the exact one catches up to a clean build."""
+        state = build.BuildState()
+        build.build(incremental=True, state=state)
+        docs = site / "docs"
+        untouched = (docs / "posts" / "third-post.html").stat().st_mtime_ns
+
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text() + "\n\nSlow weekend cooking recipes.", encoding="utf-8")
+        manifest = build.build(incremental=True, state=state, provisional=True)
+
+        assert state.stale
+        assert "posts/first-post.html" in manifest.reasons
+        assert "Slow weekend cooking" in (docs / "posts" / "first-post.html").read_text()
+        assert (docs / "posts" / "third-post.html").stat().st_mtime_ns == untouched
+
+        build.build(incremental=True, state=state)
+        assert not state.stale
+        watched = read_outputs(docs)
+        build.build()
+        assert read_outputs(docs) == watched
+
+    def test_metadata_edit_keeps_picks_exact(self, site):
+        """Picks only depend on tokens, categories and order, so a retitled post never re-scores them."""
+        state = build.BuildState()
+        build.build(incremental=True, state=state)
+        picks = state.picks
+
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text().replace("title: First Post", "title: First Post, Retitled"), encoding="utf-8")
+        build.build(incremental=True, state=state, provisional=True)
+
+        assert state.stale # The search index waits for the exact pass
+        assert "First Post, Retitled" in (site / "docs" / "posts" / "second-post.html").read_text()
+        build.build(incremental=True, state=state)
+        assert state.picks is picks and not state.stale
+
+    def test_watch_builds_update_output_in_place(self, site, monkeypatch):
+        """Watch builds write into docs/ itself, keep no builds and only minify edited assets again."""
+        build.build()
+        docs = (site / "docs").stat().st_ino
+        minified = []
+        minify_css = build.minify_css
+        monkeypatch.setattr(build, "minify_css", lambda css: minified.append(css) or minify_css(css))
+        state = build.BuildState()
+        build.build(incremental=True, state=state, fingerprint=True)
+        assert len(minified) == 1
+
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text() + "\n\nMore.", encoding="utf-8")
+        build.build(incremental=True, state=state, provisional=True, fingerprint=True)
+        assert len(minified) == 1
+        (site / "static" / "css" / "style.css").write_text("body { color: red; }", encoding="utf-8")
+        build.build(incremental=True, state=state, provisional=True, fingerprint=True)
+        assert len(minified) == 2
+
+        assert (site / "docs").stat().st_ino == docs
+        assert build.kept_builds() == []
+        assert "color:red" in "".join(path.read_text() for path in (site / "docs" / "css").glob("style.*.css"))
+
+    def test_live_reload_events(self):
+        """Waiters get the pages of the next build, or None when they missed one."""
+        reloader = build.LiveReload()
+        assert reloader.wait(0, timeout=0) == (0, None)
+
+        reloader.notify(build.page_urls(["posts/a.html", "index.html"]))
+        assert reloader.wait(0) == (1, ["/posts/a.html", "/index.html", "/"])
+        reloader.notify()
+        reloader.notify(["/posts/b.html"])
+        assert reloader.wait(1) == (3, None)
+
+    def test_served_pages_get_reload_snippet(self, site):
+        """HTML is served with the snippet injected; the file on disk is left alone."""
+        from urllib.request import urlopen
+
+        build.build()
+        server = build.serve_live_reload(build.LiveReload(), port=0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            served = urlopen(f"{url}/").read().decode("utf-8")
+            css = urlopen(f"{url}/static/css/style.css").read().decode("utf-8")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert build.LIVE_RELOAD_SNIPPET + "</body>" in served
+        assert build.LIVE_RELOAD_PATH not in (site / "docs" / "index.html").read_text()
+        assert css == "body { color: black; }"
+
+
+class TestPagination:
+    """Tests for paginated homepage and tag pages."""
+
+    def test_homepage_pages_and_data(self, site):
+        """Recent posts beyond the page size move to page/N.html, with prev/next links and JSON data."""
+        build.build(page_size=1)
+        docs = site / "docs"
+
+        index = (docs / "index.html").read_text()
+        assert 'data-pages="2" data-page-size="1"' in index
+        assert 'href="page/2.html" class="pagination-link" rel="next"' in index
+        assert 'href="posts/second-post.html" class="post-card"' in index
+        assert "posts/first-post.html" not in index
+        second = (docs / "page" / "2.html").read_text()
+        assert 'href="../index.html" class="pagination-link" rel="prev"' in second
+        assert 'href="../posts/first-post.html" class="post-card"' in second
+        assert 'href="../css/style.' in second
+        assert not (docs / "page" / "3.html").exists()
+
+        data = json.loads((docs / "page" / "2.json").read_text())
+        assert data["page"] == 2 and data["pages"] == 2
+        assert data["posts"] == [{
+            "tag": "python", "date_display": "Jan 01, 2024", "url": "posts/first-post.html",
+            "title": "First Post", "excerpt": "The first one", "category": "Testing",
+            "date": "2024-01-01", "read_time": "5 min read",
+        }]
+
+    def test_tag_pages(self, site):
+        """A tag with more posts than the page size gets tags/<tag>/page/N.html."""
+        build.build(page_size=1)
+        page = site / "docs" / "tags" / "python" / "page" / "2.html"
+
+        assert 'href="../../../tags/python.html" class="pagination-link" rel="prev"' in page.read_text()
+        assert 'href="../../../posts/first-post.html"' in page.read_text()
+        assert "pagination" not in (site / "docs" / "tags" / "recipes.html").read_text().split("</main>")[0]
+
+    def test_larger_page_size_removes_pages(self, site):
+        """Pages that no longer exist are deleted by an incremental build."""
+        build.build(page_size=1)
+        build.build(incremental=True, page_size=0)
+
+        docs = site / "docs"
+        assert not (docs / "page" / "2.html").exists()
+        assert not (docs / "tags" / "python" / "page" / "2.html").exists()
+        assert json.loads((docs / "page" / "1.json").read_text())["pages"] == 1
+        assert 'data-pages="1" data-page-size="0"' in (docs / "index.html").read_text()
+
+
+class TestSearchIndex:
+    """Tests for the sharded full-text search index."""
+
+    @staticmethod
+    def postings(docs, term):
+        """doc id -> impact for term, decoded from its shard as search.js does."""
+        meta = json.loads((docs / "search" / "meta.json").read_text())
+        key = term[:meta["prefix"]]
+        while key in meta["children"] and len(term) > len(key):
+            key = term[:len(key) + 1]
+        flat = json.loads((docs / "search" / "terms" / f"{key}.json").read_text())[term]
+        ids = [sum(flat[0:i + 1:2]) for i in range(0, len(flat), 2)]
+        return dict(zip(ids, flat[1::2]))
+
+    def test_bodies_are_searchable(self, site):
+        """Body words are indexed, and doc ids lead to the result's fields."""
+        build.build()
+        docs = site / "docs"
+
+        (doc_id,) = self.postings(docs, "delicious")
+        meta = json.loads((docs / "search" / "meta.json").read_text())
+        chunk = json.loads((docs / "search" / "docs" / f"{doc_id // meta['chunk']}.json").read_text())
+        assert chunk[doc_id % meta["chunk"]] == {
+            "slug": "third-post", "title": "Third Post", "excerpt": "Something else",
+            "date": "2024-03-01", "category": "Cooking",
+        }
+        python = self.postings(docs, "python")
+        assert len(python) == 2 and min(python.values()) >= 1
+
+    def test_title_outranks_body(self, site):
+        """Fields are boosted as search.js used to boost them in lunr."""
+        (site / "content" / "fourth-post.md").write_text(
+            "---\ntitle: Recipes\ndate: 2024-04-01\n---\n\nA short note.", encoding="utf-8")
+        build.build()
+
+        recipes = self.postings(site / "docs", "recipes")
+        assert recipes[0] > recipes[1] # The newest post, titled "Recipes", vs third-post's body and tag
+
+    def test_large_shards_are_split(self, site, monkeypatch):
+        """Shards over the size limit are split by a longer prefix that search.js can follow."""
+        monkeypatch.setattr(build, "SEARCH_SHARD_MAX_BYTES", 20)
+        build.build()
+
+        docs = site / "docs"
+        meta = json.loads((docs / "search" / "meta.json").read_text())
+        assert meta["children"]
+        assert self.postings(docs, "fixtures") and self.postings(docs, "first")
+
+    def test_split_prefix_completes(self, site, monkeypatch):
+        """A word typed up to a split prefix still completes to the terms split from it."""
+        monkeypatch.setattr(build, "SEARCH_SHARD_MAX_BYTES", 20)
+        build.build()
+
+        search = site / "docs" / "search"
+        meta = json.loads((search / "meta.json").read_text())
+        terms = {}
+        for shard in (search / "terms").glob("*.json"):
+            terms.update(json.loads(shard.read_text()))
+
+        def shard_keys(key):
+            return [key] + [child for split in meta["children"].get(key, []) for child in shard_keys(split)]
+
+        for prefix in meta["children"]:
+            found = set()
+            for key in shard_keys(prefix):
+                path = search / "terms" / f"{key}.json"
+                if path.exists():
+                    found.update(term for term in json.loads(path.read_text()) if term.startswith(prefix))
+            assert found == {term for term in terms if term.startswith(prefix)}
+            assert found - {prefix}
+
+    def test_unsearchable_edit_keeps_shards(self, site):
+        """Shards are only rewritten when their contents change."""
+        build.build()
+        post = site / "content" / "third-post.md"
+        post.write_text(post.read_text().replace("excerpt:", "read_time: 2 min read\nexcerpt:"), encoding="utf-8")
+        manifest = build.build(incremental=True)
+        assert not [path for path in manifest.reasons if path.startswith("search/terms/")]
+
+        post.write_text(post.read_text() + "\n\nZucchini.", encoding="utf-8")
+        manifest = build.build(incremental=True)
+        assert manifest.reasons["search/terms/zu.json"] == ["output"]
+        assert self.postings(site / "docs", "zucchini")
+
+    def test_provisional_without_state_is_exact(self, site):
+        """With no BuildState to mark it stale, a provisional build still updates the index."""
+        build.build()
+        post = site / "content" / "third-post.md"
+        post.write_text(post.read_text() + "\n\nZucchini.", encoding="utf-8")
+
+        build.build(incremental=True, provisional=True)
+
+        assert self.postings(site / "docs", "zucchini")
+
+
+class TestFeeds:
+    """Tests for the streamed RSS, Atom and JSON feeds."""
+
+    ATOM = "{http://www.w3.org/2005/Atom}"
+
+    def test_formats_are_valid(self, site):
+        """All three feeds parse and list the same posts, newest first."""
+        build.build()
+        docs = site / "docs"
+
+        rss = ElementTree.parse(docs / "feed.xml").getroot()
+        atom = ElementTree.parse(docs / "atom.xml").getroot()
+        feed = json.loads((docs / "feed.json").read_text())
+        slugs = ["third-post", "second-post", "first-post"]
+        assert [item.findtext("link").rsplit("/", 1)[1] for item in rss.iter("item")] == [f"{s}.html" for s in slugs]
+        assert [e.find(f"{self.ATOM}link").get("href") for e in atom.iter(f"{self.ATOM}entry")] == [
+            item["url"] for item in feed["items"]]
+        assert atom.findtext(f"{self.ATOM}updated") == "2024-03-01T00:00:00+00:00"
+        assert feed["items"][0]["content_html"] == "Something else"
+        assert rss.find("channel/item/{http://purl.org/rss/1.0/modules/content/}encoded") is None
+
+    def test_item_cap_and_full_content(self, site):
+        """feed_items keeps the newest posts; full content is the rendered post."""
+        build.build(feed_items=2, feed_full_content=True)
+        docs = site / "docs"
+
+        items = ElementTree.parse(docs / "feed.xml").getroot().findall("channel/item")
+        assert len(items) == 2
+        content = items[0].findtext("{http://purl.org/rss/1.0/modules/content/}encoded")
+        assert content == build.markdown_to_html("Delicious recipes for slow weekend cooking.")
+        assert len(json.loads((docs / "feed.json").read_text())["items"]) == 2
+
+    def test_tag_feeds_follow_the_taxonomy(self, site):
+        """Every tag gets feeds of its own, removed with the tag."""
+        build.build()
+        docs = site / "docs"
+        python = ElementTree.parse(docs / "tags" / "python" / "feed.xml").getroot()
+        assert [item.findtext("title") for item in python.iter("item")] == ["Second Post", "First Post"]
+        assert 'href="../tags/python/feed.xml"' in (docs / "tags" / "python.html").read_text()
+
+        post = site / "content" / "third-post.md"
+        post.write_text(post.read_text().replace("tags: recipes", "tags: python"), encoding="utf-8")
+        manifest = build.build(incremental=True)
+
+        assert not (docs / "tags" / "recipes").exists()
+        assert "tags/recipes/atom.xml" in manifest.stale_outputs()
+        assert not {"tags/testing/feed.xml", "tags/testing/feed.json"} & set(manifest.reasons)
+
+
+class TestSitemap:
+    """Tests for the sitemap index, its split files and post lastmod dates."""
+
+    NS = {"s": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+
+    def lastmods(self, docs):
+        """Post URL -> lastmod, across every sitemap in the index."""
+        index = ElementTree.parse(docs / "sitemap.xml").getroot()
+        dates = {}
+        for loc in index.iterfind("s:sitemap/s:loc", self.NS):
+            urlset = ElementTree.parse(docs / loc.text.rsplit("/", 1)[1]).getroot()
+            for url in urlset.iterfind("s:url", self.NS):
+                dates[url.findtext("s:loc", namespaces=self.NS).rsplit("/", 1)[1]] = url.findtext("s:lastmod", namespaces=self.NS)
+        return dates
+
+    def test_split_by_url_limit(self, site, monkeypatch):
+        """URLs are spread over sitemaps of SITEMAP_MAX_URLS, and shrinking drops the extras."""
+        monkeypatch.setattr(build, "SITEMAP_MAX_URLS", 3)
+        build.build()
+        docs = site / "docs"
+        index = ElementTree.parse(docs / "sitemap.xml").getroot()
+        assert [loc.text for loc in index.iterfind("s:sitemap/s:loc", self.NS)] == [
+            f"{build.BASE_URL}/sitemap-{n}.xml" for n in (1, 2, 3)]
+        assert len(self.lastmods(docs)) == 7 # Homepage, 3 pages, 3 posts
+
+        monkeypatch.setattr(build, "SITEMAP_MAX_URLS", 4)
+        build.build(incremental=True)
+        assert not (docs / "sitemap-3.xml").exists()
+        assert len(self.lastmods(docs)) == 7
+
+    def test_lastmod_only_moves_on_edits(self, site):
+        """Posts are dated by their frontmatter until edited; rebuilds and touches keep the dates."""
+        build.build()
+        docs = site / "docs"
+        assert self.lastmods(docs)["third-post.html"] == "2024-03-01"
+
+        second = site / "content" / "second-post.md"
+        os.utime(second, (0, 0))
+        third = site / "content" / "third-post.md"
+        third.write_text(third.read_text() + "\n\nAn update.", encoding="utf-8")
+        os.utime(third, (86400 * 365 * 50, 86400 * 365 * 50))
+        build.build()
+
+        dates = self.lastmods(docs)
+        assert (dates["second-post.html"], dates["third-post.html"]) == ("2024-02-01", "2019-12-20")
+        index = ElementTree.parse(docs / "sitemap.xml").getroot()
+        assert index.findtext("s:sitemap/s:lastmod", namespaces=self.NS) == "2024-02-01"
+
+    def test_git_commit_dates(self, temp_dir):
+        """The newest commit touching each file, by path relative to the directory."""
+        git = ["git", "-c", "user.name=t", "-c", "user.email=t@t", "-C", str(temp_dir)]
+        (temp_dir / "content").mkdir()
+        post = temp_dir / "content" / "post.md"
+        try:
+            subprocess.run(git + ["init", "-q"], check=True)
+            for date, text in (("2020-01-02T12:00:00Z", "one"), ("2021-03-04T12:00:00Z", "two")):
+                post.write_text(text)
+                subprocess.run(git + ["add", "."], check=True)
+                subprocess.run(git + ["commit", "-q", "-m", text], check=True,
+                               env=dict(os.environ, GIT_COMMITTER_DATE=date, GIT_AUTHOR_DATE=date))
+        except (OSError, subprocess.CalledProcessError):
+            pytest.skip("git is not available")
+
+        assert build.git_commit_dates(str(temp_dir / "content")) == {"post.md": "2021-03-04"}
+
+    def test_new_posts_take_git_commit_dates(self, site, monkeypatch):
+        """A post no build has seen is dated by its last commit when content/ is in git."""
+        monkeypatch.setattr(build, "git_commit_dates", lambda directory: {"first-post.md": "2025-06-30"})
+        build.build()
+        assert self.lastmods(site / "docs")["first-post.html"] == "2025-06-30"
+
+
+class TestAtomicBuilds:
+    """Tests for staged builds, the directory swap and rollback."""
+
+    def test_failed_build_keeps_site(self, site, monkeypatch):
+        """A build that crashes leaves the previous site in place."""
+        build.build()
+        before = read_outputs(site / "docs")
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("template error")
+        monkeypatch.setattr(build, "render_page", fail)
+        with pytest.raises(RuntimeError):
+            build.build()
+
+        assert read_outputs(site / "docs") == before
+
+    def test_incremental_build_leaves_kept_builds_alone(self, site):
+        """Staging is seeded with hardlinks, which are replaced rather than written into."""
+        build.build()
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text().replace("title: First Post", "title: Retitled"), encoding="utf-8")
+
+        build.build(incremental=True)
+
+        (kept,) = build.kept_builds()
+        assert "First Post" in (Path(kept) / "index.html").read_text()
+        assert "Retitled" in (site / "docs" / "index.html").read_text()
+        assert "Retitled" not in (Path(kept) / "posts" / "first-post.html").read_text()
+
+    def test_rollback(self, site):
+        """Rolling back swaps the previous build in; doing it again undoes it. Only keep_builds are kept."""
+        build.build()
+        post = site / "content" / "first-post.md"
+        post.write_text(post.read_text().replace("title: First Post", "title: Retitled"), encoding="utf-8")
+        build.build(keep_builds=1)
+        index = site / "docs" / "index.html"
+
+        build.rollback()
+        assert "First Post" in index.read_text()
+        build.rollback()
+        assert "Retitled" in index.read_text()
+
+        build.build(keep_builds=1)
+        assert len(build.kept_builds()) == 1
+
+    def test_static_edit_in_place_leaves_builds_alone(self, site):
+        """Editing a static file in place changes no build until the next one, and rolling that back restores it."""
+        build.build()
+        style = site / "static" / "css" / "style.css"
+        with open(style, "r+", encoding="utf-8") as f:
+            f.write("body { color: white; }")
+        outputs = [site / "docs" / "css" / "style.css", site / "docs" / "static" / "css" / "style.css"]
+        assert [path.read_text() for path in outputs] == ["body { color: black; }"] * 2
+
+        build.build(incremental=True)
+        assert [path.read_text() for path in outputs] == ["body { color: white; }"] * 2
+        build.rollback()
+        assert [path.read_text() for path in outputs] == ["body { color: black; }"] * 2
+
+    def test_swap_without_exchange(self, site, monkeypatch):
+        """Where paths cannot be exchanged atomically, two renames do the swap."""
+        monkeypatch.setattr(build, "exchange_paths", lambda path1, path2: False)
+        build.build()
+        build.build()
+
+        assert (site / "docs" / "index.html").exists()
+        assert len(build.kept_builds()) == 1
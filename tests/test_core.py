@@ -22,31 +22,61 @@ import core
 class TestGetPosts:
     """Tests for retrieving blog posts."""
 
-    @patch('core.os.listdir')
-    @patch('core.os.path.join')
-    @patch('builtins.open', create=True)
-    @patch('core.frontmatter.load')
-    def test_get_posts_success(self, mock_fm_load, mock_open, mock_join, mock_listdir):
+    @pytest.fixture
+    def content_dir(self, tmp_path):
+        """An empty content directory with its own content store."""
+        content = tmp_path / "content"
+        content.mkdir()
+        with patch('core.CONTENT_DIR', str(content)), patch('core.STORE_PATH', str(tmp_path / "content.sqlite3")):
+            yield content
+
+    def test_get_posts_success(self, content_dir):
         """Test successful post retrieval."""
-        # Setup mocks
-        mock_listdir.return_value = ['post1.md', 'post2.md', 'not_markdown.txt']
-        mock_post = MagicMock()
-        mock_post.__getitem__ = lambda self, key: f"Test {key}"
-        mock_fm_load.return_value = mock_post
+        (content_dir / "post1.md").write_text("---\ntitle: Older\ndate: 2024-01-01\n---\nBody")
+        (content_dir / "post2.md").write_text("---\ntitle: Newer\ndate: 2024-02-01\n---\nBody")
+        (content_dir / "not_markdown.txt").write_text("---\ntitle: Skipped\n---\n")
 
         posts = core.get_posts()
 
-        # Should only process .md files
-        assert mock_fm_load.call_count == 2
-        assert len(posts) == 2
+        # Should only list .md files, newest first
+        assert [(post['title'], post['filename']) for post in posts] == [("Newer", "post2.md"), ("Older", "post1.md")]
 
-    @patch('core.os.listdir')
-    def test_get_posts_empty_directory(self, mock_listdir):
+    def test_get_posts_empty_directory(self, content_dir):
         """Test handling of empty content directory."""
-        mock_listdir.return_value = []
         posts = core.get_posts()
         assert posts == []
 
+    def test_get_posts_follows_edits(self, content_dir):
+        """The listing is synced with content/ on every call."""
+        post = content_dir / "post.md"
+        post.write_text("---\ntitle: Before\n---\nBody")
+        assert [p['title'] for p in core.get_posts()] == ["Before"]
+
+        post.write_text("---\ntitle: After the edit\n---\nBody")
+        assert [p['title'] for p in core.get_posts()] == ["After the edit"]
+
+        post.unlink()
+        assert core.get_posts() == []
+
+    def test_get_posts_search_and_tag(self, content_dir):
+        """Search and tag filters are answered from the content store."""
+        (content_dir / "bread.md").write_text("---\ntitle: Bread\ntags: Cooking, Weekend\n---\nSourdough starter notes")
+        (content_dir / "tests.md").write_text("---\ntitle: Tests\ntags: Python\n---\nFixtures for a sourdough app")
+
+        assert {p['title'] for p in core.get_posts(search="sourdough")} == {"Tests", "Bread"}
+        assert [p['title'] for p in core.get_posts(search="starter")] == ["Bread"]
+        assert [p['title'] for p in core.get_posts(tag="python")] == ["Tests"]
+        assert [p['title'] for p in core.get_posts(search="sourdough", tag="weekend")] == ["Bread"]
+        assert core.get_tags() == {"cooking": 1, "python": 1, "weekend": 1}
+
+    def test_get_post_includes_content(self, content_dir):
+        """A single post is loaded whole, for the editor."""
+        (content_dir / "post.md").write_text("---\ntitle: Whole\ntags: [a, b]\n---\nThe body")
+
+        post = core.get_post("post.md")
+
+        assert post == {"title": "Whole", "tags": ["a", "b"], "content": "The body", "filename": "post.md"}
+
 
 class TestSavePost:
     """Tests for saving blog posts."""